@@ -1,4 +1,32 @@
-from .utils import meta_caption
-from .base import FileIn, Microphone, SaveDisk, Screenshare, Camera, Livestream
+from __future__ import annotations
+import importlib
+import typing as T
+
+if T.TYPE_CHECKING:
+    from .utils import meta_caption
+    from .base import FileIn, Microphone, SaveDisk, Screenshare, Camera, Livestream
 
 __version__ = "2.1.1"
+
+# imported on first use, so command line entry points load only what they need
+_LAZY = {
+    "meta_caption": "utils",
+    "FileIn": "base",
+    "Microphone": "base",
+    "SaveDisk": "base",
+    "Screenshare": "base",
+    "Camera": "base",
+    "Livestream": "base",
+}
+
+
+def __getattr__(name: str) -> T.Any:
+    if name in _LAZY:
+        return getattr(importlib.import_module(f".{_LAZY[name]}", __name__), name)
+
+    try:
+        return importlib.import_module(f".{name}", __name__)
+    except ModuleNotFoundError as e:
+        if e.name != f"{__name__}.{name}":
+            raise
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
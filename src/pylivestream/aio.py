@@ -0,0 +1,232 @@
+"""
+asyncio stream API, to run and monitor many streams from one process
+
+Each stream is an FFmpeg subprocess watched from the event loop, without a thread per stream.
+
+import asyncio
+import pylivestream as pls
+
+async def main():
+    handles = [
+        await pls.FileIn("pylivestream.json", "youtube", infn=f).agolive() for f in files
+    ]
+    print(handles[0].snapshot())
+    handles[0].stop()
+    await asyncio.gather(*(h.wait() for h in handles))
+
+asyncio.run(main())
+"""
+
+from __future__ import annotations
+import typing as T
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+
+from . import metrics
+from .progress import PROGRESS, ProgressParser
+from .supervise import Restarts, stalled
+
+if T.TYPE_CHECKING:
+    from .base import Livestream
+
+STOP_TIMEOUT = 10.0  # seconds for FFmpeg to finish cleanly when stopped
+
+
+class StreamHandle:
+    """
+    a running stream: stop() it, await wait() for its end, and read its live statistics
+    """
+
+    def __init__(
+        self,
+        stream: Livestream,
+        sinks: list[str] | None = None,
+        streams: T.Mapping[str, Livestream] | None = None,
+    ):
+        self.stream = stream
+        self.stats = stream.stats
+        self.sinks = sinks
+        self.streams = streams
+
+        self.proc: asyncio.subprocess.Process | None = None
+        self.listener: T.Any = None
+        self._stopping = asyncio.Event()
+        self._task: asyncio.Task[int] | None = None
+
+    async def start(self) -> StreamHandle:
+        s = self.stream
+
+        if s.docheck:
+            await asyncio.to_thread(s.check_device)
+        if s.site == "localhost":
+            self.listener = await asyncio.to_thread(s.start_listener)
+
+        metrics.start(s.metrics_port, s.metrics_file, s.metrics_interval)
+        metrics.register(s)
+
+        self._task = asyncio.create_task(self._run(), name=f"stream-{s.site}")
+
+        return self
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def snapshot(self) -> dict[str, T.Any]:
+        """
+        encoder statistics, and per-site statistics with isolated sinks
+        """
+
+        return self.stats.snapshot() | {
+            "sinks": self.stream.fanout.stats() if self.stream.fanout else {}
+        }
+
+    def stop(self) -> None:
+        """
+        end the stream. FFmpeg is asked to finish, and killed if it doesn't within STOP_TIMEOUT
+        """
+
+        self._stopping.set()
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.terminate()
+            asyncio.get_running_loop().call_later(STOP_TIMEOUT, self._kill, self.proc)
+
+    @staticmethod
+    def _kill(proc: asyncio.subprocess.Process) -> None:
+        if proc.returncode is None:
+            logging.warning("FFmpeg did not stop, killing")
+            proc.kill()
+
+    async def wait(self) -> int:
+        """
+        wait for the stream to end, returning the FFmpeg exit code
+        """
+
+        assert self._task is not None, "stream not started"
+
+        return await asyncio.shield(self._task)
+
+    async def _run(self) -> int:
+        s = self.stream
+        restarts = Restarts(
+            self.stats, s.restart_max_delay, s.max_restarts, name=f"{s.site}: encoder"
+        )
+        ret = 0
+
+        try:
+            while not self._stopping.is_set():
+                restarts.started()
+                ret = await self._encode()
+
+                if self._stopping.is_set() or not s.supervise:
+                    break
+                if (delay := restarts.delay(ret)) is None:
+                    break
+
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            metrics.unregister(s)
+            if self.listener is not None and self.listener.poll() is None:
+                self.listener.terminate()
+
+        return ret
+
+    async def _encode(self) -> int:
+        """
+        run FFmpeg once until it ends
+        """
+
+        s = self.stream
+        cmd = s.command(self.sinks, self.streams)
+        cmd = s.cpu.wrap([cmd[0]] + PROGRESS + cmd[1:])
+        logging.info(" ".join(cmd))
+
+        # with isolated sinks, FFmpeg output is read by FanOut in a thread, from a plain pipe
+        rfd = wfd = None
+        stdout: int | None = None
+        if s.fanout:
+            rfd, wfd = os.pipe()
+            stdout = wfd
+
+        self.stats.begin()
+        ret = None
+        feeder = None
+        try:
+            if sys.platform == "win32":
+                # shell for device names in "" quotes, as utils.run
+                self.proc = await asyncio.create_subprocess_shell(
+                    " ".join(cmd), stdout=stdout, stderr=subprocess.PIPE
+                )
+            else:
+                self.proc = await asyncio.create_subprocess_exec(
+                    *cmd, stdout=stdout, stderr=subprocess.PIPE
+                )
+            s.cpu.apply(self.proc.pid)
+
+            if rfd is not None:
+                assert wfd is not None
+                os.close(wfd)
+                wfd = None
+                feeder = asyncio.create_task(asyncio.to_thread(s.fanout.feed, os.fdopen(rfd, "rb")))
+                rfd = None
+
+            watchdog = None
+            if s.supervise and s.stall_timeout:
+                watchdog = asyncio.create_task(self._watchdog(self.proc, s.stall_timeout))
+
+            try:
+                ret = await self._read_progress(self.proc)
+            finally:
+                if watchdog is not None:
+                    watchdog.cancel()
+                if feeder is not None:
+                    await feeder
+        finally:
+            for fd in (rfd, wfd):
+                if fd is not None:
+                    os.close(fd)
+            self.stats.end(ret)
+
+        return ret
+
+    async def _read_progress(self, proc: asyncio.subprocess.Process) -> int:
+        assert proc.stderr is not None
+
+        parser = ProgressParser(self.stats)
+        try:
+            async for raw in proc.stderr:
+                parser.line(raw)
+
+            return await proc.wait()
+        except asyncio.CancelledError:
+            proc.kill()
+            raise
+
+    async def _watchdog(self, proc: asyncio.subprocess.Process, timeout: float) -> None:
+        while proc.returncode is None:
+            await asyncio.sleep(min(1.0, timeout / 4))
+
+            if proc.returncode is None and stalled(
+                self.stats, timeout, f"{self.stream.site}: encoder"
+            ):
+                proc.terminate()
+                asyncio.get_running_loop().call_later(STOP_TIMEOUT, self._kill, proc)
+                return
+
+
+async def golive(streams: T.Mapping[str, Livestream]) -> StreamHandle:
+    """
+    start streaming to all sites of an operator (FileIn, Screenshare, ...), as its golive()
+    """
+
+    from .base import unify_streams
+
+    sinks = [s.sink for s in streams.values()]
+
+    return await StreamHandle(streams[unify_streams(streams)], sinks, streams).start()
@@ -6,6 +6,12 @@ import typing
 
 from .stream import Stream
 from .utils import run, check_device
+from .progress import EncoderStats
+from .supervise import Supervisor
+from . import metrics
+
+if typing.TYPE_CHECKING:
+    from .aio import StreamHandle
 
 __all__ = ["FileIn", "Microphone", "SaveDisk", "Screenshare", "Camera"]
 
@@ -19,8 +25,13 @@ class Livestream(Stream):
         self.osparam(inifn)
 
         self.docheck = kwargs.get("docheck")
+        # live encoder statistics, updated while streaming
+        self.stats = EncoderStats()
+        # fanout.FanOut, while streaming to isolated sinks
+        self.fanout: typing.Any = None
 
         self.video_bitrate()
+        self.plan_copy()
 
         vidIn: list[str] = self.videoIn()
         vidOut: list[str] = self.videoOut()
@@ -29,26 +40,33 @@ class Livestream(Stream):
         audOut: list[str] = self.audioOut()
 
         buf: list[str] = self.buffer()
+
+        self.input_args: list[str] = vidIn + audIn
+        # terminate output after N seconds, IF specified
+        self.output_args: list[str] = vidOut + audOut + buf + self.timelimit
+
+        self.vfilters: list[str] = []
+        if not self.movingimage:  # FIXME: need a different filter chain to caption moving images
+            self.vfilters += self.F.drawtext(self.caption)[1:]
+        self.vfilters += self.conform()[1:]
         # %% begin to setup command line
         cmd: list[str] = []
         cmd.append(self.exe)
 
         cmd += self.loglevel
         cmd += self.yes
+        cmd += self.filter_threading()
 
         #        cmd += self.timelimit  # terminate input after N seconds, IF specified
 
         cmd += self.queue
 
-        cmd += vidIn + audIn
-
-        if not self.movingimage:  # FIXME: need a different filter chain to caption moving images
-            cmd += self.F.drawtext(self.caption)
+        cmd += self.input_args
 
-        cmd += vidOut + audOut
-        cmd += buf
+        if self.vfilters:
+            cmd += ["-vf", ",".join(self.vfilters)]
 
-        cmd.extend(self.timelimit)  # terminate output after N seconds, IF specified
+        cmd += self.output_args
 
         streamid = self.streamid if hasattr(self, "streamid") else ""
         # cannot have double quotes for Mac/Linux,
@@ -58,7 +76,8 @@ class Livestream(Stream):
             sink = '"' + sink + '"'
 
         self.sink = sink
-        cmd.append(sink)
+        # must manually specify container format when streaming to web.
+        cmd += ["-f", "flv", sink]
 
         self.cmd: list[str] = cmd
         # %% quick check command, to verify device exists
@@ -75,7 +94,11 @@ class Livestream(Stream):
             + ["-f", "null", "-"]  # camera needs at output
         )
 
-    def startlive(self, sinks: list[str] | None = None):
+    def startlive(
+        self,
+        sinks: list[str] | None = None,
+        streams: typing.Mapping[str, Livestream] | None = None,
+    ):
         """
         start the stream(s)
         """
@@ -88,21 +111,87 @@ class Livestream(Stream):
         if self.site == "localhost-test":
             pass
         elif self.site == "localhost":
-            proc = self.F.listener()  # start own RTMP server
+            proc = self.start_listener()
 
         if proc is not None and proc.poll() is not None:
             # listener stopped prematurely, probably due to error
             raise RuntimeError(f"listener stopped with code {proc.poll()}")
         # %% RUN STREAM
+        metrics.start(self.metrics_port, self.metrics_file, self.metrics_interval)
+        metrics.register(self)
+        try:
+            if self.supervise:
+                Supervisor(
+                    self.stats, retry_max=self.restart_max_delay, max_restarts=self.max_restarts
+                ).run(lambda: self.run_ffmpeg(sinks, streams))
+            else:
+                self.run_ffmpeg(sinks, streams)
+        finally:
+            metrics.unregister(self)
+
+        # %% stop the listener before starting the next process, or upon final process closing.
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+        yield
+
+    def start_listener(self):
+        """
+        start own RTMP server for the "localhost" site, recording if configured
+        """
+
+        rec = Path(self.listener_record).expanduser() if self.listener_record else None
+
+        return self.F.listener(self.listener, rec)
+
+    def run_ffmpeg(
+        self,
+        sinks: list[str] | None = None,
+        streams: typing.Mapping[str, Livestream] | None = None,
+    ) -> int:
+        """
+        run FFmpeg until the stream ends, returning its exit code
+
+        streams: all the site streams, to encode a ladder if "encode_ladder" is configured
+        """
+
+        cmd = self.command(sinks, streams)
+        feed = self.fanout.feed if self.fanout else None
+        stall = self.stall_timeout if self.supervise else None
+
+        return run(cmd, stats=self.stats, feed=feed, stall=stall, cpu=self.cpu)
+
+    def command(
+        self,
+        sinks: list[str] | None = None,
+        streams: typing.Mapping[str, Livestream] | None = None,
+    ) -> list[str]:
+        """
+        FFmpeg command sending the stream to sinks.
+        With "isolated_sinks", FFmpeg writes FLV to stdout, to be fed to .fanout
+        """
+
+        self.fanout = None
+
         if not sinks:  # single stream
-            run(self.cmd)
+            return self.cmd
         elif self.movingimage:
             if len(sinks) > 1:
                 logging.warning(f"streaming only to {sinks[0]}")
 
-            run(self.cmd)
+            return self.cmd
         elif len(sinks) == 1:
-            run(self.cmd)
+            return self.cmd
+        elif streams and self.encode_ladder and (cmd := ladder_cmd(streams)) is not None:
+            return cmd
+        elif self.isolated_sinks:
+            # each site fed from its own queue, so one failing site doesn't affect the others
+            from .fanout import FanOut
+
+            names = list(streams) if streams else [f"sink{i}" for i in range(len(sinks))]
+            self.fanout = FanOut(dict(zip(names, sinks)), self.exe, self.sink_max_lag)
+
+            vmap, amap = self.maps()
+            return self.cmd[:-3] + ["-map", vmap, "-map", amap, "-f", "flv", "pipe:1"]
         else:
             """
             multi-stream output tee
@@ -111,40 +200,30 @@ class Livestream(Stream):
             """
             cmdstem: list[str] = self.cmd[:-3]
             # +global_header is necessary to tee to multiple services
-            cmd: list[str] = cmdstem + ["-flags:v", "+global_header", "-f", "tee"]
+            cmd = cmdstem + ["-flags:v", "+global_header", "-f", "tee"]
 
-            if self.image:
-                #  connect image to video stream, audio file to audio stream
-                cmd += ["-map", "0:v", "-map", "1:a"]
-            else:
-                if self.vidsource == "file":
-                    # picks first video and audio stream, often correct
-                    cmd += ["-map", "0:v", "-map", "0:a:0"]
-                else:
-                    # device (Camera)
-                    # connect video device to video stream,
-                    # audio device to audio stream
-                    cmd += ["-map", "0:v", "-map", "1:a"]
-
-            # cannot have double quotes for Mac/Linux,
-            #    but need double quotes for Windows
-            if os.name == "nt":
-                sink = f'"[f=flv]{sinks[0][1:-1]}'
-                for s in sinks[1:]:
-                    sink += f"|[f=flv]{s[1:-1]}"
-                sink += '"'
-            else:
-                sink = f"[f=flv]{sinks[0]}"
-                for s in sinks[1:]:
-                    sink += f"|[f=flv]{s}"
+            vmap, amap = self.maps()
+            cmd += ["-map", vmap, "-map", amap]
 
-            cmd.append(sink)
-            run(cmd)
+            cmd.append(tee_sink(sinks))
+            return cmd
 
-        # %% stop the listener before starting the next process, or upon final process closing.
-        if proc is not None and proc.poll() is None:
-            proc.terminate()
-        yield
+    def maps(self) -> tuple[str, str]:
+        """
+        video and audio input streams, when mapping explicitly for multiple outputs
+        """
+
+        if self.image:
+            #  connect image to video stream, audio file to audio stream
+            return "0:v", "1:a"
+        elif self.vidsource == "file":
+            # picks first video and audio stream, often correct
+            return "0:v", "0:a:0"
+        else:
+            # device (Camera)
+            # connect video device to video stream,
+            # audio device to audio stream
+            return "0:v", "1:a"
 
     def check_device(self, site: str | None = None) -> bool:
         """
@@ -183,10 +262,19 @@ class Screenshare:
         sinks: list[str] = [self.streams[stream].sink for stream in self.streams]
 
         try:
-            next(self.streams[unify_streams(self.streams)].startlive(sinks))
+            next(self.streams[unify_streams(self.streams)].startlive(sinks, self.streams))
         except StopIteration:
             pass
 
+    async def agolive(self) -> StreamHandle:
+        """
+        start streaming from a running asyncio event loop, returning at once. See aio.py
+        """
+
+        from .aio import golive
+
+        return await golive(self.streams)
+
 
 class Camera:
     def __init__(self, inifn: Path, websites: list[str], **kwargs):
@@ -205,10 +293,19 @@ class Camera:
         sinks: list[str] = [self.streams[stream].sink for stream in self.streams]
 
         try:
-            next(self.streams[unify_streams(self.streams)].startlive(sinks))
+            next(self.streams[unify_streams(self.streams)].startlive(sinks, self.streams))
         except StopIteration:
             pass
 
+    async def agolive(self) -> StreamHandle:
+        """
+        start streaming from a running asyncio event loop, returning at once. See aio.py
+        """
+
+        from .aio import golive
+
+        return await golive(self.streams)
+
 
 class Microphone:
     def __init__(self, inifn: Path, websites: list[str], **kwargs):
@@ -227,10 +324,19 @@ class Microphone:
         sinks: list[str] = [self.streams[stream].sink for stream in self.streams]
 
         try:
-            next(self.streams[unify_streams(self.streams)].startlive(sinks))
+            next(self.streams[unify_streams(self.streams)].startlive(sinks, self.streams))
         except StopIteration:
             pass
 
+    async def agolive(self) -> StreamHandle:
+        """
+        start streaming from a running asyncio event loop, returning at once. See aio.py
+        """
+
+        from .aio import golive
+
+        return await golive(self.streams)
+
 
 # %% File-based inputs
 class FileIn:
@@ -250,10 +356,19 @@ class FileIn:
         sinks: list[str] = [self.streams[stream].sink for stream in self.streams]
 
         try:
-            next(self.streams[unify_streams(self.streams)].startlive(sinks))
+            next(self.streams[unify_streams(self.streams)].startlive(sinks, self.streams))
         except StopIteration:
             pass
 
+    async def agolive(self) -> StreamHandle:
+        """
+        start streaming from a running asyncio event loop, returning at once. See aio.py
+        """
+
+        from .aio import golive
+
+        return await golive(self.streams)
+
 
 class SaveDisk(Stream):
     def __init__(self, inifn: Path, outfn: Path | None = None, **kwargs):
@@ -265,6 +380,7 @@ class SaveDisk(Stream):
         super().__init__(inifn, site="file", vidsource="screen", **kwargs)
 
         self.outfn = Path(outfn).expanduser() if outfn else None
+        self.stats = EncoderStats()
 
         self.osparam(inifn)
 
@@ -290,12 +406,75 @@ class SaveDisk(Stream):
     def save(self):
 
         if self.outfn:
-            run(self.cmd)
+            run(self.cmd, stats=self.stats, cpu=self.cpu)
 
         else:
             print("specify filename to save screen capture w/ audio to disk.")
 
 
+def tee_sink(sinks: list[str]) -> str:
+    """
+    tee muxer output sending the same stream to each sink.
+    A sink that fails is dropped, without ending the stream to the others.
+    """
+
+    # cannot have double quotes for Mac/Linux,
+    #    but need double quotes for Windows
+    if os.name == "nt":
+        return '"' + "|".join(f"[f=flv:onfail=ignore]{s[1:-1]}" for s in sinks) + '"'
+
+    return "|".join(f"[f=flv:onfail=ignore]{s}" for s in sinks)
+
+
+def ladder_cmd(streams: typing.Mapping[str, Livestream]) -> list[str] | None:
+    """
+    one FFmpeg that decodes and filters the input once, split to one encoder per distinct
+    site profile (bitrate, keyframe interval, audio...), so each site gets its own spec.
+    Sites with identical profiles share an encoder, through the tee muxer.
+
+    Returns None if all sites share one profile, or the input can't be split,
+    where the plain tee of one encode is used instead.
+    """
+
+    first = next(iter(streams.values()))
+    if first.movingimage or not first.res:
+        return None
+
+    groups: dict[tuple[str, ...], list[Livestream]] = {}
+    for s in streams.values():
+        groups.setdefault(tuple(s.output_args), []).append(s)
+
+    if len(groups) < 2:
+        return None
+
+    vmap, amap = first.maps()
+    # video copied for a site doesn't need decoding, the other profiles share one decode
+    encoded = [g for g in groups.values() if not g[0].copy_video]
+
+    cmd = [first.exe] + first.loglevel + first.yes + first.filter_threading() + first.queue
+    cmd += first.input_args
+
+    labels: list[str] = []
+    if encoded:
+        labels = [f"[v{i}]" for i in range(len(encoded))]
+        chain = ",".join(first.vfilters + [f"split={len(encoded)}"])
+        cmd += ["-filter_complex", f"[{vmap}]{chain}{''.join(labels)}"]
+
+    for group in groups.values():
+        s = group[0]
+        v = labels[encoded.index(group)] if group in encoded else vmap
+
+        cmd += ["-map", v, "-map", amap] + s.output_args
+
+        if len(group) == 1:
+            cmd += ["-f", "flv", s.sink]
+        else:
+            # +global_header is necessary to tee to multiple services
+            cmd += ["-flags:v", "+global_header", "-f", "tee", tee_sink([x.sink for x in group])]
+
+    return cmd
+
+
 def unify_streams(streams: typing.Mapping[str, Stream]) -> str:
     """
     find least common denominator stream settings,
@@ -0,0 +1,332 @@
+"""
+persistent on-disk caches
+
+FFprobe metadata is keyed by (path, size, mtime_ns), so an edited or replaced file
+is re-probed automatically while unchanged files are never probed twice.
+
+Downloaded clips are keyed by generation task id when known, else by URL,
+so replays of a clip are served from disk even if its signed URL has changed.
+
+The cache directory may be overridden by environment variable PYLIVESTREAM_CACHE.
+"""
+
+from __future__ import annotations
+import typing as T
+from pathlib import Path
+import os
+import sys
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import functools
+
+__all__ = ["cache_dir", "file_key", "clip_key", "ProbeCache", "BlobCache", "get_probe_cache"]
+
+
+def cache_dir(*parts: str) -> Path:
+    """
+    per-user cache directory for PyLivestream
+    """
+
+    if root := os.environ.get("PYLIVESTREAM_CACHE"):
+        d = Path(root)
+    elif sys.platform == "win32":
+        d = (
+            Path(os.environ.get("LOCALAPPDATA", Path.home() / "AppData/Local"))
+            / "pylivestream/cache"
+        )
+    elif sys.platform == "darwin":
+        d = Path.home() / "Library/Caches/pylivestream"
+    else:
+        d = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "pylivestream"
+
+    return d.expanduser().joinpath(*parts)
+
+
+def file_key(fn: Path, kind: str = "meta") -> str:
+    """
+    cache key of a file: changes if the file is moved, resized or modified
+    """
+
+    fn = Path(fn).expanduser().resolve()
+    st = fn.stat()
+
+    return hashlib.sha256(f"{kind}\0{fn}\0{st.st_size}\0{st.st_mtime_ns}".encode()).hexdigest()
+
+
+def clip_key(url: str, task_id: str | None = None) -> str:
+    """
+    cache key of a downloaded clip: by task id if known, since URLs may be signed and expire
+    """
+
+    name = f"task\0{task_id}" if task_id else f"url\0{url}"
+
+    return hashlib.sha256(name.encode()).hexdigest()
+
+
+def atomic_write_text(fn: Path, text: str) -> None:
+    """
+    write to a temporary file in the same directory, then rename over the target,
+    so concurrent readers never see a partial file.
+    """
+
+    fn.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp = tempfile.mkstemp(dir=fn.parent, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp, fn)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+class ProbeCache:
+    """
+    FFprobe JSON cache: one small JSON file per entry, with an in-memory layer
+    in front so repeated lookups in one process don't touch the disk.
+
+    Entries are evicted least recently used first once there are more than max_entries.
+    """
+
+    def __init__(self, root: Path | None = None, max_entries: int = 20000):
+        self.root = Path(root).expanduser() if root else cache_dir("probe")
+        self.max_entries = max_entries
+
+        self._mem: dict[str, dict[str, T.Any]] = {}
+        self._count: int | None = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _entries(self) -> list[Path]:
+        return list(self.root.glob("??/*.json"))
+
+    def get(self, fn: Path, kind: str = "meta") -> dict[str, T.Any] | None:
+        """
+        cached data for file, or None if not cached
+        """
+
+        try:
+            key = file_key(fn, kind)
+        except OSError:
+            return None
+
+        if (meta := self._mem.get(key)) is not None:
+            return meta
+
+        p = self._path(key)
+        try:
+            meta = json.loads(p.read_text())
+            os.utime(p)  # mark as recently used
+        except (OSError, ValueError):
+            return None
+
+        self._mem[key] = meta
+
+        return meta
+
+    def put(self, fn: Path, meta: dict[str, T.Any], kind: str = "meta") -> None:
+        key = file_key(fn, kind)
+
+        self._mem[key] = meta
+
+        p = self._path(key)
+        new = not p.is_file()
+        try:
+            atomic_write_text(p, json.dumps(meta))
+        except OSError as e:
+            logging.debug(f"could not write cache entry {p}: {e}")
+            return
+
+        if new:
+            self._added()
+
+    def invalidate(self, fn: Path | None = None, kind: str = "meta") -> None:
+        """
+        drop cached data for one file, or the whole cache if fn is None
+        """
+
+        with self._lock:
+            if fn is None:
+                self._mem.clear()
+                for p in self._entries():
+                    p.unlink(missing_ok=True)
+                self._count = 0
+                return
+
+            try:
+                key = file_key(fn, kind)
+            except OSError:
+                return
+
+            self._mem.pop(key, None)
+            p = self._path(key)
+            if p.is_file():
+                p.unlink()
+                if self._count:
+                    self._count -= 1
+
+    def evict(self, keep: int | None = None) -> int:
+        """
+        remove least recently used entries beyond keep (default max_entries).
+        Returns number of entries removed.
+        """
+
+        if keep is None:
+            keep = self.max_entries
+
+        with self._lock:
+            entries = []
+            for p in self._entries():
+                try:
+                    entries.append((p.stat().st_mtime_ns, p))
+                except OSError:
+                    pass
+
+            entries.sort(reverse=True)
+            for _, p in entries[keep:]:
+                p.unlink(missing_ok=True)
+                self._mem.pop(p.stem, None)
+
+            self._count = min(len(entries), keep)
+
+            return max(len(entries) - keep, 0)
+
+    def _added(self) -> None:
+        """
+        count new entries, scanning the directory only once per process
+        """
+
+        with self._lock:
+            if self._count is None:
+                self._count = len(self._entries())
+            else:
+                self._count += 1
+
+            over = self._count > self.max_entries
+
+        if over:
+            # evict a little extra so we don't rescan on every put
+            self.evict(self.max_entries * 9 // 10)
+
+
+class BlobCache:
+    """
+    large files such as transcoded video, stored by key (e.g. a content hash).
+
+    Least recently used files are evicted once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root).expanduser()
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+
+    def path(self, key: str, suffix: str = "") -> Path:
+        return self.root / key[:2] / f"{key}{suffix}"
+
+    def _entries(self) -> list[Path]:
+        return [p for p in self.root.glob("??/*") if not p.name.startswith(".")]
+
+    def get(self, key: str, suffix: str = "") -> Path | None:
+        """
+        path of cached file, or None if not cached
+        """
+
+        p = self.path(key, suffix)
+        try:
+            os.utime(p)  # mark as recently used
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+
+        return p
+
+    def new_file(self, suffix: str = "") -> Path:
+        """
+        new temporary file in the cache, to be moved into place by put()
+        """
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".", suffix=f"{suffix}.part")
+        os.close(fd)
+
+        return Path(tmp)
+
+    def put(self, key: str, src: Path, suffix: str = "", keep: T.Collection[Path] = ()) -> Path:
+        """
+        move finished file src (from new_file()) into the cache,
+        evicting others beyond max_bytes except those in keep.
+        """
+
+        p = self.path(key, suffix)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(src, p)
+
+        self.evict(keep={p, *keep})
+
+        return p
+
+    def size(self) -> int:
+        return sum(p.stat().st_size for p in self._entries())
+
+    def stats(self) -> dict[str, T.Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes": self.size(),
+            "max_bytes": self.max_bytes,
+        }
+
+    def evict(self, max_bytes: int | None = None, keep: T.Collection[Path] = ()) -> int:
+        """
+        remove least recently used files until total size is within max_bytes,
+        except those in keep (e.g. now playing).
+        Returns number of bytes removed.
+        """
+
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+
+        with self._lock:
+            entries = []
+            for p in self._entries():
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, p))
+
+            total = sum(e[1] for e in entries)
+            removed = 0
+
+            for _, size, p in sorted(entries):
+                if total - removed <= max_bytes:
+                    break
+                if p in keep:
+                    continue
+                p.unlink(missing_ok=True)
+                removed += size
+
+        if total - removed > max_bytes:
+            logging.warning(f"{self.root} is over its size limit {max_bytes} bytes")
+
+        return removed
+
+
+@functools.cache
+def get_probe_cache() -> ProbeCache:
+    return ProbeCache()
@@ -0,0 +1,204 @@
+"""
+calibrate encoder presets against this computer
+
+Short timed encodes of the bundled bunny.avi and an FFmpeg lavfi test source
+measure how many frames/sec each preset sustains at each resolution.
+The results are saved per host, and used when pylivestream.json has "preset": "auto"
+to pick the slowest (best quality) preset that still holds realtime with headroom.
+
+python -m pylivestream.calibrate ./pylivestream.json
+"""
+
+from __future__ import annotations
+import typing as T
+from pathlib import Path
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import time
+
+from .cache import cache_dir, atomic_write_text
+from .ffmpeg import get_exe, get_version
+
+# fastest first
+PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow"]
+HEIGHTS = [480, 720, 1080]
+FRAMES = 150
+# required encoder speed relative to realtime
+HEADROOM = 1.3
+# used if not calibrated yet
+DEFAULT_PRESET = "veryfast"
+
+
+def model_file(codec: str) -> Path:
+    return cache_dir("calibration", f"{platform.node() or 'host'}-{codec}.json")
+
+
+def load_model(codec: str) -> dict[str, T.Any] | None:
+    """
+    saved calibration of this host for video codec, or None if not calibrated
+    """
+
+    try:
+        return json.loads(model_file(codec).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def capacity(model: dict[str, T.Any], preset: str, height: int) -> float | None:
+    """
+    frames/sec this host can encode with preset at vertical resolution height.
+
+    Unmeasured resolutions scale from the nearest measured one by pixel count.
+    """
+
+    table = model.get("fps", {}).get(preset)
+    if not table:
+        return None
+
+    measured = {int(h): float(v) for h, v in table.items()}
+    h0 = min(measured, key=lambda h: abs(h - height))
+
+    return measured[h0] * (h0 / height) ** 2
+
+
+def pick_preset(
+    model: dict[str, T.Any], height: int, fps: float, headroom: float = HEADROOM
+) -> str | None:
+    """
+    slowest preset that sustains fps * headroom at height, or None if even the fastest can't
+    """
+
+    for preset in reversed(PRESETS):
+        if (c := capacity(model, preset, height)) is not None and c >= fps * headroom:
+            return preset
+
+    return None
+
+
+def choose_preset(codec: str, height: int | None, fps: float, exe: str | None = None) -> str:
+    """
+    preset for "preset": "auto" from this host's calibration,
+    warning if it was measured with another FFmpeg than exe
+    """
+
+    if not height:
+        height = 480
+
+    if (model := load_model(codec)) is None:
+        logging.warning(
+            f"no encoder calibration for {codec}, using {DEFAULT_PRESET}. "
+            "Run python -m pylivestream.calibrate"
+        )
+        return DEFAULT_PRESET
+
+    if exe and (v := model.get("ffmpeg")) and v != get_version(exe):
+        logging.warning(
+            f"encoder calibration for {codec} was made with {v}, "
+            "re-run python -m pylivestream.calibrate"
+        )
+
+    if (preset := pick_preset(model, height, fps)) is None:
+        preset = PRESETS[0]
+        logging.warning(f"this computer may not sustain {height}p {fps} fps even with {preset}")
+
+    return preset
+
+
+def lavfi_source(height: int) -> str:
+    """
+    16:9 test pattern, with width rounded to even as yuv420p requires
+    """
+
+    return f"testsrc2=size={2 * round(height * 8 / 9)}x{height}:rate=30"
+
+
+def timed_encode(
+    exe: str, codec: str, preset: str, height: int, source: Path | None, frames: int = FRAMES
+) -> float:
+    """
+    encode frames to null output, returning frames/sec achieved.
+    source None uses FFmpeg lavfi testsrc2.
+    """
+
+    cmd = [exe, "-loglevel", "error", "-nostdin"]
+    if source is None:
+        cmd += ["-f", "lavfi", "-i", lavfi_source(height)]
+    else:
+        cmd += ["-stream_loop", "-1", "-i", str(source), "-vf", f"scale=-2:{height}"]
+
+    cmd += ["-frames:v", str(frames), "-an", "-codec:v", codec, "-preset", preset]
+    cmd += ["-pix_fmt", "yuv420p", "-f", "null", "-"]
+
+    tic = time.monotonic()
+    subprocess.run(cmd, check=True)
+
+    return frames / (time.monotonic() - tic)
+
+
+def calibrate(
+    exe: str,
+    codec: str,
+    presets: list[str] = PRESETS,
+    heights: list[int] = HEIGHTS,
+    frames: int = FRAMES,
+) -> dict[str, T.Any]:
+    """
+    measure and save encoder capacity of this host
+    """
+
+    import importlib.resources
+
+    model: dict[str, T.Any] = {
+        "host": platform.node(),
+        "cpu_count": os.cpu_count(),
+        "codec": codec,
+        "ffmpeg": get_version(exe),
+        "time": time.time(),
+        "fps": {},
+    }
+
+    with importlib.resources.as_file(
+        importlib.resources.files(f"{__package__}.data").joinpath("bunny.avi")
+    ) as bunny:
+        for preset in presets:
+            model["fps"][preset] = {}
+            for height in heights:
+                # the slower of real footage and synthetic source, to be conservative
+                c = min(
+                    timed_encode(exe, codec, preset, height, src, frames) for src in (bunny, None)
+                )
+                model["fps"][preset][str(height)] = c
+                print(f"{preset:>10} {height:>5}p {c:8.1f} frames/sec")
+
+    atomic_write_text(model_file(codec), json.dumps(model, indent=2))
+
+    return model
+
+
+def cli():
+    p = argparse.ArgumentParser(description="calibrate encoder presets against this computer")
+    p.add_argument("json", help="JSON file with stream parameters")
+    p.add_argument("-presets", help="presets to measure", nargs="+", default=PRESETS)
+    p.add_argument("-heights", help="vertical resolutions to measure", nargs="+", type=int)
+    p.add_argument("-frames", help="frames to encode per measurement", type=int, default=FRAMES)
+    P = p.parse_args()
+
+    C = json.loads(Path(P.json).expanduser().read_text())
+    codec = C.get("video_codec", "libx264")
+
+    model = calibrate(
+        get_exe(C.get("exe", "ffmpeg")), codec, P.presets, P.heights or HEIGHTS, P.frames
+    )
+
+    print(f"\nsaved {model_file(codec)}\n")
+    for height in P.heights or HEIGHTS:
+        for fps in (30, 60):
+            print(f"{height}p {fps} fps: {pick_preset(model, height, fps) or 'too slow'}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,7 +1,9 @@
 import subprocess
+import json
 import re
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 def parse_mylist_txt(mylist_path):
 	"""
@@ -24,7 +26,7 @@ def parse_mylist_txt(mylist_path):
 
 def get_media_info(filepath):
 	"""
-	Use ffprobe to extract key video/audio information for the given file.
+	Use a single ffprobe run to extract key video/audio information for the given file.
 	
 	Returns a dict, for example:
 	{
@@ -39,54 +41,25 @@ def get_media_info(filepath):
 	If a stream is missing (e.g. no audio), the corresponding fields may be None.
 	"""
 	
-	# ffprobe commands to get video info
-	# - show_entries for video stream: 'codec_name,width,height,avg_frame_rate'
-	# - show_entries for audio stream: 'codec_name,sample_rate,channels'
-	cmd_video = [
+	# one ffprobe for both the first video and first audio stream, as JSON
+	cmd = [
 		"ffprobe",
 		"-v", "error",
-		"-select_streams", "v:0",
-		"-show_entries", "stream=codec_name,width,height,avg_frame_rate",
-		"-of", "default=noprint_wrappers=1:nokey=1",
+		"-show_entries", "stream=codec_type,codec_name,width,height,avg_frame_rate,sample_rate,channels",
+		"-of", "json",
 		filepath
 	]
 	
-	cmd_audio = [
-		"ffprobe",
-		"-v", "error",
-		"-select_streams", "a:0",
-		"-show_entries", "stream=codec_name,sample_rate,channels",
-		"-of", "default=noprint_wrappers=1:nokey=1",
-		filepath
-	]
-	
-	# Run ffprobe for video
-	try:
-		video_out = subprocess.check_output(cmd_video, stderr=subprocess.STDOUT)
-		video_lines = video_out.decode("utf-8", errors="replace").splitlines()
-		# Expecting up to 4 lines: codec, width, height, avg_frame_rate
-		if len(video_lines) >= 4:
-			video_codec, width, height, fps = video_lines[:4]
-		else:
-			# Might be no video track at all
-			video_codec, width, height, fps = (None, None, None, None)
-	except subprocess.CalledProcessError:
-		# Means no video or an error
-		video_codec, width, height, fps = (None, None, None, None)
-	
-	# Run ffprobe for audio
 	try:
-		audio_out = subprocess.check_output(cmd_audio, stderr=subprocess.STDOUT)
-		audio_lines = audio_out.decode("utf-8", errors="replace").splitlines()
-		# Expecting up to 3 lines: codec, sample_rate, channels
-		if len(audio_lines) >= 3:
-			audio_codec, sample_rate, channels = audio_lines[:3]
-		else:
-			# Might be no audio track
-			audio_codec, sample_rate, channels = (None, None, None)
-	except subprocess.CalledProcessError:
-		# Means no audio or an error
-		audio_codec, sample_rate, channels = (None, None, None)
+		out = subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
+		streams = json.loads(out.decode("utf-8", errors="replace")).get("streams", [])
+	except (subprocess.CalledProcessError, ValueError):
+		# Means unreadable file or an error
+		streams = []
+	
+	# like -select_streams v:0 / a:0, take the first stream of each type
+	video = next((s for s in streams if s.get("codec_type") == "video"), {})
+	audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
 	
 	# Convert width/height/sample_rate/channels to ints if possible
 	def to_int(val):
@@ -96,32 +69,51 @@ def get_media_info(filepath):
 			return None
 	
 	info = {
-		'video_codec': video_codec,
-		'width': to_int(width),
-		'height': to_int(height),
-		'fps': fps,  # We'll keep the raw fraction string e.g. '30/1'
-		'audio_codec': audio_codec,
-		'sample_rate': to_int(sample_rate),
-		'channels': to_int(channels),
+		'video_codec': video.get('codec_name'),
+		'width': to_int(video.get('width')),
+		'height': to_int(video.get('height')),
+		'fps': video.get('avg_frame_rate'),  # We'll keep the raw fraction string e.g. '30/1'
+		'audio_codec': audio.get('codec_name'),
+		'sample_rate': to_int(audio.get('sample_rate')),
+		'channels': to_int(audio.get('channels')),
 	}
 	
 	return info
 
+def iter_media_info(file_paths, workers=None):
+	"""
+	Run get_media_info across a worker pool.
+	Yields results in the order of file_paths, each as soon as it (and those before it) are done.
+	
+	If the consumer stops early, e.g. on the first incompatible file, pending probes are cancelled.
+	"""
+	if workers is None:
+		workers = min(32, 2 * (os.cpu_count() or 1))
+	
+	pool = ThreadPoolExecutor(max_workers=workers)
+	try:
+		yield from pool.map(get_media_info, file_paths)
+	finally:
+		pool.shutdown(wait=False, cancel_futures=True)
+
 def check_compatibility(file_info_list):
 	"""
 	Check that all dictionaries in file_info_list have the same
 	key values for the relevant parameters (video_codec, resolution, fps, audio_codec, etc.).
 	
+	file_info_list may be any iterable, e.g. iter_media_info(), so files are checked as they arrive.
+	
 	Raises ValueError if there's a mismatch. If everything matches, just returns None.
 	"""
-	if not file_info_list:
-		raise ValueError("No files to compare")
+	infos = iter(file_info_list)
 	
 	# Reference info is the first file's properties
-	ref = file_info_list[0]
+	ref = next(infos, None)
+	if ref is None:
+		raise ValueError("No files to compare")
 	print(f"Reference file: {ref}")
 	
-	for idx, info in enumerate(file_info_list[1:], start=2):
+	for idx, info in enumerate(infos, start=2):
 		# Compare to reference
 		mismatches = []
 		
@@ -155,32 +147,31 @@ def check_compatibility(file_info_list):
 				+ "\n".join(mismatches)
 			)
 
-def main(mylist_path):
+def main(mylist_path, workers=None):
 	# 1. Parse the file paths from mylist.txt
 	file_paths = parse_mylist_txt(mylist_path)
 	if not file_paths:
 		print("No file paths found in mylist.txt.")
 		sys.exit(1)
 	
-	# 2. Collect media info for each file
-	file_info_list = []
+	# 2. Keep the files that exist
+	valid_paths = []
 	for fp in file_paths:
 		if not os.path.isfile(fp):
 			print(f"Warning: file does not exist: {fp}")
 			continue
 		
-		info = get_media_info(fp)
-		file_info_list.append(info)
+		valid_paths.append(fp)
 	
-	print("Reference file: ", file_paths[0])
 	# Check we have any valid files
-	if not file_info_list:
+	if not valid_paths:
 		print("No valid files to analyze.")
 		sys.exit(1)
+	print("Reference file: ", valid_paths[0])
 	
-	# 3. Check for compatibility
+	# 3. Collect media info in parallel, checking compatibility as results arrive
 	try:
-		check_compatibility(file_info_list)
+		check_compatibility(iter_media_info(valid_paths, workers))
 		print("All listed files are compatible for concatenation!")
 	except ValueError as e:
 		print("Incompatible files detected:")
@@ -191,10 +182,10 @@ if __name__ == "__main__":
 	# Provide a default, or pass in from the command line
 	# e.g. `python check_compat.py mylist.txt`
 	if len(sys.argv) < 2:
-		print(f"Usage: python {sys.argv[0]} mylist.txt")
+		print(f"Usage: python {sys.argv[0]} mylist.txt [workers]")
 		sys.exit(1)
 	
 	mylist_path = sys.argv[1]
-	main(mylist_path)
+	main(mylist_path, int(sys.argv[2]) if len(sys.argv) > 2 else None)
 	# info = get_media_info("C:/Users/cjdia/Downloads/kling/snake.mp4")
 	# print(info)
@@ -0,0 +1,137 @@
+"""
+CPU cores and scheduling priority of encoder processes
+
+Configured in pylivestream.json:
+
+  "cpu_affinity": [0, 1]   run the encoder on these cores only
+  "nice": 5                lower CPU priority, 0..19 (negative needs privileges)
+  "ionice": "idle"         disk I/O priority class: "idle", "best-effort" or "realtime"
+
+On Linux and macOS, the encoder command is prefixed with taskset, nice and ionice where installed,
+so FFmpeg starts with the policy, every encoder thread inherits it,
+and x264 sizes its thread pool to the allowed cores.
+Otherwise the policy is applied to the started process, on Windows with the optional psutil package.
+Nothing runs in the forked child before exec, which isn't safe with threads.
+"""
+
+from __future__ import annotations
+import logging
+import os
+import shutil
+import sys
+
+IONICE = {"realtime": 1, "best-effort": 2, "idle": 3}
+
+
+class CpuPolicy:
+    def __init__(
+        self,
+        cores: list[int] | None = None,
+        nice: int | None = None,
+        ionice: str | None = None,
+    ):
+        if ionice is not None and ionice not in IONICE:
+            raise ValueError(f"ionice must be one of {list(IONICE)}, not {ionice}")
+
+        self.cores = cores
+        self.nice = nice
+        self.ionice = ionice
+
+    def __bool__(self) -> bool:
+        return bool(self.cores) or self.nice is not None or self.ionice is not None
+
+    def __repr__(self) -> str:
+        return f"CpuPolicy(cores={self.cores}, nice={self.nice}, ionice={self.ionice})"
+
+    def _tools(self) -> dict[str, str]:
+        """
+        setting: command line tool that applies it, for those installed
+        """
+
+        if sys.platform == "win32":
+            return {}
+
+        tools = {}
+        for k, name in (("cores", "taskset"), ("nice", "nice"), ("ionice", "ionice")):
+            if getattr(self, k) and (exe := shutil.which(name)):
+                tools[k] = exe
+
+        return tools
+
+    def wrap(self, cmd: list[str]) -> list[str]:
+        """
+        prefix the command with the tools applying the policy
+        """
+
+        tools = self._tools()
+        prefix = []
+        if "cores" in tools:
+            prefix += [tools["cores"], "-c", ",".join(map(str, self.cores or []))]
+        if "nice" in tools:
+            prefix += [tools["nice"], "-n", str(self.nice)]
+        if "ionice" in tools:
+            prefix += [tools["ionice"], "-c", str(IONICE[self.ionice or ""])]
+
+        return prefix + cmd
+
+    def apply(self, pid: int) -> None:
+        """
+        apply to the started process what wrap() couldn't
+        """
+
+        if not self:
+            return
+
+        if sys.platform == "win32":
+            self._apply_psutil(pid)
+            return
+
+        tools = self._tools()
+        try:
+            if self.cores and "cores" not in tools:
+                if hasattr(os, "sched_setaffinity"):
+                    os.sched_setaffinity(pid, self.cores)
+                else:
+                    logging.warning("CPU affinity is not supported on this platform")
+            if self.nice and "nice" not in tools:
+                os.setpriority(
+                    os.PRIO_PROCESS, pid, os.getpriority(os.PRIO_PROCESS, pid) + self.nice
+                )
+            if self.ionice and "ionice" not in tools:
+                _psutil_ionice(pid, self.ionice)
+        except ProcessLookupError:
+            pass
+
+    def _apply_psutil(self, pid: int) -> None:
+        try:
+            import psutil
+        except ImportError:
+            logging.error("psutil is needed to set CPU affinity or priority on this platform")
+            return
+
+        p = psutil.Process(pid)
+        if self.cores:
+            p.cpu_affinity(self.cores)
+        if self.nice:
+            if self.nice >= 10:
+                p.nice(psutil.IDLE_PRIORITY_CLASS)
+            elif self.nice > 0:
+                p.nice(psutil.BELOW_NORMAL_PRIORITY_CLASS)
+            else:
+                p.nice(psutil.ABOVE_NORMAL_PRIORITY_CLASS)
+        if self.ionice:
+            p.ionice({"realtime": 3, "best-effort": 2, "idle": 0}[self.ionice])
+
+
+def _psutil_ionice(pid: int, name: str) -> None:
+    if not sys.platform.startswith("linux"):
+        logging.warning("ionice is only supported on Linux and Windows")
+        return
+
+    try:
+        import psutil
+    except ImportError:
+        logging.error("ionice needs the ionice program or psutil")
+        return
+
+    psutil.Process(pid).ionice(IONICE[name])
@@ -0,0 +1,284 @@
+"""
+run many playout channels on one host, within its CPU budget
+
+Each channel plays a playlist gaplessly and on loop to its sites, as a supervised encoder
+(restarted on failure or stall), all from one process with the asyncio API.
+Before going live, the encode cost of each channel is estimated in CPU cores from its
+resolution, frame rate and preset, using the host calibration (python -m pylivestream.calibrate)
+if available. Channels are packed onto cores in the order listed; a channel that would take the
+host past cpu_budget (fraction of all cores) is refused rather than starve the others.
+Encoders are pinned to their assigned cores, unless "cpu_affinity" is set in the channel JSON.
+
+channels file:
+
+{
+  "cpu_budget": 0.8,
+  "channels": {
+    "news": {
+      "json": "~/news.json",
+      "sites": ["youtube", "twitch"],
+      "playlist": "~/Videos/news",
+      "glob": "*.mp4",
+      "shuffle": false
+    }
+  }
+}
+
+python -m pylivestream.daemon channels.json
+"""
+
+from __future__ import annotations
+import typing as T
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import signal
+import tempfile
+
+from .base import FileIn, unify_streams
+from .calibrate import capacity, load_model
+from .stream import FPS
+
+if T.TYPE_CHECKING:
+    from .aio import StreamHandle
+    from .base import Livestream
+
+BUDGET = 0.8  # fraction of each core available to encoders
+# cores taken by a stream copy (no encoder) or audio-only stream
+COPY_COST = 0.05
+# uncalibrated: pixels/sec one core encodes with x264 "veryfast", and relative cost of presets
+PIXELS_PER_CORE = 20e6
+PRESET_COST = {
+    "ultrafast": 0.4,
+    "superfast": 0.6,
+    "veryfast": 1.0,
+    "faster": 1.5,
+    "fast": 2.0,
+    "medium": 2.5,
+    "slow": 4.0,
+}
+
+
+def encoder_cost(s: Livestream, ncpu: int | None = None) -> float:
+    """
+    estimated CPU cores used by the encoder of stream s
+    """
+
+    if s.copy_video or not s.res:
+        return COPY_COST
+
+    width, height = int(s.res[0]), int(s.res[1])
+    fps = s.fps if s.fps is not None else FPS
+    preset = s.preset if s.preset in PRESET_COST else "veryfast"
+
+    if (model := load_model(s.video_codec)) is not None and (c := capacity(model, preset, height)):
+        # calibration measures one encoder using the whole host
+        return (ncpu or model.get("cpu_count") or os.cpu_count() or 1) * fps / c
+
+    return width * height * fps / PIXELS_PER_CORE * PRESET_COST[preset]
+
+
+def channel_cost(streams: T.Mapping[str, Livestream], ncpu: int | None = None) -> float:
+    """
+    estimated CPU cores used by a channel: one encoder for all sites,
+    or one per distinct site profile with "encode_ladder"
+    """
+
+    first = streams[unify_streams(streams)]
+    if not first.encode_ladder:
+        return encoder_cost(first, ncpu)
+
+    profiles = {tuple(s.output_args): s for s in streams.values()}
+
+    return sum(encoder_cost(s, ncpu) for s in profiles.values())
+
+
+def pack(
+    costs: dict[str, float], ncpu: int, budget: float = BUDGET
+) -> tuple[dict[str, list[int]], dict[str, str]]:
+    """
+    assign channels to cores in order, each core loaded to at most budget.
+    A channel costing up to one core's budget shares the fullest core it fits on,
+    larger channels get whole cores of their own, spread evenly.
+
+    Returns
+    -------
+    cores: dict
+        cores of each admitted channel
+    refused: dict
+        reason each refused channel didn't fit
+    """
+
+    load = [0.0] * ncpu
+    cores: dict[str, list[int]] = {}
+    refused: dict[str, str] = {}
+
+    for name, cost in costs.items():
+        if cost <= budget:
+            fits = [i for i in range(ncpu) if load[i] + cost <= budget + 1e-9]
+            if fits:
+                i = max(fits, key=lambda i: load[i])
+                load[i] += cost
+                cores[name] = [i]
+                continue
+        else:
+            k = math.ceil(cost / budget)
+            idle = sorted(range(ncpu), key=lambda i: load[i])[:k]
+            if len(idle) == k and all(load[i] + cost / k <= budget + 1e-9 for i in idle):
+                for i in idle:
+                    load[i] += cost / k
+                cores[name] = sorted(idle)
+                continue
+
+        free = ncpu * budget - sum(load)
+        refused[name] = f"needs {cost:.2f} cores, {free:.2f} free within budget"
+
+    return cores, refused
+
+
+class Channel:
+    """
+    one playlist on loop to its sites
+    """
+
+    def __init__(self, name: str, cfg: dict[str, T.Any], playlist_dir: Path):
+        from .fglob import fileglob, probe_files, write_concat
+
+        self.name = name
+        self.sites: list[str] = cfg["sites"]
+        self.inifn = Path(cfg["json"]).expanduser()
+
+        flist = fileglob(Path(cfg["playlist"]), cfg.get("glob"))
+        metas, bad = probe_files(flist)
+        for f, reason in bad.items():
+            logging.warning(f"{name}: skipping {f}: {reason}")
+
+        flist = list(metas)
+        if not flist:
+            raise ValueError(f"{name}: no playable files in {cfg['playlist']}")
+        if cfg.get("shuffle"):
+            import random
+
+            random.shuffle(flist)
+
+        playlist = write_concat(flist, playlist_dir / f"{name}.ffconcat", metas)
+
+        self.op = FileIn(
+            self.inifn,
+            self.sites,
+            infn=flist[0],
+            playlist=playlist,
+            loop=True,
+            image=cfg.get("image"),
+            channel=name,
+            yes=True,
+            meta=metas[flist[0]],
+        )
+        for s in self.op.streams.values():
+            # channels run unattended
+            s.supervise = True
+
+        self.cost = channel_cost(self.op.streams)
+        self.cores: list[int] = []
+        self.refused: str | None = None
+        self.handle: StreamHandle | None = None
+
+    def status(self) -> dict[str, T.Any]:
+        if self.handle is not None:
+            state = "running" if self.handle.running else "ended"
+        else:
+            state = "refused" if self.refused else "waiting"
+
+        return {
+            "state": state,
+            "sites": self.sites,
+            "cost_cores": round(self.cost, 3),
+            "cores": self.cores,
+            "reason": self.refused,
+            "stats": self.handle.snapshot() if self.handle else {},
+        }
+
+
+class Daemon:
+    def __init__(self, channels_file: Path, ncpu: int | None = None):
+        C = json.loads(Path(channels_file).expanduser().read_text())
+
+        self.budget: float = C.get("cpu_budget", BUDGET)
+        self.ncpu = ncpu or os.cpu_count() or 1
+        self._tmp = tempfile.TemporaryDirectory(prefix="pylivestream-")
+
+        self.channels: dict[str, Channel] = {}
+        for name, cfg in C["channels"].items():
+            try:
+                self.channels[name] = Channel(name, cfg, Path(self._tmp.name))
+            except (OSError, ValueError, KeyError) as e:
+                logging.error(f"channel {name}: {e}")
+
+        cores, refused = pack({n: c.cost for n, c in self.channels.items()}, self.ncpu, self.budget)
+        for name, ch in self.channels.items():
+            ch.cores = cores.get(name, [])
+            ch.refused = refused.get(name)
+            for s in ch.op.streams.values():
+                if not s.cpu.cores:
+                    # pin the encoder to its cores, x264 then sizes its thread pool to them
+                    s.cpu.cores = ch.cores
+            if ch.refused:
+                logging.error(f"refusing channel {name}: {ch.refused}")
+
+    @property
+    def admitted(self) -> list[Channel]:
+        return [c for c in self.channels.values() if not c.refused]
+
+    def status(self) -> dict[str, T.Any]:
+        return {
+            "cpu_count": self.ncpu,
+            "cpu_budget": self.budget,
+            "cores_committed": round(sum(c.cost for c in self.admitted), 3),
+            "channels": {n: c.status() for n, c in self.channels.items()},
+        }
+
+    def stop(self) -> None:
+        for c in self.channels.values():
+            if c.handle is not None:
+                c.handle.stop()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        if os.name != "nt":
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, self.stop)
+
+        try:
+            for c in self.admitted:
+                c.handle = await c.op.agolive()
+                print(f"{c.name}: live on {c.sites}, {c.cost:.2f} cores on {c.cores}")
+
+            await asyncio.gather(*(c.handle.wait() for c in self.admitted if c.handle))
+        finally:
+            self.stop()
+            self._tmp.cleanup()
+
+
+def cli():
+    p = argparse.ArgumentParser(description="run many playout channels within the CPU budget")
+    p.add_argument("channels", help="JSON file of channels")
+    p.add_argument("-n", "--dryrun", help="print admission and exit", action="store_true")
+    p.add_argument("-v", "--verbose", action="store_true")
+    P = p.parse_args()
+
+    if P.verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    D = Daemon(P.channels)
+    print(json.dumps(D.status(), indent=2))
+
+    if not P.dryrun:
+        asyncio.run(D.run())
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,292 @@
+"""
+fault-isolated fan-out of one encoder to several sites
+
+With the tee muxer, one slow or failed site stalls or ends the stream for every site.
+Instead, the encoder writes FLV to a pipe, and each site gets its own bounded queue and a
+lightweight FFmpeg that copies the stream to the site without encoding.
+A site that falls behind more than max_lag seconds skips ahead to the next keyframe,
+and a site whose connection drops is reconnected with backoff,
+while the encoder and the other sites carry on.
+"""
+
+from __future__ import annotations
+import typing as T
+import collections
+import logging
+import subprocess
+import threading
+import time
+
+from . import flv
+
+MAX_LAG = 10.0  # seconds of media queued per site before skipping ahead
+
+
+class Sink(threading.Thread):
+    """
+    sends the stream to one site from its own queue, reconnecting if the site drops
+    """
+
+    RETRY_MIN = 1.0  # seconds
+    RETRY_MAX = 30.0
+    # connection lasting this long resets the backoff
+    STABLE = 60.0
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        exe: str,
+        preamble: T.Callable[[], bytes],
+        max_lag: float = MAX_LAG,
+    ):
+        super().__init__(daemon=True, name=f"sink-{name}")
+
+        self.url = url.strip('"')
+        self.sitename = name
+        self.exe = exe
+        self.preamble = preamble
+        self.max_lag_ms = int(max_lag * 1000)
+
+        # timestamp, tag, is metadata or sequence header
+        self._q: collections.deque[tuple[int, bytes, bool]] = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = threading.Event()
+        # audio-only streams never wait for a keyframe
+        self.has_video = True
+        self.need_keyframe = True
+
+        self.connected = False
+        self.reconnects = 0
+        self.dropped = 0
+        self.sent_bytes = 0
+        self.queued_bytes = 0
+        self.last_in: int | None = None
+        self.last_out: int | None = None
+
+    def command(self) -> list[str]:
+        return [
+            self.exe,
+            "-loglevel",
+            "error",
+            "-f",
+            "flv",
+            "-i",
+            "pipe:0",
+            "-codec",
+            "copy",
+            "-f",
+            "flv",
+            self.url,
+        ]
+
+    def put(self, timestamp: int, tag: bytes, keyframe: bool, header: bool = False) -> None:
+        """
+        queue a tag, never blocking the encoder.
+        Metadata and sequence headers (header=True) always pass.
+        """
+
+        with self._cond:
+            self.last_in = timestamp
+
+            if self._q and timestamp - self._q[0][0] > self.max_lag_ms:
+                logging.warning(f"{self.sitename} fell behind, skipping to next keyframe")
+                self._drop()
+
+            if self.need_keyframe and self.has_video and not header:
+                if not keyframe:
+                    self.dropped += 1
+                    return
+                self.need_keyframe = False
+
+            self._q.append((timestamp, tag, header))
+            self.queued_bytes += len(tag)
+            self._cond.notify()
+
+    def _drop(self) -> None:
+        """
+        discard queued media, resuming at the next keyframe. Caller holds the lock.
+        """
+
+        headers = [x for x in self._q if x[2]]
+        self.dropped += len(self._q) - len(headers)
+        self._q = collections.deque(headers)
+        self.queued_bytes = sum(len(x[1]) for x in headers)
+        self.need_keyframe = True
+
+    def _take(self) -> list[tuple[int, bytes, bool]]:
+        with self._cond:
+            items = list(self._q)
+            self._q.clear()
+            self.queued_bytes = 0
+
+        return items
+
+    def _wait(self, proc: subprocess.Popen | None = None) -> bool:
+        """
+        wait for queued data. False if closed with nothing left, or the site process ended.
+        """
+
+        with self._cond:
+            while not self._q:
+                if self._closed.is_set() or (proc is not None and proc.poll() is not None):
+                    return False
+                self._cond.wait(0.5)
+
+        return True
+
+    def run(self) -> None:
+        delay = self.RETRY_MIN
+
+        while self._wait():
+            tic = time.monotonic()
+            self.send()
+
+            if self._closed.is_set():
+                break
+
+            if time.monotonic() - tic > self.STABLE:
+                delay = self.RETRY_MIN
+            logging.warning(f"{self.sitename} disconnected, reconnecting in {delay:.0f} sec")
+            self.reconnects += 1
+
+            with self._cond:
+                self._drop()
+            if self._closed.wait(delay):
+                break
+            delay = min(delay * 2, self.RETRY_MAX)
+
+    def send(self) -> None:
+        """
+        one connection to the site, until it fails or the stream ends
+        """
+
+        proc = subprocess.Popen(self.command(), stdin=subprocess.PIPE)
+        assert proc.stdin is not None
+        self.connected = True
+        try:
+            preamble = self.preamble()
+            flags = flv.HAS_AUDIO | (flv.HAS_VIDEO if self.has_video else 0)
+            proc.stdin.write(flv.file_header(flags) + preamble)
+            while self._wait(proc):
+                for ts, tag, header in self._take():
+                    if header and tag in preamble:
+                        # the site already has it
+                        continue
+                    proc.stdin.write(tag)
+                    self.sent_bytes += len(tag)
+                    self.last_out = ts
+                proc.stdin.flush()
+        except OSError:  # e.g. BrokenPipeError
+            pass
+        finally:
+            self.connected = False
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+    def close(self) -> None:
+        """
+        send what's queued, then end the connection
+        """
+
+        self._closed.set()
+        with self._cond:
+            self._cond.notify()
+
+    def stats(self) -> dict[str, T.Any]:
+        lag = 0.0
+        if self.last_in is not None and self.last_out is not None:
+            lag = max(self.last_in - self.last_out, 0) / 1000
+
+        return {
+            "connected": self.connected,
+            "lag": lag,
+            "queued_bytes": self.queued_bytes,
+            "sent_bytes": self.sent_bytes,
+            "dropped_tags": self.dropped,
+            "reconnects": self.reconnects,
+        }
+
+
+class FanOut:
+    """
+    distribute the FLV output of one encoder to each site's Sink
+    """
+
+    def __init__(self, sinks: dict[str, str], exe: str, max_lag: float = MAX_LAG):
+        """
+        sinks: {site name: URL}
+        """
+
+        self.headers: dict[str, bytes] = {}
+        self.has_video = True
+        self.sinks = {
+            name: Sink(name, url, exe, self.preamble, max_lag) for name, url in sinks.items()
+        }
+
+    def _video(self, has_video: bool) -> None:
+        """
+        from the FLV header flags, or on the first video tag
+        """
+
+        self.has_video = has_video
+        for s in self.sinks.values():
+            s.has_video = has_video
+
+    def preamble(self) -> bytes:
+        """
+        metadata and codec configuration a newly connected site needs before the first keyframe
+        """
+
+        return b"".join(self.headers.get(k, b"") for k in ("meta", "video", "audio"))
+
+    def feed(self, f: T.BinaryIO) -> None:
+        """
+        read the encoder output until it ends
+        """
+
+        for s in self.sinks.values():
+            s.start()
+
+        try:
+            try:
+                flags = flv.read_header(f)
+            except ValueError:
+                logging.error("encoder did not start, see its errors above")
+                return
+
+            self._video(bool(flags & flv.HAS_VIDEO))
+
+            for tag_type, ts, data in flv.iter_tags(f):
+                tag = flv.tag_bytes(tag_type, ts, data)
+
+                header = True
+                if tag_type == flv.SCRIPT:
+                    self.headers["meta"] = tag
+                elif flv.is_sequence_header(tag_type, data):
+                    self.headers["video" if tag_type == flv.VIDEO else "audio"] = tag
+                else:
+                    header = False
+
+                if tag_type == flv.VIDEO and not self.has_video:
+                    self._video(True)
+
+                keyframe = flv.is_keyframe(tag_type, data)
+                for s in self.sinks.values():
+                    s.put(ts, tag, keyframe, header)
+        finally:
+            for s in self.sinks.values():
+                s.close()
+            for s in self.sinks.values():
+                s.join(timeout=15)
+
+    def stats(self) -> dict[str, dict[str, T.Any]]:
+        return {name: s.stats() for name, s in self.sinks.items()}
@@ -1,13 +1,25 @@
 from __future__ import annotations
 import typing as T
 import subprocess
-from time import sleep
+import errno
 import os
+import socket
+import time
 from pathlib import Path
 import shutil
 import json
+import logging
 import functools
 
+from .cache import get_probe_cache, cache_dir, atomic_write_text
+
+RTMP_PORT = 1935
+LISTENER_TIMEOUT = 10.0  # seconds, allowing for very slow computers
+# connect errors meaning nothing listens (yet)
+NOT_LISTENING = {errno.ECONNREFUSED, errno.EADDRNOTAVAIL, errno.ENETUNREACH, errno.EHOSTUNREACH}
+# where listening ports can't be read from the OS
+LISTENER_DELAY = 0.5
+
 
 class Ffmpeg:
     def __init__(self):
@@ -55,20 +67,46 @@ class Ffmpeg:
             f"drawtext=text='{text}':{fontcolor}:{fontsize}:{box}:{boxcolor}:{border}:{x}:{y}",
         ]
 
-    def listener(self):
+    def listener(self, kind: str = "ffplay", record_dir: Path | None = None):
         """
+        start a local RTMP listener for the "localhost" site, returning once it's ready.
+
+        kind:
+          "ffplay" shows the stream, ending with it
+          "builtin" runs the asyncio RTMP server of pylivestream.rtmpserver, printing
+             throughput, GOP and timestamp statistics, recording to record_dir if given.
+             Needs no display, for headless tests. Also used if FFplay isn't found.
+
         no need to check return code, errors will show up in client.
 
         -timeout 1 is necessary to avoid instant error, since stream starts after the listener.
         I put -timeout 5 to allow for very slow computers.
         -timeout is the delay to wait for stream input before erroring.
 
-        sleep: 0.2 not long enough. 0.3 worked, so set 0.5 for some margin.
+        Rather than sleeping a guessed time, wait until the RTMP port is listening,
+        up to LISTENER_TIMEOUT seconds.
         """
 
-        TIMEOUT = 0.5
+        tic = time.monotonic()
+
+        if kind == "ffplay":
+            try:
+                ffplay = get_ffplay()
+            except FileNotFoundError:
+                logging.warning("FFplay not found, using builtin RTMP listener")
+                kind = "builtin"
+
+        if kind == "builtin":
+            from .rtmpserver import ServerThread
+
+            print("starting builtin Localhost RTMP listener.")
+            server = ServerThread(record_dir=record_dir).start_ready(LISTENER_TIMEOUT)
+            print(f"RTMP listener ready in {time.monotonic() - tic:.3f} sec")
+            return server
+        elif kind != "ffplay":
+            raise ValueError(f"unknown listener {kind}, use ffplay or builtin")
 
-        cmd = [get_ffplay(), "-loglevel", "error", "-timeout", "5", "-autoexit", "rtmp://localhost"]
+        cmd = [ffplay, "-loglevel", "error", "-timeout", "5", "-autoexit", "rtmp://localhost"]
 
         print(
             "starting Localhost RTMP listener. \n\n",
@@ -82,7 +120,11 @@ class Ffmpeg:
         #                                 '-i', 'rtmp://localhost', '-f', 'null', '-'],
         #                                stdout=subprocess.DEVNULL)
 
-        sleep(TIMEOUT)
+        # FFplay takes the first connection as its stream: don't connect to check
+        if wait_listening("localhost", RTMP_PORT, LISTENER_TIMEOUT, proc, connect=False):
+            print(f"RTMP listener ready in {time.monotonic() - tic:.3f} sec")
+        elif proc.poll() is None:
+            logging.warning(f"RTMP listener not ready after {LISTENER_TIMEOUT} sec, continuing")
 
         return proc
 
@@ -97,21 +139,182 @@ class Ffmpeg:
         return ["-filter_complex", f"movie={bg}:loop=0,setpts=N/FRAME_RATE/TB"]
 
 
+def port_listening(host: str, port: int, timeout: float = 0.5) -> bool:
+    """
+    does a server accept TCP connections on port of host.
+
+    Connects and closes at once, so not for a listener that takes the first connection
+    as its stream like FFplay: that would end it. See listening_ports().
+    """
+
+    try:
+        with socket.create_connection((host, port), timeout):
+            return True
+    except socket.timeout:
+        return False
+    except OSError as e:
+        if e.errno in NOT_LISTENING:
+            return False
+        raise
+
+
+def listening_ports() -> set[int] | None:
+    """
+    TCP ports listening on this computer, read from the OS without connecting or binding.
+    None if unknown: needs Linux or the optional psutil package.
+    """
+
+    try:
+        import psutil
+    except ImportError:
+        pass
+    else:
+        try:
+            conns = psutil.net_connections("tcp")
+        except psutil.AccessDenied:
+            pass
+        else:
+            return {c.laddr.port for c in conns if c.status == psutil.CONN_LISTEN}
+
+    ports: set[int] | None = None
+    for fn in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            lines = Path(fn).read_text().splitlines()[1:]
+        except OSError:
+            continue
+
+        if ports is None:
+            ports = set()
+        for line in lines:
+            local, state = line.split()[1:4:2]
+            if state == "0A":  # LISTEN
+                ports.add(int(local.rsplit(":", 1)[1], 16))
+
+    return ports
+
+
+def wait_listening(
+    host: str,
+    port: int,
+    timeout: float,
+    proc: subprocess.Popen | None = None,
+    connect: bool = True,
+) -> bool:
+    """
+    poll until a server listens on port, giving up after timeout seconds
+    or when the server process proc ends.
+
+    connect=False checks the listening ports of the OS instead of connecting,
+    for a listener taking only one connection. Where those can't be read,
+    waits LISTENER_DELAY seconds instead.
+    """
+
+    if not connect and listening_ports() is None:
+        time.sleep(LISTENER_DELAY)
+        return proc is None or proc.poll() is None
+
+    delay = 0.005
+    end = time.monotonic() + timeout
+
+    while not (port_listening(host, port) if connect else port in (listening_ports() or ())):
+        if (proc is not None and proc.poll() is not None) or time.monotonic() > end:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, 0.1)
+
+    return True
+
+
 @functools.cache
 def get_exe(name: str) -> str:
+    """
+    find FFmpeg, FFprobe or FFplay, preferring environment variable FFMPEG_ROOT.
+
+    Discovery is persisted in the user cache directory and reused by later runs,
+    until PATH or FFMPEG_ROOT change or the executable is replaced.
+    """
+
+    env = _discovery_env()
+
+    if (rec := _load_discovery(env).get(name)) and _unchanged(rec):
+        return rec["path"]
 
     for p in (os.environ.get("FFMPEG_ROOT"), None):
         if exe := shutil.which(name, path=p):
+            _save_discovery(env, name, _exe_record(exe))
             return exe
 
-    raise FileNotFoundError(
-        f"""
+    raise FileNotFoundError(f"""
 *** Must have FFmpeg + FFprobe installed to use PyLivestream.
 https://www.ffmpeg.org/download.html
 
 could not find {name}
-"""
-    )
+""")
+
+
+@functools.cache
+def get_version(name: str) -> str:
+    """
+    first line of "-version" output e.g. "ffmpeg version 7.0.2 Copyright ..."
+
+    persisted along with the executable discovery, so it's only run once per install.
+    """
+
+    exe = get_exe(name)
+    env = _discovery_env()
+
+    rec = _load_discovery(env).get(name, {})
+    if rec.get("path") == exe and _unchanged(rec) and (v := rec.get("version")):
+        return v
+
+    ret = subprocess.check_output([exe, "-version"], text=True)
+    v = ret.splitlines()[0] if ret else ""
+
+    rec = _exe_record(exe)
+    rec["version"] = v
+    _save_discovery(env, name, rec)
+
+    return v
+
+
+def _discovery_env() -> str:
+    return f"{os.environ.get('FFMPEG_ROOT', '')}{os.pathsep * 2}{os.environ.get('PATH', '')}"
+
+
+def _exe_record(exe: str) -> dict[str, T.Any]:
+    st = os.stat(exe)
+    return {"path": exe, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _unchanged(rec: dict[str, T.Any]) -> bool:
+    try:
+        st = os.stat(rec["path"])
+    except (OSError, KeyError):
+        return False
+
+    return st.st_size == rec.get("size") and st.st_mtime_ns == rec.get("mtime_ns")
+
+
+def _load_discovery(env: str) -> dict[str, T.Any]:
+    try:
+        D = json.loads(cache_dir("discovery.json").read_text())
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(D, dict) or D.get("env") != env:
+        return {}
+
+    return D.get("exes", {})
+
+
+def _save_discovery(env: str, name: str, rec: dict[str, T.Any]) -> None:
+    exes = _load_discovery(env)
+    exes[name] = rec
+
+    try:
+        atomic_write_text(cache_dir("discovery.json"), json.dumps({"env": env, "exes": exes}))
+    except OSError as e:
+        logging.debug(f"could not save executable discovery: {e}")
 
 
 def get_ffmpeg() -> str:
@@ -126,7 +329,13 @@ def get_ffprobe() -> str:
     return get_exe("ffprobe")
 
 
-def get_meta(fn: Path, exein: str | None = None) -> dict[str, T.Any]:
+def get_meta(fn: Path, exein: str | None = None, cache: bool = True) -> dict[str, T.Any]:
+    """
+    FFprobe JSON of streams and format.
+
+    Results are cached on disk keyed by (path, size, mtime_ns) unless cache=False,
+    so each file is probed once across streams, sites, playlist loops and program runs.
+    """
     if not fn:  # audio-only
         return {}
 
@@ -135,6 +344,9 @@ def get_meta(fn: Path, exein: str | None = None) -> dict[str, T.Any]:
     if not fn.is_file():
         raise FileNotFoundError(fn)
 
+    if cache and (meta := get_probe_cache().get(fn)) is not None:
+        return meta
+
     exe = get_exe("ffprobe") if exein is None else exein
 
     cmd = [
@@ -150,4 +362,9 @@ def get_meta(fn: Path, exein: str | None = None) -> dict[str, T.Any]:
 
     ret = subprocess.check_output(cmd, text=True)
     # %% decode JSON from FFprobe
-    return json.loads(ret)
+    meta = json.loads(ret)
+
+    if cache:
+        get_probe_cache().put(fn, meta)
+
+    return meta
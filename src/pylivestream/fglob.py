@@ -1,17 +1,20 @@
 from __future__ import annotations
+import typing as T
 import random
 from pathlib import Path
+import subprocess
+import logging
 import signal
 import argparse
+import functools
+import json
+import os
+import tempfile
 
 from .base import FileIn
+from .ffmpeg import get_exe, get_meta
 from .utils import meta_caption
 
-try:
-    from tinytag import TinyTag
-except ImportError:
-    TinyTag = None
-
 
 def stream_files(
     ini_file: Path,
@@ -25,9 +28,49 @@ def stream_files(
     still_image: Path | None = None,
     no_meta: bool = False,
     timeout: float | None = None,
+    jobs: int | None = None,
+    gapless: bool = False,
+    mezzanine: bool = False,
 ):
+    """
+    gapless: play the whole list with one encoder and one connection to the sites,
+    instead of one FFmpeg per file.
+    mezzanine: transcode files once to the site profile before going live (or reuse earlier
+    transcodes), then stream them with stream copy.
+    """
     # %% file / glob wranging
     flist = fileglob(video_path, glob)
+    # %% probe all files up front, so no FFprobe runs between items on air
+    C = json.loads(Path(ini_file).expanduser().read_text())
+    probeexe = get_exe(C.get("ffprobe_exe", "ffprobe"))
+
+    metas, bad = probe_files(flist, probeexe, jobs)
+
+    image_meta = None
+    if still_image:
+        still_image = Path(still_image).expanduser()
+        found, why = probe_files([still_image], probeexe)
+        if still_image not in found:
+            raise ValueError(f"still image {still_image}: {why[still_image]}")
+        image_meta = found[still_image]
+
+    if bad:
+        print("skipping these files that could not be probed: \n")
+        print("\n".join(f"{f}: {reason}" for f, reason in bad.items()))
+        print()
+
+    flist = list(metas.keys())
+    if not flist:
+        raise ValueError(f"no playable files found in {video_path}")
+
+    if mezzanine:
+        from .mezzanine import prepare
+
+        air = prepare(flist, ini_file, websites, metas)
+        metas, _ = probe_files(list(air.values()), probeexe, jobs)
+        flist = [m for m in air.values() if m in metas]
+        # a caption would need the encoder
+        no_meta = False
 
     print("streaming these files. Be sure list is correct! \n")
     print("\n".join(map(str, flist)))
@@ -38,13 +81,50 @@ def stream_files(
     else:
         input(f"Press Enter to go live on {websites}.    Or Ctrl C to abort.")
 
+    if gapless:
+        playgapless(
+            flist,
+            still_image,
+            websites,
+            ini_file,
+            shuffle,
+            loop,
+            assume_yes,
+            timeout,
+            metas,
+            image_meta,
+        )
+        return
+
     usemeta = no_meta
 
     if loop:
         while True:
-            playonce(flist, still_image, websites, ini_file, shuffle, usemeta, assume_yes, timeout)
+            playonce(
+                flist,
+                still_image,
+                websites,
+                ini_file,
+                shuffle,
+                usemeta,
+                assume_yes,
+                timeout,
+                metas,
+                image_meta,
+            )
     else:
-        playonce(flist, still_image, websites, ini_file, shuffle, usemeta, assume_yes, timeout)
+        playonce(
+            flist,
+            still_image,
+            websites,
+            ini_file,
+            shuffle,
+            usemeta,
+            assume_yes,
+            timeout,
+            metas,
+            image_meta,
+        )
 
 
 def playonce(
@@ -56,6 +136,8 @@ def playonce(
     usemeta: bool,
     yes: bool,
     timeout: float | None = None,
+    metas: dict[Path, dict[str, T.Any]] | None = None,
+    image_meta: dict[str, T.Any] | None = None,
 ):
 
     if shuffle:
@@ -63,8 +145,10 @@ def playonce(
 
     caption: str | None
 
+    TinyTag = get_tinytag() if usemeta else None
+
     for f in flist:
-        if usemeta and TinyTag:
+        if TinyTag:
             try:
                 caption = meta_caption(TinyTag.get(str(f)))
                 print(caption)
@@ -74,12 +158,100 @@ def playonce(
             caption = None
 
         s = FileIn(
-            inifn, sites, infn=f, loop=False, image=image, caption=caption, yes=yes, timeout=timeout
+            inifn,
+            sites,
+            infn=f,
+            loop=False,
+            image=image,
+            caption=caption,
+            yes=yes,
+            timeout=timeout,
+            meta=metas.get(f) if metas else None,
+            image_meta=image_meta,
         )
 
         s.golive()
 
 
+def playgapless(
+    flist: list[Path],
+    image: Path | None,
+    sites: list[str],
+    inifn: Path,
+    shuffle: bool,
+    loop: bool,
+    yes: bool,
+    timeout: float | None = None,
+    metas: dict[Path, dict[str, T.Any]] | None = None,
+    image_meta: dict[str, T.Any] | None = None,
+):
+    """
+    one FFmpeg reads all files through the concat demuxer, so timestamps are continuous
+    and the connection to the sites stays up between items.
+    Each item is scaled to the resolution and frame rate of the first.
+    With loop, the list is shuffled once and then repeated.
+    Metadata captions are not available, as they would change between items.
+    """
+
+    if shuffle:
+        random.shuffle(flist)
+
+    with tempfile.TemporaryDirectory() as d:
+        playlist = write_concat(flist, Path(d) / "playlist.ffconcat", metas)
+
+        s = FileIn(
+            inifn,
+            sites,
+            infn=flist[0],
+            playlist=playlist,
+            loop=loop,
+            image=image,
+            yes=yes,
+            timeout=timeout,
+            meta=metas.get(flist[0]) if metas else None,
+            image_meta=image_meta,
+        )
+
+        s.golive()
+
+
+def write_concat(
+    flist: list[Path], fn: Path, metas: dict[Path, dict[str, T.Any]] | None = None
+) -> Path:
+    """
+    write FFmpeg concat demuxer list.
+    Known durations are included so FFmpeg needn't read ahead to find each item's end.
+
+    https://ffmpeg.org/ffmpeg-formats.html#concat-1
+    """
+
+    lines = ["ffconcat version 1.0"]
+    for f in flist:
+        quoted = str(Path(f).expanduser().resolve()).replace("'", "'\\''")
+        lines.append(f"file '{quoted}'")
+        try:
+            lines.append(f"duration {float(metas[f]['format']['duration'])}")  # type: ignore
+        except (TypeError, KeyError, ValueError):
+            pass
+
+    fn.write_text("\n".join(lines) + "\n")
+
+    return fn
+
+
+@functools.cache
+def get_tinytag() -> T.Any:
+    """
+    optional tinytag for captions, imported only when needed to keep startup fast
+    """
+    try:
+        from tinytag import TinyTag
+    except ImportError:
+        return None
+
+    return TinyTag
+
+
 def fileglob(path: Path, glob: str | None) -> list[Path]:
 
     path = Path(path).expanduser()
@@ -97,6 +269,53 @@ def fileglob(path: Path, glob: str | None) -> list[Path]:
     return flist
 
 
+def probe_files(
+    flist: list[Path], exe: str | None = None, jobs: int | None = None
+) -> tuple[dict[Path, dict[str, T.Any]], dict[Path, str]]:
+    """
+    probe files concurrently with FFprobe, using a bounded thread pool.
+
+    Returns
+    -------
+    metas: dict
+        FFprobe JSON of each probeable file, in the order of flist
+    bad: dict
+        reason each unprobeable file was rejected
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    if not jobs:
+        jobs = min(8, os.cpu_count() or 1)
+
+    found: dict[Path, dict[str, T.Any]] = {}
+    bad: dict[Path, str] = {}
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {f: pool.submit(get_meta, f, exe) for f in flist}
+
+        for f, fut in futures.items():
+            try:
+                meta = fut.result()
+            except subprocess.CalledProcessError as e:
+                bad[f] = f"FFprobe failed with code {e.returncode}"
+                continue
+            except (OSError, ValueError) as e:
+                bad[f] = str(e)
+                continue
+
+            if not meta.get("streams"):
+                bad[f] = "no audio or video streams"
+                continue
+
+            found[f] = meta
+
+    for f, reason in bad.items():
+        logging.error(f"{f}: {reason}")
+
+    return found, bad
+
+
 def cli():
     signal.signal(signal.SIGINT, signal.SIG_DFL)
 
@@ -115,6 +334,17 @@ def cli():
     p.add_argument("-y", "--yes", help="no confirmation dialog", action="store_true")
     p.add_argument("-nometa", help="do not add metadata caption to video", action="store_false")
     p.add_argument("-t", "--timeout", help="stop streaming after --timeout seconds", type=int)
+    p.add_argument("-jobs", help="number of files to probe in parallel before going live", type=int)
+    p.add_argument(
+        "-gapless",
+        help="play all files with one encoder, without reconnecting between files",
+        action="store_true",
+    )
+    p.add_argument(
+        "-mezzanine",
+        help="transcode files once for the sites, then stream without encoding",
+        action="store_true",
+    )
     P = p.parse_args()
 
     stream_files(
@@ -128,6 +358,9 @@ def cli():
         shuffle=P.shuffle,
         still_image=P.image,
         no_meta=P.nometa,
+        jobs=P.jobs,
+        gapless=P.gapless,
+        mezzanine=P.mezzanine,
     )
 
 
@@ -0,0 +1,264 @@
+"""
+FLV container and AMF0 data, as used by RTMP
+
+https://rtmp.veriskope.com/pdf/video_file_format_spec_v10.pdf
+https://rtmp.veriskope.com/pdf/amf0-file-format-specification.pdf
+"""
+
+from __future__ import annotations
+import typing as T
+import struct
+
+AUDIO = 8
+VIDEO = 9
+SCRIPT = 18
+
+HAS_AUDIO = 0x04
+HAS_VIDEO = 0x01
+
+HEADER_SIZE = 9
+
+__all__ = [
+    "read_header",
+    "iter_tags",
+    "file_header",
+    "tag_bytes",
+    "is_keyframe",
+    "is_sequence_header",
+    "amf0_decode",
+    "amf0_decode_all",
+    "amf0_encode",
+]
+
+
+def read_exact(f: T.BinaryIO, n: int) -> bytes:
+    """
+    read n bytes from a file or pipe, fewer only at end of stream
+    """
+
+    buf = f.read(n)
+    if len(buf) == n or not buf:
+        return buf
+
+    parts = [buf]
+    got = len(buf)
+    while got < n:
+        b = f.read(n - got)
+        if not b:
+            break
+        parts.append(b)
+        got += len(b)
+
+    return b"".join(parts)
+
+
+def read_header(f: T.BinaryIO) -> int:
+    """
+    reads FLV file header and PreviousTagSize0, leaving f at the first tag.
+
+    Returns
+    -------
+    flags: int
+        bitmask of HAS_AUDIO, HAS_VIDEO
+    """
+
+    hdr = read_exact(f, HEADER_SIZE)
+    if len(hdr) < HEADER_SIZE or hdr[:3] != b"FLV":
+        raise ValueError("not an FLV stream")
+
+    offset = struct.unpack(">I", hdr[5:9])[0]
+    # skip any extended header, and PreviousTagSize0
+    read_exact(f, offset - HEADER_SIZE + 4)
+
+    return hdr[4]
+
+
+def iter_tags(f: T.BinaryIO) -> T.Iterator[tuple[int, int, bytes]]:
+    """
+    iterate over FLV tags from a file or pipe positioned after the file header.
+
+    Yields
+    ------
+    tag_type: int
+        AUDIO, VIDEO or SCRIPT
+    timestamp: int
+        milliseconds
+    data: bytes
+        tag body
+    """
+
+    while True:
+        th = read_exact(f, 11)
+        if len(th) < 11:
+            return
+
+        tag_type = th[0] & 0x1F
+        size = int.from_bytes(th[1:4], "big")
+        timestamp = int.from_bytes(th[4:7], "big") | (th[7] << 24)
+
+        data = read_exact(f, size + 4)  # body and PreviousTagSize
+        if len(data) < size:
+            return
+
+        yield tag_type, timestamp, data[:size]
+
+
+def file_header(flags: int = HAS_AUDIO | HAS_VIDEO) -> bytes:
+    """
+    FLV file header and PreviousTagSize0
+    """
+
+    return b"FLV\x01" + bytes([flags]) + struct.pack(">I", HEADER_SIZE) + bytes(4)
+
+
+def tag_bytes(tag_type: int, timestamp: int, data: bytes) -> bytes:
+    """
+    one FLV tag including its trailing PreviousTagSize, as iterated by iter_tags()
+    """
+
+    ts = timestamp & 0xFFFFFFFF
+    header = (
+        bytes([tag_type])
+        + len(data).to_bytes(3, "big")
+        + (ts & 0xFFFFFF).to_bytes(3, "big")
+        + bytes([ts >> 24])
+        + bytes(3)  # stream ID
+    )
+
+    return header + data + struct.pack(">I", len(data) + 11)
+
+
+def is_keyframe(tag_type: int, data: bytes) -> bool:
+    """
+    video tag starting a GOP, where a new viewer can start decoding
+    """
+
+    return tag_type == VIDEO and len(data) > 0 and data[0] >> 4 == 1
+
+
+def is_sequence_header(tag_type: int, data: bytes) -> bool:
+    """
+    AVC decoder configuration or AAC audio specific config,
+    which must be resent to each new viewer before any frames.
+    """
+
+    if len(data) < 2:
+        return False
+
+    if tag_type == VIDEO:
+        return data[0] & 0x0F == 7 and data[1] == 0
+    if tag_type == AUDIO:
+        return data[0] >> 4 == 10 and data[1] == 0
+
+    return False
+
+
+# %% AMF0
+
+
+def amf0_decode(buf: bytes, pos: int = 0) -> tuple[T.Any, int]:
+    """
+    decode one AMF0 value starting at buf[pos]
+
+    Returns
+    -------
+    value:
+        decoded value
+    pos: int
+        index just past the value
+    """
+
+    marker = buf[pos]
+    pos += 1
+
+    if marker == 0:  # number
+        return struct.unpack_from(">d", buf, pos)[0], pos + 8
+    if marker == 1:  # boolean
+        return buf[pos] != 0, pos + 1
+    if marker == 2:  # string
+        n = struct.unpack_from(">H", buf, pos)[0]
+        start = pos + 2
+        end = start + n
+        return buf[start:end].decode("utf-8", errors="replace"), end
+    if marker == 3:  # object
+        return _amf0_properties(buf, pos)
+    if marker in (5, 6):  # null, undefined
+        return None, pos
+    if marker == 7:  # reference
+        return None, pos + 2
+    if marker == 8:  # ECMA array
+        return _amf0_properties(buf, pos + 4)
+    if marker == 10:  # strict array
+        n = struct.unpack_from(">I", buf, pos)[0]
+        pos += 4
+        arr = []
+        for _ in range(n):
+            v, pos = amf0_decode(buf, pos)
+            arr.append(v)
+        return arr, pos
+    if marker == 11:  # date
+        return struct.unpack_from(">d", buf, pos)[0], pos + 10
+    if marker == 12:  # long string
+        n = struct.unpack_from(">I", buf, pos)[0]
+        start = pos + 4
+        end = start + n
+        return buf[start:end].decode("utf-8", errors="replace"), end
+
+    raise ValueError(f"unsupported AMF0 marker {marker}")
+
+
+def _amf0_properties(buf: bytes, pos: int) -> tuple[dict[str, T.Any], int]:
+    obj: dict[str, T.Any] = {}
+
+    while pos + 3 <= len(buf):
+        n = struct.unpack_from(">H", buf, pos)[0]
+        pos += 2
+        if n == 0 and buf[pos] == 9:  # object end
+            return obj, pos + 1
+
+        end = pos + n
+        key = buf[pos:end].decode("utf-8", errors="replace")
+        obj[key], pos = amf0_decode(buf, end)
+
+    # some muxers omit the end marker of the last ECMA array
+    return obj, len(buf)
+
+
+def amf0_decode_all(buf: bytes) -> list[T.Any]:
+    """
+    decode consecutive AMF0 values, such as an RTMP command or FLV script tag
+    """
+
+    values = []
+    pos = 0
+    while pos < len(buf):
+        v, pos = amf0_decode(buf, pos)
+        values.append(v)
+
+    return values
+
+
+def amf0_encode(value: T.Any) -> bytes:
+    """
+    encode one value as AMF0: None, bool, number, string or dict (as object)
+    """
+
+    if value is None:
+        return b"\x05"
+    if isinstance(value, bool):
+        return b"\x01" + bytes([value])
+    if isinstance(value, (int, float)):
+        return b"\x00" + struct.pack(">d", value)
+    if isinstance(value, str):
+        b = value.encode()
+        if len(b) > 0xFFFF:
+            return b"\x0c" + struct.pack(">I", len(b)) + b
+        return b"\x02" + struct.pack(">H", len(b)) + b
+    if isinstance(value, dict):
+        out = b"\x03"
+        for k, v in value.items():
+            kb = str(k).encode()
+            out += struct.pack(">H", len(kb)) + kb + amf0_encode(v)
+        return out + b"\x00\x00\x09"
+
+    raise TypeError(f"can't encode {type(value)} as AMF0")
@@ -0,0 +1,248 @@
+"""
+feed clips to a live encoder's stdin as one continuous MPEG-TS stream
+
+Whole MP4 files written one after another into "-i pipe:0" make FFmpeg buffer each
+file until it finds the "moov" index (often at the end), and timestamps restart at
+every file. Instead, each clip is remuxed (not re-encoded) to MPEG-TS, which FFmpeg
+decodes from a pipe as it arrives, and its timestamps are shifted to continue from the
+previous clip, so the live encoder sees one stream and never stalls at clip boundaries.
+
+Clips that would break the stream are fixed first: a clip without audio gets silence,
+so every clip has the same streams, and video or audio in another codec (or, with a
+placeholder profile, another size, frame rate or sample rate) is transcoded to match.
+Clips without video are rejected with ValueError.
+
+The live encoder reads this with "-f mpegts -i pipe:0".
+
+  with Ingest(proc.stdin) as ingest:
+      ingest.clip("~/Videos/a.mp4")
+      ingest.clip("https://example.invalid/b.mp4")
+      ingest.placeholder(P)  # pylivestream.placeholder.Placeholder
+"""
+
+from __future__ import annotations
+import typing as T
+from fractions import Fraction
+from pathlib import Path
+import json
+import logging
+import subprocess
+import time
+
+from .flv import read_exact
+from .ffmpeg import get_exe, get_meta
+from .mpegts import PACKET, Retimer
+from .pipefeed import CHUNK, PIPE_SIZE, PipeFeeder
+from .placeholder import audio_args, profile, video_args
+
+if T.TYPE_CHECKING:
+    from .placeholder import Placeholder
+
+__all__ = ["Ingest", "probe", "remux_cmd"]
+
+
+def probe(src: Path | str, exe: str | None = None) -> dict[str, T.Any]:
+    """
+    FFprobe JSON of a clip: files are probed once (see get_meta), URLs each time
+    """
+
+    if isinstance(src, Path) or "://" not in src:
+        return get_meta(Path(src), exe)
+
+    cmd = [exe or get_exe("ffprobe"), "-loglevel", "error", "-print_format", "json"]
+    cmd += ["-show_streams", "-show_format", src]
+
+    return json.loads(subprocess.check_output(cmd, text=True))
+
+
+def _first(meta: dict[str, T.Any], codec_type: str) -> dict[str, T.Any] | None:
+    return next((s for s in meta.get("streams", []) if s.get("codec_type") == codec_type), None)
+
+
+def _fps(stream: dict[str, T.Any]) -> float:
+    try:
+        return float(Fraction(stream.get("avg_frame_rate") or stream.get("r_frame_rate", "0")))
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def copy_video(stream: dict[str, T.Any], prof: dict[str, T.Any] | None = None) -> bool:
+    """
+    H.264 the encoder input can take as is, at the size and frame rate of prof if given
+    """
+
+    if stream.get("codec_name") != "h264" or stream.get("pix_fmt") != "yuv420p":
+        return False
+    if prof is None:
+        return True
+
+    return (stream.get("width"), stream.get("height")) == (prof["width"], prof["height"]) and abs(
+        _fps(stream) - prof["fps"]
+    ) < 0.01
+
+
+def copy_audio(stream: dict[str, T.Any], prof: dict[str, T.Any]) -> bool:
+    return (
+        stream.get("codec_name") == "aac"
+        and int(stream.get("sample_rate", 0)) == prof["audio_rate"]
+        and stream.get("channels") == 2
+    )
+
+
+def remux_cmd(
+    exe: str,
+    src: Path | str,
+    meta: dict[str, T.Any] | None = None,
+    prof: dict[str, T.Any] | None = None,
+) -> list[str]:
+    """
+    clip to MPEG-TS. Without meta, streams are copied as they are.
+    With the clip's FFprobe meta, missing audio is filled with silence, and streams
+    not matching prof (codecs only if prof is None) are transcoded.
+    """
+
+    cmd = [exe, "-loglevel", "error", "-nostdin", "-i", str(src)]
+
+    if meta is None:
+        # same streams and PIDs for every clip: first video, then first audio if any
+        cmd += ["-map", "0:v:0", "-map", "0:a:0?", "-codec", "copy"]
+    else:
+        if (video := _first(meta, "video")) is None:
+            raise ValueError(f"{src}: no video stream")
+        audio = _first(meta, "audio")
+        aprof = profile() if prof is None else prof
+
+        if audio is None:
+            # silence, as the placeholder, so every clip has the same streams and PIDs
+            cmd += ["-f", "lavfi", "-i", f"anullsrc=r={aprof['audio_rate']}:cl=stereo"]
+            cmd += ["-map", "0:v:0", "-map", "1:a", "-shortest"]
+        else:
+            cmd += ["-map", "0:v:0", "-map", "0:a:0"]
+
+        if copy_video(video, prof):
+            cmd += ["-codec:v", "copy"]
+        elif prof is None:
+            cmd += ["-codec:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p"]
+        else:
+            cmd += video_args(prof)
+
+        if audio is not None and copy_audio(audio, aprof):
+            cmd += ["-codec:a", "copy"]
+        else:
+            cmd += audio_args(aprof)
+
+    # a PES per audio frame, so the end of each clip is known to the frame
+    cmd += ["-pes_payload_size", "0", "-f", "mpegts", "pipe:1"]
+
+    return cmd
+
+
+class Ingest:
+    """
+    write clips to the encoder pipe as MPEG-TS with continuous timestamps
+    """
+
+    def __init__(
+        self,
+        pipe: T.IO[bytes] | int,
+        exe: str | None = None,
+        chunk: int = CHUNK,
+        pipe_size: int = PIPE_SIZE,
+        prof: dict[str, T.Any] | None = None,
+    ):
+        self.feed = PipeFeeder(pipe, chunk, pipe_size)
+        self.retimer = Retimer()
+        self.exe = exe
+        # clips are converted to this (placeholder) profile where they differ
+        self.prof = prof
+        # whole TS packets
+        self.chunk = max(chunk // PACKET, 1) * PACKET
+        self.clip_written: float | None = None  # time first data of the current clip was written
+
+    def __enter__(self) -> Ingest:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.feed.close()
+
+    @property
+    def seconds(self) -> float:
+        """
+        stream time written so far
+        """
+
+        return self.retimer.seconds
+
+    def write(self, data: bytes | bytearray) -> None:
+        """
+        write TS packets of the current clip
+        """
+
+        buf = bytearray(data)
+        first = self.retimer.delta is None
+        self.retimer.retime(buf)
+        if first and self.retimer.delta is not None:
+            self.clip_written = time.monotonic()
+        self.feed.write(buf)
+
+    def clip(self, src: Path | str) -> float:
+        """
+        remux file or URL src to the pipe, returning its duration in seconds
+        """
+
+        if isinstance(src, Path):
+            src = src.expanduser()
+
+        cmd = remux_cmd(self.exe or get_exe("ffmpeg"), src, probe(src), self.prof)
+        logging.info(" ".join(cmd))
+
+        tic = time.monotonic()
+        self.retimer.next_clip()
+        self.clip_written = None
+
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+        assert proc.stdout is not None
+        stdout = T.cast(T.BinaryIO, proc.stdout)
+        try:
+            while data := read_exact(stdout, self.chunk):
+                if n := len(data) % PACKET:
+                    logging.warning(f"{src}: dropping {n} bytes of a partial TS packet")
+                    data = data[:-n]
+                self.write(data)
+        finally:
+            proc.stdout.close()
+            if proc.poll() is None:
+                # encoder pipe closed under us
+                proc.kill()
+            ret = proc.wait()
+
+        if ret:
+            raise subprocess.CalledProcessError(ret, cmd)
+
+        dt = self.retimer.clip_seconds
+        logging.info(f"{src}: {dt:.2f} sec in {time.monotonic() - tic:.2f} sec")
+
+        return dt
+
+    def placeholder(self, P: Placeholder, loops: int = 1) -> float:
+        """
+        write loops passes of the placeholder segment, each continuing the timestamps.
+        Returns seconds written.
+        """
+
+        dt = 0.0
+
+        for _ in range(loops):
+            self.retimer.next_clip()
+            end = P.loops + 1
+            while P.loops < end:
+                self.write(P.read(self.chunk))
+            dt += self.retimer.clip_seconds
+
+        return dt
+
+    def __repr__(self) -> str:
+        return f"{self.retimer.clips} clips, {self.seconds:.1f} sec: {self.feed}"
@@ -0,0 +1,443 @@
+"""
+read video resolution and frame rate directly from common container headers,
+avoiding an FFprobe process for each file.
+
+Supported: MP4/MOV, FLV, Matroska/WebM, Ogg, AVI, PNG, JPEG.
+Anything else (or anything unexpected in these) returns None,
+so the caller falls back to FFprobe.
+"""
+
+from __future__ import annotations
+import typing as T
+from pathlib import Path
+import logging
+import struct
+
+from . import flv
+
+__all__ = ["read_header"]
+
+ISO_BOXES = {b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip", b"pnot"}
+
+
+def read_header(fn: Path | str) -> dict[str, T.Any] | None:
+    """
+    video resolution and frame rate from file header
+
+    Returns
+    -------
+    None
+        format not recognized: use FFprobe
+    {}
+        no video stream in file
+    {"width": int, "height": int, "fps": float | None}
+        first video stream. "fps" is missing if the header doesn't say,
+        and None for still images.
+    """
+
+    try:
+        with open(fn, "rb") as f:
+            head = f.read(16)
+
+            if head.startswith(b"\x89PNG\r\n\x1a\n"):
+                return _png(head, f)
+            if head.startswith(b"\xff\xd8"):
+                return _jpeg(f)
+            if head.startswith(b"FLV"):
+                return _flv(f)
+            if head.startswith(b"RIFF") and head[8:12] == b"AVI ":
+                return _avi(f)
+            if head.startswith(b"OggS"):
+                return _ogg(f)
+            if head.startswith(b"\x1a\x45\xdf\xa3"):
+                return _matroska(f)
+            if head[4:8] in ISO_BOXES:
+                return _mp4(f)
+    except (OSError, ValueError, IndexError, KeyError, struct.error) as e:
+        logging.debug(f"{fn}: header not parsed: {e}")
+
+    return None
+
+
+# %% images
+
+
+def _png(head: bytes, f: T.BinaryIO) -> dict[str, T.Any] | None:
+    ihdr = head[8:] + f.read(16)
+    if ihdr[4:8] != b"IHDR":
+        return None
+
+    w, h = struct.unpack(">II", ihdr[8:16])
+
+    return {"width": w, "height": h, "fps": None}
+
+
+def _jpeg(f: T.BinaryIO) -> dict[str, T.Any] | None:
+    # start-of-frame markers, excluding DHT, JPG, DAC
+    SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+    f.seek(2)
+    while True:
+        b = f.read(1)
+        if not b:
+            return None
+        if b != b"\xff":
+            continue
+
+        marker = f.read(1)[0]
+        if marker == 0xFF or 0xD0 <= marker <= 0xD9 or marker == 0x01:
+            # fill byte or standalone marker
+            if marker == 0xFF:
+                f.seek(-1, 1)
+            continue
+
+        if marker == 0xDA:  # start of scan without a frame header
+            return None
+
+        n = struct.unpack(">H", f.read(2))[0]
+        if marker in SOF:
+            h, w = struct.unpack(">xHH", f.read(5))
+            return {"width": w, "height": h, "fps": None}
+
+        f.seek(n - 2, 1)
+
+
+# %% FLV
+
+
+def _flv(f: T.BinaryIO) -> dict[str, T.Any] | None:
+    f.seek(0)
+    flags = flv.read_header(f)
+
+    for i, (tag_type, _, data) in enumerate(flv.iter_tags(f)):
+        if tag_type == flv.SCRIPT:
+            values = flv.amf0_decode_all(data)
+            if len(values) >= 2 and values[0] == "onMetaData" and isinstance(values[1], dict):
+                m = values[1]
+                if m.get("width") and m.get("height"):
+                    r: dict[str, T.Any] = {"width": int(m["width"]), "height": int(m["height"])}
+                    if m.get("framerate"):
+                        r["fps"] = float(m["framerate"])
+                    return r
+                if not flags & flv.HAS_VIDEO and "videocodecid" not in m:
+                    return {}
+                return None
+        if i > 8:  # onMetaData is always among the first tags
+            break
+
+    return None
+
+
+# %% AVI
+
+
+def _riff_chunks(f: T.BinaryIO, start: int, end: int) -> T.Iterator[tuple[bytes, int, int]]:
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        cid, size = struct.unpack("<4sI", f.read(8))
+        yield cid, pos + 8, size
+        pos += 8 + size + (size & 1)
+
+
+def _avi(f: T.BinaryIO) -> dict[str, T.Any] | None:
+    f.seek(4)
+    riff_end = 8 + struct.unpack("<I", f.read(4))[0]
+
+    for cid, pos, size in _riff_chunks(f, 12, riff_end):
+        if cid != b"LIST":
+            continue
+        f.seek(pos)
+        if f.read(4) != b"hdrl":
+            continue
+
+        has_stream = False
+        for cid2, pos2, size2 in _riff_chunks(f, pos + 4, pos + size):
+            if cid2 != b"LIST":
+                continue
+            f.seek(pos2)
+            if f.read(4) != b"strl":
+                continue
+            has_stream = True
+
+            strh = strf = None
+            for cid3, pos3, size3 in _riff_chunks(f, pos2 + 4, pos2 + size2):
+                if cid3 in (b"strh", b"strf"):
+                    f.seek(pos3)
+                    if cid3 == b"strh":
+                        strh = f.read(size3)
+                    else:
+                        strf = f.read(size3)
+
+            if not strh or strh[:4] != b"vids" or not strf:
+                continue
+
+            scale, rate = struct.unpack("<II", strh[20:28])
+            w, h = struct.unpack("<ii", strf[4:12])
+            r: dict[str, T.Any] = {"width": w, "height": abs(h)}
+            if scale and rate:
+                r["fps"] = rate / scale
+
+            return r
+
+        return {} if has_stream else None
+
+    return None
+
+
+# %% Ogg
+
+
+def _ogg(f: T.BinaryIO) -> dict[str, T.Any] | None:
+    AUDIO = (b"\x01vorbis", b"OpusHead", b"\x7fFLAC", b"Speex   ")
+    METADATA = (b"fishead\x00", b"fisbone\x00")
+
+    f.seek(0)
+    while True:
+        page = f.read(27)
+        if len(page) < 27 or page[:4] != b"OggS":
+            return None
+
+        header_type = page[5]
+        nseg = page[26]
+        lacing = f.read(nseg)
+        body = f.read(sum(lacing))
+
+        if not header_type & 0x02:
+            # all beginning-of-stream pages come first; no Theora found
+            return {}
+
+        if body.startswith(b"\x80theora"):
+            vmaj, vmin = body[7], body[8]
+            fmbw, fmbh = struct.unpack(">HH", body[10:14])
+            w, h = fmbw * 16, fmbh * 16
+            picw = int.from_bytes(body[14:17], "big")
+            pich = int.from_bytes(body[17:20], "big")
+            if (vmaj, vmin) >= (3, 2) and 0 < picw <= w and 0 < pich <= h:
+                w, h = picw, pich
+            frn, frd = struct.unpack(">II", body[22:30])
+
+            r: dict[str, T.Any] = {"width": w, "height": h}
+            if frn and frd:
+                r["fps"] = frn / frd
+            return r
+
+        if not body.startswith(AUDIO + METADATA):
+            return None
+
+
+# %% Matroska / WebM
+
+EBML_SEGMENT = 0x18538067
+EBML_TRACKS = 0x1654AE6B
+EBML_CLUSTER = 0x1F43B675
+EBML_TRACK_ENTRY = 0xAE
+EBML_TRACK_TYPE = 0x83
+EBML_DEFAULT_DURATION = 0x23E383
+EBML_VIDEO = 0xE0
+EBML_PIXEL_WIDTH = 0xB0
+EBML_PIXEL_HEIGHT = 0xBA
+
+
+def _vint(f: T.BinaryIO, keep_marker: bool) -> tuple[int | None, int]:
+    """
+    EBML variable length integer
+
+    Returns value (None for "unknown" size) and number of bytes read
+    """
+
+    b = f.read(1)
+    if not b:
+        raise ValueError("unexpected end of file")
+
+    first = b[0]
+    n = 1
+    mask = 0x80
+    while n <= 8 and not first & mask:
+        mask >>= 1
+        n += 1
+    if n > 8:
+        raise ValueError("invalid EBML integer")
+
+    value = first if keep_marker else first & (mask - 1)
+    rest = f.read(n - 1)
+    for c in rest:
+        value = (value << 8) | c
+
+    if not keep_marker and value == (1 << (7 * n)) - 1:
+        return None, n
+
+    return value, n
+
+
+def _ebml_children(
+    f: T.BinaryIO, start: int, end: int | None
+) -> T.Iterator[tuple[int, int, int | None]]:
+    """
+    Yields (id, data_start, data_size) of each child element in [start, end)
+    """
+
+    pos = start
+    while end is None or pos < end:
+        f.seek(pos)
+        try:
+            eid, n1 = _vint(f, True)
+        except ValueError:
+            return
+        size, n2 = _vint(f, False)
+        assert eid is not None
+
+        data = pos + n1 + n2
+        yield eid, data, size
+
+        if size is None:
+            return
+        pos = data + size
+
+
+def _ebml_uint(f: T.BinaryIO, pos: int, size: int | None) -> int:
+    f.seek(pos)
+    return int.from_bytes(f.read(size or 0), "big")
+
+
+def _matroska(f: T.BinaryIO) -> dict[str, T.Any] | None:
+    for eid, pos, size in _ebml_children(f, 0, None):
+        if eid != EBML_SEGMENT:
+            continue
+
+        end = None if size is None else pos + size
+        for eid2, pos2, size2 in _ebml_children(f, pos, end):
+            if eid2 == EBML_CLUSTER:
+                # media data before track headers: unusual, let FFprobe handle it
+                return None
+            if eid2 != EBML_TRACKS or size2 is None:
+                continue
+
+            for eid3, pos3, size3 in _ebml_children(f, pos2, pos2 + size2):
+                if eid3 != EBML_TRACK_ENTRY or size3 is None:
+                    continue
+
+                track_type = None
+                default_duration = None
+                w = h = None
+                for eid4, pos4, size4 in _ebml_children(f, pos3, pos3 + size3):
+                    if eid4 == EBML_TRACK_TYPE:
+                        track_type = _ebml_uint(f, pos4, size4)
+                    elif eid4 == EBML_DEFAULT_DURATION:
+                        default_duration = _ebml_uint(f, pos4, size4)
+                    elif eid4 == EBML_VIDEO and size4 is not None:
+                        for eid5, pos5, size5 in _ebml_children(f, pos4, pos4 + size4):
+                            if eid5 == EBML_PIXEL_WIDTH:
+                                w = _ebml_uint(f, pos5, size5)
+                            elif eid5 == EBML_PIXEL_HEIGHT:
+                                h = _ebml_uint(f, pos5, size5)
+
+                if track_type != 1:
+                    continue
+                if not (w and h):
+                    return None
+
+                r: dict[str, T.Any] = {"width": w, "height": h}
+                if default_duration:
+                    from fractions import Fraction
+
+                    # rounded like FFmpeg matroskadec
+                    r["fps"] = float(Fraction(10**9, default_duration).limit_denominator(30000))
+                return r
+
+            return {}
+
+        return None
+
+    return None
+
+
+# %% MP4 / MOV
+
+
+def _boxes(f: T.BinaryIO, start: int, end: int) -> T.Iterator[tuple[bytes, int, int]]:
+    """
+    Yields (type, payload_start, payload_end) of ISO BMFF boxes in [start, end)
+    """
+
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        hdr = f.read(8)
+        if len(hdr) < 8:
+            return
+
+        size, btype = struct.unpack(">I4s", hdr)
+        payload = pos + 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            payload += 8
+        elif size == 0:
+            size = end - pos
+
+        if size < payload - pos:
+            raise ValueError(f"bad box size {size}")
+
+        yield btype, payload, pos + size
+        pos += size
+
+
+def _child(f: T.BinaryIO, start: int, end: int, btype: bytes) -> tuple[int, int] | None:
+    for t, s, e in _boxes(f, start, end):
+        if t == btype:
+            return s, e
+    return None
+
+
+def _mp4(f: T.BinaryIO) -> dict[str, T.Any] | None:
+    f.seek(0, 2)
+    fend = f.tell()
+
+    moov = _child(f, 0, fend, b"moov")
+    if moov is None:
+        return None
+
+    for t, s, e in _boxes(f, *moov):
+        if t != b"trak":
+            continue
+
+        mdia = _child(f, s, e, b"mdia")
+        if mdia is None:
+            continue
+
+        hdlr = _child(f, *mdia, b"hdlr")
+        if hdlr is None:
+            continue
+        f.seek(hdlr[0] + 8)
+        if f.read(4) != b"vide":
+            continue
+
+        mdhd = _child(f, *mdia, b"mdhd")
+        minf = _child(f, *mdia, b"minf")
+        stbl = _child(f, *minf, b"stbl") if minf else None
+        stsd = _child(f, *stbl, b"stsd") if stbl else None
+        if not (mdhd and stbl and stsd):
+            return None
+
+        # first visual sample entry: 8 box header, 8 SampleEntry, 16 VisualSampleEntry fields
+        f.seek(stsd[0] + 8 + 32)
+        w, h = struct.unpack(">HH", f.read(4))
+        r: dict[str, T.Any] = {"width": w, "height": h}
+
+        f.seek(mdhd[0])
+        version = f.read(1)[0]
+        f.seek(mdhd[0] + (20 if version == 1 else 12))
+        timescale = struct.unpack(">I", f.read(4))[0]
+
+        if stts := _child(f, *stbl, b"stts"):
+            f.seek(stts[0] + 4)
+            n = struct.unpack(">I", f.read(4))[0]
+            entries = struct.unpack(f">{2 * n}I", f.read(8 * n))
+            frames = sum(entries[0::2])
+            duration = sum(c * d for c, d in zip(entries[0::2], entries[1::2]))
+            if frames and duration and timescale:
+                r["fps"] = frames * timescale / duration
+
+        return r
+
+    return {}
@@ -0,0 +1,262 @@
+"""
+metrics of running streams, for monitoring many channels per host
+
+Exported in Prometheus text format over HTTP, and/or as a periodically rewritten JSON file,
+as configured in pylivestream.json:
+
+  "metrics_port": 9108         serves http://localhost:9108/metrics and /metrics.json
+  "metrics_file": "~/live.json"  rewritten every "metrics_interval" seconds (default 5)
+  "channel": "news"            label of the stream, default the site name
+
+Streams of one process share the server. Another process (e.g. one per channel) finding the
+port in use serves on the next free port above it, so each is its own scrape target;
+"metrics_port": 0 picks any free port. The port used is logged.
+The labels of each stream in a process must be unique, so give streams to the same site
+different "channel" names.
+
+https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+
+from __future__ import annotations
+import typing as T
+from pathlib import Path
+import errno
+import json
+import logging
+import threading
+import time
+
+from .cache import atomic_write_text
+
+if T.TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+INTERVAL = 5.0  # seconds between JSON file rewrites
+PORT_TRIES = 100  # ports tried from metrics_port up, while in use by other processes
+
+# name, type, help, snapshot key, scale
+METRICS = [
+    ("pylivestream_up", "gauge", "1 if the encoder is running", "running", 1),
+    ("pylivestream_uptime_seconds", "gauge", "time since encoder started", "uptime", 1),
+    ("pylivestream_restarts_total", "counter", "encoder restarts", "restarts", 1),
+    ("pylivestream_stalls_total", "counter", "encoder restarts due to stalled output", "stalls", 1),
+    (
+        "pylivestream_downtime_seconds_total",
+        "counter",
+        "time encoder was down between restarts",
+        "downtime",
+        1,
+    ),
+    ("pylivestream_encoder_fps", "gauge", "encoded frames per second", "fps", 1),
+    ("pylivestream_encoder_speed", "gauge", "encoding speed relative to realtime", "speed", 1),
+    (
+        "pylivestream_output_bitrate_bits_per_second",
+        "gauge",
+        "output bitrate",
+        "bitrate_kbps",
+        1000,
+    ),
+    ("pylivestream_output_bytes_total", "counter", "bytes output", "total_size", 1),
+    ("pylivestream_frames_total", "counter", "frames encoded", "frame", 1),
+    ("pylivestream_frames_dropped_total", "counter", "frames dropped", "drop_frames", 1),
+    ("pylivestream_frames_duplicated_total", "counter", "frames duplicated", "dup_frames", 1),
+]
+
+# per site, when streaming through isolated sinks (fanout.py)
+SINK_METRICS = [
+    ("pylivestream_sink_up", "gauge", "1 if connected to the site", "connected", 1),
+    ("pylivestream_sink_lag_seconds", "gauge", "media queued for the site", "lag", 1),
+    ("pylivestream_sink_queue_bytes", "gauge", "bytes queued for the site", "queued_bytes", 1),
+    ("pylivestream_sink_sent_bytes_total", "counter", "bytes sent to the site", "sent_bytes", 1),
+    ("pylivestream_sink_dropped_tags_total", "counter", "FLV tags skipped", "dropped_tags", 1),
+    ("pylivestream_sink_reconnects_total", "counter", "reconnects to the site", "reconnects", 1),
+]
+
+_streams: dict[int, T.Any] = {}
+_lock = threading.Lock()
+_servers: dict[int, ThreadingHTTPServer] = {}
+_writers: dict[Path, JsonWriter] = {}
+
+
+def register(stream: T.Any) -> None:
+    """
+    report metrics of stream, which has .stats (EncoderStats) and .channel, .site, .vidsource
+    Raises ValueError if another stream already reports with the same labels.
+    """
+
+    lab = labels(stream)
+    with _lock:
+        for other in _streams.values():
+            if other is not stream and labels(other) == lab:
+                raise ValueError(
+                    f"another stream reports metrics as {lab}, set a unique channel for each"
+                )
+        _streams[id(stream)] = stream
+
+
+def unregister(stream: T.Any) -> None:
+    with _lock:
+        _streams.pop(id(stream), None)
+
+
+def labels(stream: T.Any) -> dict[str, str]:
+    return {
+        "channel": str(getattr(stream, "channel", None) or stream.site),
+        "site": str(stream.site),
+        "source": str(getattr(stream, "vidsource", None) or "audio"),
+    }
+
+
+def collect() -> list[dict[str, T.Any]]:
+    """
+    labels and statistics of each registered stream
+    """
+
+    with _lock:
+        streams = list(_streams.values())
+
+    return [
+        {
+            "labels": labels(s),
+            "stats": s.stats.snapshot(),
+            "sinks": s.fanout.stats() if getattr(s, "fanout", None) else {},
+        }
+        for s in streams
+    ]
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(samples: list[dict[str, T.Any]]) -> str:
+    lines = []
+    for name, kind, doc, key, scale in METRICS:
+        lines += [f"# HELP {name} {doc}", f"# TYPE {name} {kind}"]
+        for s in samples:
+            v = s["stats"].get(key)
+            if v is None:
+                continue
+            lines.append(f"{name}{{{_labels(s['labels'])}}} {float(v) * scale:g}")
+
+    for name, kind, doc, key, scale in SINK_METRICS:
+        if not any(s.get("sinks") for s in samples):
+            break
+        lines += [f"# HELP {name} {doc}", f"# TYPE {name} {kind}"]
+        for s in samples:
+            for sink, stats in s.get("sinks", {}).items():
+                lab = _labels(s["labels"] | {"sink": sink})
+                lines.append(f"{name}{{{lab}}} {float(stats[key]) * scale:g}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _labels(labels: dict[str, str]) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+def render_json(samples: list[dict[str, T.Any]]) -> str:
+    return json.dumps({"time": time.time(), "streams": samples}, indent=2)
+
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    serve /metrics (Prometheus) and /metrics.json from a background thread.
+    Only one server per port is started per process. If port is in use,
+    the next free port is used, up to PORT_TRIES. Port 0 is any free port.
+    """
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = render_prometheus(collect()).encode()
+                ctype = "text/plain; version=0.0.4; charset=utf-8"
+            elif self.path == "/metrics.json":
+                body = render_json(collect()).encode()
+                ctype = "application/json"
+            else:
+                self.send_error(404)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+    with _lock:
+        if (server := _servers.get(port)) is None:
+            last = port + PORT_TRIES - 1 if port else 0
+            for p in range(port, last + 1):
+                try:
+                    server = ThreadingHTTPServer((host, p), Handler)
+                    break
+                except OSError as e:
+                    if e.errno != errno.EADDRINUSE or p == last:
+                        raise
+            assert server is not None
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            _servers[port] = server
+
+            bound = server.server_address[1]
+            msg = f"metrics at http://{host}:{bound}/metrics"
+            if port and bound != port:
+                logging.warning(f"{msg}, as port {port} is in use")
+            else:
+                logging.info(msg)
+
+    return server
+
+
+class JsonWriter(threading.Thread):
+    """
+    rewrite a JSON file with metrics of all streams every interval seconds
+    """
+
+    def __init__(self, fn: Path, interval: float = INTERVAL):
+        super().__init__(daemon=True)
+
+        self.fn = Path(fn).expanduser()
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def write(self) -> None:
+        try:
+            atomic_write_text(self.fn, render_json(collect()))
+        except OSError as e:
+            logging.error(f"could not write metrics {self.fn}: {e}")
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.write()
+
+
+def start(
+    port: int | None = None, fn: Path | str | None = None, interval: float | None = None
+) -> None:
+    """
+    start exporters if configured, once per process
+    """
+
+    if port is not None:
+        try:
+            serve(port)
+        except OSError as e:
+            logging.error(f"could not serve metrics on port {port}: {e}")
+
+    if fn:
+        fn = Path(fn).expanduser()
+        with _lock:
+            if fn not in _writers:
+                _writers[fn] = JsonWriter(fn, interval or INTERVAL)
+                _writers[fn].start()
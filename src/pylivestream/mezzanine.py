@@ -0,0 +1,195 @@
+"""
+pre-transcode playlist files once into site-conformant "mezzanine" files
+
+Each file is encoded to H.264 yuv420p with a keyframe every keyframe_sec, AAC at audio_rate,
+at the bitrate the site stream would use, so at air time FileIn streams it with -codec copy
+instead of running the encoder again on every play.
+
+Mezzanine files are stored by hash of the source file contents and the encoding profile,
+so renamed or duplicate files are transcoded only once, and a changed profile
+(e.g. different site bitrate) makes new files.
+The cache is limited in size ("mezzanine_max_gb" in pylivestream.json, default 50 GB),
+least recently played files are removed first.
+
+python -m pylivestream.mezzanine ~/Videos youtube ./pylivestream.json -glob "*.mp4"
+"""
+
+from __future__ import annotations
+import typing as T
+from pathlib import Path
+import argparse
+import functools
+import hashlib
+import json
+import logging
+import subprocess
+
+from .cache import BlobCache, cache_dir, get_probe_cache
+from .base import FileIn, unify_streams
+from .stream import FPS, Stream
+
+PRESET = "medium"  # offline, so we can afford a better preset than live
+MAX_GB = 50
+SUFFIX = ".mp4"
+
+
+def content_hash(fn: Path) -> str:
+    """
+    SHA-256 of file contents, remembered until the file changes
+    """
+
+    cache = get_probe_cache()
+    if (c := cache.get(fn, kind="sha256")) is not None:
+        return c["sha256"]
+
+    h = hashlib.sha256()
+    with Path(fn).open("rb") as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+
+    cache.put(fn, {"sha256": h.hexdigest()}, kind="sha256")
+
+    return h.hexdigest()
+
+
+def profile(s: Stream, preset: str = PRESET) -> dict[str, T.Any]:
+    """
+    encoding parameters of stream s, which determine the mezzanine file
+    """
+
+    fps = s.fps if s.fps is not None else FPS
+
+    return {
+        "video_codec": s.video_codec,
+        "preset": preset,
+        "kbps": s.video_kbps,
+        "gop": round(s.keyframe_sec * fps),
+        "audio_codec": "aac",
+        "audio_rate": s.audio_rate,
+        "audio_bps": s.audio_bps,
+    }
+
+
+def mezzanine_key(fn: Path, prof: dict[str, T.Any]) -> str:
+    return hashlib.sha256(
+        f"{content_hash(fn)}\0{json.dumps(prof, sort_keys=True)}".encode()
+    ).hexdigest()
+
+
+@functools.cache
+def get_mezzanine_cache(max_gb: float = MAX_GB) -> BlobCache:
+    return BlobCache(cache_dir("mezzanine"), int(max_gb * 1e9))
+
+
+def transcode_cmd(exe: str, fn: Path, prof: dict[str, T.Any], out: Path) -> list[str]:
+    gop = str(prof["gop"])
+
+    cmd = [exe, "-loglevel", "error", "-nostdin", "-y", "-i", str(fn)]
+    cmd += ["-map", "0:v:0", "-map", "0:a:0?"]
+    cmd += ["-codec:v", prof["video_codec"], "-preset", prof["preset"], "-pix_fmt", "yuv420p"]
+    cmd += ["-b:v", f"{prof['kbps']}k", "-maxrate", f"{prof['kbps']}k"]
+    cmd += ["-bufsize", f"{prof['kbps'] * 2}k"]
+    # fixed GOP, so keyframes fall every keyframe_sec as streaming sites want
+    cmd += ["-g", gop, "-keyint_min", gop, "-sc_threshold", "0"]
+    cmd += ["-codec:a", prof["audio_codec"]]
+    if prof["audio_bps"]:
+        cmd += ["-b:a", str(prof["audio_bps"])]
+    if prof["audio_rate"]:
+        cmd += ["-ar", str(prof["audio_rate"])]
+    cmd += ["-movflags", "+faststart", "-f", "mp4", str(out)]
+
+    return cmd
+
+
+def mezzanine(
+    fn: Path,
+    inifn: Path,
+    sites: list[str],
+    *,
+    meta: dict[str, T.Any] | None = None,
+    cache: BlobCache | None = None,
+    preset: str = PRESET,
+) -> Path:
+    """
+    file to air in place of fn: fn itself if it can already be stream copied,
+    else its mezzanine, transcoding it now if not already cached.
+    """
+
+    F = FileIn(inifn, sites, infn=fn, meta=meta)
+    s = F.streams[unify_streams(F.streams)]
+
+    if not s.res or (s.copy_video and s.copy_audio):
+        # audio-only, or already suitable
+        return fn
+
+    prof = profile(s, preset)
+    key = mezzanine_key(fn, prof)
+
+    if cache is None:
+        cache = get_mezzanine_cache()
+
+    if (p := cache.get(key, SUFFIX)) is not None:
+        return p
+
+    tmp = cache.new_file(SUFFIX)
+    cmd = transcode_cmd(s.exe, fn, prof, tmp)
+    print(f"transcoding {fn}")
+    logging.info(" ".join(cmd))
+
+    try:
+        subprocess.run(cmd, check=True)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+    return cache.put(key, tmp, SUFFIX)
+
+
+def prepare(
+    flist: list[Path],
+    inifn: Path,
+    sites: list[str],
+    metas: dict[Path, dict[str, T.Any]] | None = None,
+) -> dict[Path, Path]:
+    """
+    ensure each file has a mezzanine, returning {original file: file to air}.
+    Files that fail to transcode are aired from the original.
+    """
+
+    C = json.loads(Path(inifn).expanduser().read_text())
+    cache = get_mezzanine_cache(C.get("mezzanine_max_gb", MAX_GB))
+    preset = C.get("mezzanine_preset", PRESET)
+
+    air: dict[Path, Path] = {}
+    for f in flist:
+        try:
+            air[f] = mezzanine(
+                f, inifn, sites, meta=metas.get(f) if metas else None, cache=cache, preset=preset
+            )
+        except subprocess.CalledProcessError as e:
+            logging.error(f"could not transcode {f}, will encode live: {e}")
+            air[f] = f
+
+    cache.evict(keep=set(air.values()))
+
+    return air
+
+
+def cli():
+    from .fglob import fileglob
+
+    p = argparse.ArgumentParser(description="pre-transcode files for streaming with stream copy")
+    p.add_argument("path", help="path to discover files from")
+    p.add_argument("websites", help="sites the files will be streamed to", nargs="+")
+    p.add_argument("json", help="JSON file with stream parameters")
+    p.add_argument("-glob", help="file glob pattern")
+    P = p.parse_args()
+
+    air = prepare(fileglob(P.path, P.glob), P.json, P.websites)
+
+    for f, m in air.items():
+        print(f"{f} -> {m}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,280 @@
+"""
+MPEG transport stream timestamps, to join clips into one continuous stream
+
+Clips muxed separately each start their PTS, DTS, PCR and continuity counters from zero.
+Written one after another into a live encoder's stdin, that looks like a jump back in time
+at each clip boundary. Retimer rewrites these fields in place, packet by packet,
+so each clip continues where the previous one ended.
+
+https://en.wikipedia.org/wiki/MPEG_transport_stream
+"""
+
+from __future__ import annotations
+import typing as T
+import mmap
+
+PACKET = 188
+SYNC = 0x47
+CLOCK = 90000  # PTS, DTS and PCR base ticks per second
+WRAP = 1 << 33
+
+__all__ = ["PACKET", "CLOCK", "Retimer", "iter_timestamps", "keyframes"]
+
+
+class Timestamps(T.NamedTuple):
+    pid: int
+    pcr: int | None  # PCR base, 90 kHz
+    pts: int | None
+    dts: int | None
+    random_access: bool
+
+
+def read_ts(b: T.Sequence[int], i: int) -> int:
+    return (
+        ((b[i] & 0x0E) << 29)
+        | (b[i + 1] << 22)
+        | ((b[i + 2] & 0xFE) << 14)
+        | (b[i + 3] << 7)
+        | (b[i + 4] >> 1)
+    )
+
+
+def write_ts(b: bytearray, i: int, ts: int) -> None:
+    """
+    keeps the 4-bit prefix of the field
+    """
+
+    b[i] = (b[i] & 0xF0) | ((ts >> 29) & 0x0E) | 1
+    b[i + 1] = (ts >> 22) & 0xFF
+    b[i + 2] = ((ts >> 14) & 0xFE) | 1
+    b[i + 3] = (ts >> 7) & 0xFF
+    b[i + 4] = ((ts << 1) & 0xFE) | 1
+
+
+def read_pcr(b: T.Sequence[int], i: int) -> int:
+    return (b[i] << 25) | (b[i + 1] << 17) | (b[i + 2] << 9) | (b[i + 3] << 1) | (b[i + 4] >> 7)
+
+
+def write_pcr(b: bytearray, i: int, base: int) -> None:
+    """
+    keeps the reserved bits and 27 MHz extension
+    """
+
+    b[i] = (base >> 25) & 0xFF
+    b[i + 1] = (base >> 17) & 0xFF
+    b[i + 2] = (base >> 9) & 0xFF
+    b[i + 3] = (base >> 1) & 0xFF
+    b[i + 4] = ((base << 7) & 0x80) | (b[i + 4] & 0x7F)
+
+
+def _pes_start(b: T.Sequence[int] | mmap.mmap, o: int) -> bool:
+    """
+    PES start code prefix 00 00 01 at o
+    """
+
+    return b[o] == 0 and b[o + 1] == 0 and b[o + 2] == 1
+
+
+def _fields(b: T.Sequence[int], i: int) -> tuple[int | None, int | None, int | None, bool]:
+    """
+    offsets of PCR, PTS and DTS in the packet at i, and its random access indicator
+    """
+
+    afc = (b[i + 3] >> 4) & 3
+    pcr = pts = dts = None
+    ra = False
+    o = i + 4
+
+    if afc & 2:
+        n = b[o]
+        if n:
+            flags = b[o + 1]
+            ra = bool(flags & 0x40)
+            if flags & 0x10:
+                pcr = o + 2
+        o += 1 + n
+
+    # start of PES (not PSI table) with a header
+    if afc & 1 and b[i + 1] & 0x40 and o + 14 <= i + PACKET and _pes_start(b, o):
+        flags = b[o + 7] >> 6
+        if flags & 2:
+            pts = o + 9
+        if flags == 3:
+            dts = o + 14
+
+    return pcr, pts, dts, ra
+
+
+def iter_timestamps(buf: T.Sequence[int]) -> T.Iterator[Timestamps]:
+    """
+    timestamps of each packet in buf carrying any
+    """
+
+    for i in range(0, len(buf) - PACKET + 1, PACKET):
+        pcr, pts, dts, ra = _fields(buf, i)
+        if pcr is None and pts is None and not ra:
+            continue
+
+        yield Timestamps(
+            ((buf[i + 1] & 0x1F) << 8) | buf[i + 2],
+            read_pcr(buf, pcr) if pcr is not None else None,
+            read_ts(buf, pts) if pts is not None else None,
+            read_ts(buf, dts) if dts is not None else None,
+            ra,
+        )
+
+
+def keyframes(buf: T.Sequence[int] | mmap.mmap) -> list[int]:
+    """
+    byte offsets of the packets starting a video keyframe, where a GOP can be cut
+    """
+
+    offsets = []
+
+    for i in range(0, len(buf) - PACKET + 1, PACKET):
+        # payload start with adaptation field, and its random access indicator
+        if not (buf[i + 1] & 0x40 and buf[i + 3] & 0x30 == 0x30 and buf[i + 4]):
+            continue
+        if not buf[i + 5] & 0x40:
+            continue
+        o = i + 5 + buf[i + 4]
+        # PES of a video stream id
+        if o + 4 <= i + PACKET and _pes_start(buf, o) and buf[o + 3] & 0xF0 == 0xE0:
+            offsets.append(i)
+
+    return offsets
+
+
+class Retimer:
+    """
+    shift the timestamps of each clip to start where the previous clip ended.
+    Call next_clip() before the first packet of each clip.
+    """
+
+    def __init__(self) -> None:
+        self.clips = 0
+        self.end = 0  # 90 kHz, end of the last frame written so far
+        self.delta: int | None = None  # shift of the current clip, found from its first data
+        self.start = 0  # 90 kHz, first output PTS of the current clip
+
+        self._cc: dict[int, int] = {}  # output continuity counter of each PID
+        self._out: dict[int, int] = {}  # last output DTS of each PID
+        self._last: dict[int, int] = {}  # last DTS in the clip of each PID
+        self._step: dict[int, int] = {}  # shortest DTS step of each PID, the frame duration
+        self._top: dict[int, int] = {}  # latest output PTS of each PID
+
+    def next_clip(self) -> None:
+        self.end = self.clip_end()
+        self.delta = None
+        self._last.clear()
+        self._top.clear()
+        self.clips += 1
+
+    def clip_end(self) -> int:
+        """
+        end of the current clip, after its latest frame on any stream
+        """
+
+        return max(
+            (top + self._step.get(pid, 0) for pid, top in self._top.items()), default=self.end
+        )
+
+    @property
+    def seconds(self) -> float:
+        """
+        stream time at the end of the clips written so far
+        """
+
+        return self.clip_end() / CLOCK
+
+    @property
+    def clip_seconds(self) -> float:
+        """
+        duration of the current clip so far
+        """
+
+        return (self.clip_end() - self.start) / CLOCK if self.delta is not None else 0.0
+
+    def retime(self, buf: bytearray) -> None:
+        """
+        rewrite whole TS packets in buf in place
+        """
+
+        if len(buf) % PACKET:
+            raise ValueError(f"{len(buf)} bytes is not whole {PACKET}-byte TS packets")
+
+        if self.delta is None:
+            self.delta = self._clip_delta(buf)
+            if self.delta is None:
+                return self._continuity(buf)
+        delta = self.delta
+
+        for i in range(0, len(buf), PACKET):
+            if buf[i] != SYNC:
+                raise ValueError(f"lost TS sync at byte {i}")
+
+            pid = ((buf[i + 1] & 0x1F) << 8) | buf[i + 2]
+            self._count(buf, i, pid)
+
+            pcr, pts, dts, _ = _fields(buf, i)
+            if pcr is not None:
+                write_pcr(buf, pcr, (read_pcr(buf, pcr) + delta) % WRAP)
+            if pts is None:
+                continue
+
+            p = read_ts(buf, pts) + delta
+            write_ts(buf, pts, p % WRAP)
+            d = p
+            if dts is not None:
+                d = read_ts(buf, dts) + delta
+                write_ts(buf, dts, d % WRAP)
+
+            if (last := self._last.get(pid)) is not None and d > last:
+                self._step[pid] = min(self._step.get(pid, d - last), d - last)
+            self._last[pid] = self._out[pid] = d
+            self._top[pid] = max(self._top.get(pid, p), p)
+
+    def _clip_delta(self, buf: bytearray) -> int | None:
+        """
+        shift of a new clip, from the timestamps at its start
+        """
+
+        pts = []
+        dts: dict[int, int] = {}
+        for t in iter_timestamps(buf):
+            if t.pts is not None:
+                pts.append(t.pts)
+                d = t.dts if t.dts is not None else t.pts
+                dts[t.pid] = min(dts.get(t.pid, d), d)
+        if not pts:
+            return None
+
+        if not (self._top or self.end):
+            # the first clip keeps its timestamps, PCR is ahead of them by the mux delay
+            self.start = min(pts)
+            return 0
+
+        # presentation continues from the end
+        delta = self.end - min(pts)
+        # while decoding order stays increasing, should this clip reorder more frames
+        for pid, d in dts.items():
+            if (out := self._out.get(pid)) is not None:
+                delta = max(delta, out + self._step.get(pid, 1) - d)
+
+        self.start = min(pts) + delta
+
+        return delta
+
+    def _continuity(self, buf: bytearray) -> None:
+        for i in range(0, len(buf), PACKET):
+            self._count(buf, i, ((buf[i + 1] & 0x1F) << 8) | buf[i + 2])
+
+    def _count(self, buf: bytearray, i: int, pid: int) -> None:
+        """
+        renumber continuity counters, so the demuxer sees no lost packets at clip joins
+        """
+
+        if buf[i + 3] & 0x10 and pid != 0x1FFF:
+            cc = (self._cc.get(pid, -1) + 1) & 0xF
+            self._cc[pid] = cc
+            buf[i + 3] = (buf[i + 3] & 0xF0) | cc
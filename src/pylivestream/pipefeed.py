@@ -0,0 +1,212 @@
+"""
+feed an FFmpeg stdin pipe at high throughput
+
+Files are moved into the pipe by the kernel (splice or sendfile on Linux), without copying
+through Python. Other data is written in large chunks. The pipe is non-blocking, so time
+spent waiting on a full pipe (FFmpeg not reading fast enough, e.g. with -re) is measured
+as stalls rather than hidden in a blocking write. On Linux the pipe is also enlarged.
+
+Use on Windows falls back to plain blocking writes, with the same statistics.
+"""
+
+from __future__ import annotations
+import typing as T
+from pathlib import Path
+import errno
+import logging
+import os
+import select
+import sys
+import time
+
+CHUNK = 1 << 20  # bytes per write or kernel copy
+PIPE_SIZE = 1 << 20  # requested pipe capacity, Linux
+
+# Linux fcntl, not all exposed by Python
+F_SETPIPE_SZ = 1031
+F_GETPIPE_SZ = 1032
+FIONREAD = 0x541B
+
+
+class PipeFeeder:
+    """
+    write files and data to a pipe, tracking throughput, stalls and pipe fill level
+    """
+
+    def __init__(self, pipe: T.IO[bytes] | int, chunk: int = CHUNK, pipe_size: int = PIPE_SIZE):
+        if not isinstance(pipe, int):
+            pipe.flush()
+            pipe = pipe.fileno()
+
+        self.fd = pipe
+        self.chunk = chunk
+
+        self.bytes = 0
+        self.stalls = 0  # writes that found the pipe full
+        self.stall_seconds = 0.0
+        self.started = time.monotonic()
+
+        self.linux = sys.platform.startswith("linux")
+        self.nonblocking = sys.platform != "win32"
+        self.capacity: int | None = None
+
+        if self.linux:
+            import fcntl
+
+            try:
+                self.capacity = fcntl.fcntl(self.fd, F_SETPIPE_SZ, pipe_size)
+            except OSError:
+                # over /proc/sys/fs/pipe-max-size, keep the default
+                self.capacity = fcntl.fcntl(self.fd, F_GETPIPE_SZ)
+
+        self._blocking = os.get_blocking(self.fd) if self.nonblocking else True
+        if self.nonblocking:
+            os.set_blocking(self.fd, False)
+
+    def __enter__(self) -> PipeFeeder:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        restore the pipe to blocking mode, for other writers
+        """
+
+        if self.nonblocking:
+            try:
+                os.set_blocking(self.fd, self._blocking)
+            except OSError:
+                pass
+
+    def _wait(self) -> None:
+        """
+        wait until the pipe has room
+        """
+
+        tic = time.monotonic()
+        self.stalls += 1
+        select.select([], [self.fd], [])
+        self.stall_seconds += time.monotonic() - tic
+
+    def write(self, data: bytes | bytearray | memoryview) -> None:
+        view = memoryview(data).cast("B")
+
+        for i in range(0, len(view), self.chunk):
+            end = i + self.chunk
+            part = view[i:end]
+            while part:
+                try:
+                    n = os.write(self.fd, part)
+                except BlockingIOError:
+                    self._wait()
+                    continue
+                part = part[n:]
+                self.bytes += n
+
+    def write_iter(self, chunks: T.Iterable[bytes]) -> None:
+        """
+        write each chunk of e.g. an HTTP response body
+        """
+
+        for c in chunks:
+            if c:
+                self.write(c)
+
+    def send_file(self, path: Path | str | T.BinaryIO) -> int:
+        """
+        copy the whole file into the pipe, returning the number of bytes sent
+        """
+
+        if isinstance(path, (str, Path)):
+            with Path(path).expanduser().open("rb") as fh:
+                return self.send_file(fh)
+
+        f = path
+        start = self.bytes
+        src = f.fileno()
+        offset = f.tell()
+        size = os.fstat(src).st_size
+
+        copy = self._kernel_copy()
+        if copy is not None:
+            try:
+                while offset < size:
+                    try:
+                        n = copy(src, offset, min(self.chunk, size - offset))
+                    except BlockingIOError:
+                        self._wait()
+                        continue
+                    if n == 0:
+                        break
+                    offset += n
+                    self.bytes += n
+                f.seek(offset)
+                return self.bytes - start
+            except OSError as e:
+                if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                    raise
+                logging.debug(f"kernel copy not available, falling back to read/write: {e}")
+                f.seek(offset)
+
+        while data := f.read(self.chunk):
+            self.write(data)
+
+        return self.bytes - start
+
+    def _kernel_copy(self) -> T.Callable[[int, int, int], int] | None:
+        """
+        (file descriptor, offset, count) -> bytes copied from file to pipe inside the kernel
+        """
+
+        if not self.linux:
+            return None
+
+        if hasattr(os, "splice"):
+            flags = os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK
+            return lambda src, offset, count: os.splice(
+                src, self.fd, count, offset_src=offset, flags=flags
+            )
+
+        return lambda src, offset, count: os.sendfile(self.fd, src, offset, count)
+
+    def fill(self) -> int | None:
+        """
+        bytes in the pipe not yet read by FFmpeg, if known (Linux)
+        """
+
+        if not self.linux:
+            return None
+
+        import array
+        import fcntl
+
+        n = array.array("i", [0])
+        try:
+            fcntl.ioctl(self.fd, FIONREAD, n, True)
+        except OSError:
+            return None
+
+        return n[0]
+
+    def stats(self) -> dict[str, T.Any]:
+        elapsed = time.monotonic() - self.started
+
+        return {
+            "bytes": self.bytes,
+            "seconds": elapsed,
+            "mbytes_per_sec": self.bytes / elapsed / 1e6 if elapsed > 0 else 0.0,
+            "stalls": self.stalls,
+            "stall_seconds": self.stall_seconds,
+            "pipe_fill_bytes": self.fill(),
+            "pipe_capacity_bytes": self.capacity,
+        }
+
+    def __repr__(self) -> str:
+        s = self.stats()
+        return (
+            f"{s['bytes'] / 1e6:.1f} MB in {s['seconds']:.1f} sec "
+            f"({s['mbytes_per_sec']:.1f} MB/s), "
+            f"{s['stalls']} stalls totaling {s['stall_seconds']:.1f} sec"
+        )
@@ -0,0 +1,242 @@
+"""
+filler video to air while nothing else is ready, at constant memory
+
+The placeholder file is encoded once to an MPEG-TS segment (H.264 + AAC, fixed GOP,
+at the resolution and frame rate of the live stream) and kept in the user cache,
+keyed by file contents and profile. At air time the segment is memory mapped and
+written to the encoder pipe in large slices, looping as long as needed:
+the pages come from the OS file cache, so the process memory doesn't grow with the
+length of the filler, unlike decoding it to raw frames in memory.
+
+MPEG-TS can be read by FFmpeg from a pipe from any packet, and FFmpeg corrects
+the timestamp jump at each loop of a TS input.
+
+  with Placeholder("~/Videos/filler.mp4") as P:
+      with PipeFeeder(proc.stdin) as feed:
+          P.feed(feed, loops=3)
+"""
+
+from __future__ import annotations
+import typing as T
+from pathlib import Path
+import bisect
+import functools
+import hashlib
+import json
+import logging
+import mmap
+import subprocess
+import threading
+
+from .cache import BlobCache, cache_dir
+from .ffmpeg import get_exe, get_meta
+from .mezzanine import content_hash
+from .mpegts import keyframes
+
+if T.TYPE_CHECKING:
+    from .pipefeed import PipeFeeder
+
+MAX_GB = 2
+SUFFIX = ".ts"
+TS_PACKET = 188
+
+
+@functools.cache
+def get_placeholder_cache(max_gb: float = MAX_GB) -> BlobCache:
+    return BlobCache(cache_dir("placeholder"), int(max_gb * 1e9))
+
+
+def profile(
+    width: int = 1920,
+    height: int = 1080,
+    fps: float = 30.0,
+    keyframe_sec: float = 2.0,
+    audio_rate: int = 44100,
+) -> dict[str, T.Any]:
+    return {
+        "width": width,
+        "height": height,
+        "fps": fps,
+        "gop": round(keyframe_sec * fps),
+        "audio_rate": audio_rate,
+    }
+
+
+def has_audio(fn: Path) -> bool:
+    try:
+        meta = get_meta(fn)
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        logging.debug(f"{fn}: could not probe, assuming audio: {e}")
+        return True
+
+    return any(s.get("codec_type") == "audio" for s in meta.get("streams", []))
+
+
+def video_args(prof: dict[str, T.Any]) -> list[str]:
+    """
+    encode video to the profile: H.264 at its size and frame rate, fixed GOP
+    """
+
+    w, h = prof["width"], prof["height"]
+    gop = str(prof["gop"])
+
+    cmd = [
+        "-vf",
+        f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+        f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,fps={prof['fps']}",
+    ]
+    cmd += ["-codec:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p"]
+    cmd += ["-g", gop, "-keyint_min", gop, "-sc_threshold", "0"]
+
+    return cmd
+
+
+def audio_args(prof: dict[str, T.Any]) -> list[str]:
+    return ["-codec:a", "aac", "-ar", str(prof["audio_rate"]), "-ac", "2"]
+
+
+def segment_cmd(exe: str, fn: Path, prof: dict[str, T.Any], out: Path, audio: bool) -> list[str]:
+    cmd = [exe, "-loglevel", "error", "-nostdin", "-y", "-i", str(fn)]
+    if audio:
+        cmd += ["-map", "0:v:0", "-map", "0:a:0?"]
+    else:
+        # silence, so the encoder input always has an audio stream
+        cmd += ["-f", "lavfi", "-i", f"anullsrc=r={prof['audio_rate']}:cl=stereo"]
+        cmd += ["-map", "0:v:0", "-map", "1:a", "-shortest"]
+    cmd += video_args(prof) + audio_args(prof)
+    # a PES per audio frame, as pylivestream.ingest remuxes clips
+    cmd += ["-pes_payload_size", "0", "-f", "mpegts", str(out)]
+
+    return cmd
+
+
+def segment(fn: Path, prof: dict[str, T.Any] | None = None, cache: BlobCache | None = None) -> Path:
+    """
+    MPEG-TS segment of placeholder file fn, encoding it now if not already cached
+    """
+
+    fn = Path(fn).expanduser()
+    if prof is None:
+        prof = profile()
+    if cache is None:
+        cache = get_placeholder_cache()
+
+    key = hashlib.sha256(
+        f"{content_hash(fn)}\0{json.dumps(prof, sort_keys=True)}".encode()
+    ).hexdigest()
+
+    if (p := cache.get(key, SUFFIX)) is not None:
+        return p
+
+    tmp = cache.new_file(SUFFIX)
+    cmd = segment_cmd(get_exe("ffmpeg"), fn, prof, tmp, has_audio(fn))
+    print(f"encoding placeholder {fn}")
+    logging.info(" ".join(cmd))
+
+    try:
+        subprocess.run(cmd, check=True)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+    return cache.put(key, tmp, SUFFIX)
+
+
+class Placeholder:
+    """
+    loopable, memory mapped reader of the placeholder segment
+    """
+
+    def __init__(
+        self,
+        fn: Path | str,
+        prof: dict[str, T.Any] | None = None,
+        cache: BlobCache | None = None,
+        chunk: int = 1 << 20,
+    ):
+        # clips switched in are converted to this profile, see pylivestream.ingest
+        self.prof = profile() if prof is None else prof
+        self.path = segment(Path(fn), self.prof, cache)
+        # whole TS packets, so each slice starts where a demuxer can pick up
+        self.chunk = max(chunk // TS_PACKET, 1) * TS_PACKET
+
+        self._f = self.path.open("rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self._mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            self._mm.madvise(mmap.MADV_SEQUENTIAL)
+
+        self.pos = 0
+        self.loops = 0  # completed passes over the segment
+
+    def __len__(self) -> int:
+        return len(self._mm)
+
+    def __enter__(self) -> Placeholder:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._mm.close()
+        self._f.close()
+
+    def read(self, n: int | None = None) -> bytes:
+        """
+        next up to n bytes, wrapping to the start at the end of the segment
+        """
+
+        n = self.chunk if n is None else n
+        pos = self.pos
+        upto = pos + n
+        data = self._mm[pos:upto]
+
+        self.pos += len(data)
+        if self.pos >= len(self._mm):
+            self.pos = 0
+            self.loops += 1
+
+        return data
+
+    @functools.cached_property
+    def cuts(self) -> list[int]:
+        """
+        byte offsets where each GOP starts, then the end of the segment
+        """
+
+        k = keyframes(self._mm)
+
+        return [0] + k[1:] + [len(self._mm)]
+
+    def read_gop(self) -> bytes:
+        """
+        from the current position to the start of the next GOP, wrapping at the end
+        """
+
+        end = self.cuts[bisect.bisect_right(self.cuts, self.pos)]
+
+        return self.read(end - self.pos)
+
+    def feed(self, feed: PipeFeeder, loops: int = 1, stop: threading.Event | None = None) -> int:
+        """
+        write loops passes of the segment to the pipe, or until stop is set.
+        Returns number of bytes written.
+        """
+
+        start = feed.bytes
+        end = self.loops + loops
+
+        with memoryview(self._mm) as view:
+            while self.loops < end and not (stop and stop.is_set()):
+                pos = self.pos
+                upto = min(pos + self.chunk, len(view))
+                feed.write(view[pos:upto])
+                self.pos = upto
+                if self.pos >= len(view):
+                    self.pos = 0
+                    self.loops += 1
+
+        return feed.bytes - start
+
+    def __repr__(self) -> str:
+        return f"Placeholder({self.path}, {len(self) / 1e6:.1f} MB, {self.loops} loops)"
@@ -3,7 +3,7 @@ import argparse
 import os
 import glob
 from itertools import cycle
-from .api import stream_file
+from .api import stream_file, stream_files
 
 def get_mp4_files(directory):
     """Validate and retrieve all MP4 files in the given directory."""
@@ -38,8 +38,26 @@ if __name__ == "__main__":
     )
     p.add_argument("json", help="JSON file with stream parameters such as key")
     p.add_argument("-t", "--timeout", help="Stop streaming after --timeout seconds", type=int)
+    p.add_argument(
+        "-gapless",
+        help="Play all files with one encoder, without reconnecting between files",
+        action="store_true",
+    )
     P = p.parse_args()
 
+    if P.gapless:
+        stream_files(
+            ini_file=P.json,
+            websites=P.websites,
+            video_path=P.indir,
+            glob="*.mp4",
+            assume_yes=True,
+            loop=True,
+            timeout=P.timeout,
+            gapless=True,
+        )
+        raise SystemExit
+
     try:
         # Get all MP4 files in the directory
         mp4_files = get_mp4_files(P.indir)
@@ -0,0 +1,360 @@
+"""
+download clips ahead of air time, so a slow or failing CDN never stalls the live stream
+
+Clips are downloaded in the background, in priority order (lowest first, then in the
+order added), up to "ahead" clips at a time and within a byte budget.
+A clip is only handed out by next_ready() once completely downloaded: it's written to
+a hidden ".part" file and renamed into place when its size checks out.
+After airing a clip, release() it to free its share of the budget for the next ones.
+
+With a clip cache (get_clip_cache()), downloads are kept after release, least recently
+aired evicted first, and a clip added again is ready at once without downloading.
+
+  P = Prefetcher(ahead=3, max_bytes=2_000_000_000, cache=get_clip_cache())
+  P.add(url, key=clip_key(url, task_id))
+  if clip := P.next_ready():
+      switcher.play(clip.path)
+      switcher.wait_queued()
+      P.release(clip)
+"""
+
+from __future__ import annotations
+import typing as T
+from pathlib import Path
+import functools
+import heapq
+import itertools
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from .cache import BlobCache, cache_dir, clip_key
+from .pipefeed import CHUNK
+from .supervise import backoff
+
+AHEAD = 3  # clips downloading or waiting to air
+MAX_BYTES = 2_000_000_000
+TIMEOUT = 30.0  # seconds without data from the server
+RETRIES = 3
+MAX_GB = 20  # clip cache
+
+__all__ = ["Clip", "Prefetcher", "get_clip_cache"]
+
+
+@functools.cache
+def get_clip_cache(max_gb: float = MAX_GB) -> BlobCache:
+    return BlobCache(cache_dir("clips"), int(max_gb * 1e9))
+
+
+def _suffix(url: str) -> str:
+    return Path(urllib.parse.urlparse(url).path).suffix or ".mp4"
+
+
+class NoRoom(Exception):
+    """
+    clip doesn't fit in the budget until other clips are released
+    """
+
+
+class Clip:
+    def __init__(self, url: str, key: str, priority: int, seq: int):
+        self.url = url
+        self.key = key
+        self.priority = priority
+        self.seq = seq
+
+        self.state = "queued"  # downloading, ready, failed, released
+        self.path: Path | None = None
+        self.size = 0  # bytes counted against the budget
+        self.expected: int | None = None  # Content-Length
+        self.seconds = 0.0  # download time
+        self.error: str | None = None
+        self.cached = False  # served from the clip cache
+
+    def __lt__(self, other: Clip) -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def __repr__(self) -> str:
+        return f"Clip({self.key}, {self.state}, {self.size} bytes)"
+
+
+class Prefetcher:
+    def __init__(
+        self,
+        root: Path | None = None,
+        *,
+        ahead: int = AHEAD,
+        max_bytes: int = MAX_BYTES,
+        workers: int = 2,
+        timeout: float = TIMEOUT,
+        retries: int = RETRIES,
+        cache: BlobCache | None = None,
+    ):
+        self._tmp = None
+        if root is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="pylivestream-")
+            root = Path(self._tmp.name)
+        self.root = Path(root).expanduser()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        self.ahead = ahead
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.retries = retries
+        self.cache = cache
+
+        self.used = 0  # bytes of clips downloading or ready
+        self.downloaded = 0
+        self.failed = 0
+        self.bytes = 0  # total downloaded
+        self.download_seconds = 0.0
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting: list[Clip] = []  # heap
+        self._ready: list[Clip] = []  # heap
+        self._clips: dict[str, Clip] = {}  # not yet released, by key
+        self._closed = False
+
+        self._workers = [
+            threading.Thread(target=self._work, daemon=True, name=f"prefetch-{i}")
+            for i in range(workers)
+        ]
+        for w in self._workers:
+            w.start()
+
+    def __enter__(self) -> Prefetcher:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def add(self, url: str, priority: int = 0, key: str | None = None) -> Clip:
+        """
+        queue url for download. A clip already queued under the same key is returned as is,
+        a clip in the cache is ready at once.
+        """
+
+        if key is None:
+            key = clip_key(url)
+
+        with self._cond:
+            if (clip := self._clips.get(key)) is not None:
+                return clip
+
+            clip = Clip(url, key, priority, next(self._seq))
+            self._clips[key] = clip
+
+            if self.cache is not None and (p := self.cache.get(key, _suffix(url))) is not None:
+                clip.path = p
+                clip.cached = True
+                clip.state = "ready"
+                heapq.heappush(self._ready, clip)
+            else:
+                heapq.heappush(self._waiting, clip)
+            self._cond.notify_all()
+
+        return clip
+
+    def next_ready(self, timeout: float = 0.0) -> Clip | None:
+        """
+        completely downloaded clip of highest priority,
+        waiting up to timeout seconds for one. None if there is none.
+        """
+
+        deadline = time.monotonic() + timeout
+
+        with self._cond:
+            while not self._ready:
+                if (left := deadline - time.monotonic()) <= 0 or self._closed:
+                    return None
+                self._cond.wait(left)
+
+            return heapq.heappop(self._ready)
+
+    def release(self, clip: Clip) -> None:
+        """
+        clip has aired: delete it, unless cached, freeing its bytes for other downloads
+        """
+
+        if clip.path is not None and self.cache is None:
+            clip.path.unlink(missing_ok=True)
+
+        with self._cond:
+            self._free(clip)
+            clip.state = "released"
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+        for w in self._workers:
+            w.join()
+
+        if self._tmp is not None:
+            self._tmp.cleanup()
+
+    def stats(self) -> dict[str, T.Any]:
+        with self._cond:
+            s = {
+                "waiting": len(self._waiting),
+                "downloading": sum(c.state == "downloading" for c in self._clips.values()),
+                "ready": len(self._ready),
+                "downloaded": self.downloaded,
+                "failed": self.failed,
+                "used_bytes": self.used,
+                "max_bytes": self.max_bytes,
+                "downloaded_bytes": self.bytes,
+                "mbytes_per_sec": (
+                    self.bytes / self.download_seconds / 1e6 if self.download_seconds else 0.0
+                ),
+            }
+
+        if self.cache is not None:
+            s |= {f"cache_{k}": v for k, v in self.cache.stats().items()}
+
+        return s
+
+    def _free(self, clip: Clip) -> None:
+        self.used -= clip.size
+        clip.size = 0
+        self._clips.pop(clip.key, None)
+
+    def _can_start(self) -> bool:
+        if not self._waiting:
+            return False
+
+        busy = sum(c.state in ("downloading", "ready") for c in self._clips.values())
+        if busy >= self.ahead:
+            return False
+
+        # strictly in priority order: a large clip waits for room rather than being overtaken
+        return self.used + (self._waiting[0].expected or 0) <= self.max_bytes
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed and not self._can_start():
+                    self._cond.wait()
+                if self._closed:
+                    return
+                clip = heapq.heappop(self._waiting)
+                clip.state = "downloading"
+
+            self._download(clip)
+
+    def _download(self, clip: Clip) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                self._fetch(clip)
+            except NoRoom:
+                with self._cond:
+                    clip.state = "queued"
+                    heapq.heappush(self._waiting, clip)
+                    self._cond.notify_all()
+                return
+            except urllib.error.HTTPError as e:
+                error = str(e)
+                if e.code < 500:
+                    # not there, retrying won't help
+                    break
+            except (OSError, ValueError) as e:
+                if self._closed:
+                    return
+                error = str(e)
+                if clip.expected is not None and clip.expected > self.max_bytes:
+                    break
+            else:
+                return
+
+            if attempt < self.retries:
+                delay = backoff(attempt)
+                logging.warning(f"{clip.url}: {error}, retrying in {delay:.1f} sec")
+                with self._cond:
+                    # close() cuts the wait short
+                    if self._cond.wait_for(lambda: self._closed, delay):
+                        return
+
+        logging.error(f"could not download {clip.url}: {error}")
+        with self._cond:
+            self._free(clip)
+            clip.state = "failed"
+            clip.error = error
+            self.failed += 1
+            self._cond.notify_all()
+
+    def _fetch(self, clip: Clip) -> None:
+        suffix = _suffix(clip.url)
+        if self.cache is not None:
+            part = self.cache.new_file(suffix)
+        else:
+            dest = self.root / f"{clip.key}{suffix}"
+            part = self.root / f".{clip.key}{suffix}.part"
+
+        tic = time.monotonic()
+        got = 0
+
+        try:
+            with urllib.request.urlopen(clip.url, timeout=self.timeout) as r:
+                if (n := r.headers.get("Content-Length")) is not None:
+                    self._reserve(clip, int(n))
+
+                with part.open("wb") as f:
+                    while data := r.read(CHUNK):
+                        if self._closed:
+                            raise InterruptedError("prefetcher closed")
+                        f.write(data)
+                        got += len(data)
+                        if clip.expected is None:
+                            # size unknown up front, count it as it arrives, may overshoot
+                            with self._cond:
+                                self.used += len(data)
+                                clip.size += len(data)
+
+            if clip.expected is not None and got != clip.expected:
+                raise ValueError(f"got {got} of {clip.expected} bytes")
+
+            if self.cache is not None:
+                with self._cond:
+                    # not yet aired
+                    keep = {c.path for c in self._clips.values() if c.path is not None}
+                dest = self.cache.put(clip.key, part, suffix, keep=keep)
+            else:
+                os.replace(part, dest)
+        except BaseException:
+            part.unlink(missing_ok=True)
+            with self._cond:
+                self.used -= clip.size
+                clip.size = 0
+            raise
+
+        with self._cond:
+            clip.path = dest
+            clip.seconds = time.monotonic() - tic
+            clip.state = "ready"
+            self.downloaded += 1
+            self.bytes += got
+            self.download_seconds += clip.seconds
+            heapq.heappush(self._ready, clip)
+            self._cond.notify_all()
+
+        logging.info(f"prefetched {clip.url}: {got / 1e6:.1f} MB in {clip.seconds:.1f} sec")
+
+    def _reserve(self, clip: Clip, n: int) -> None:
+        with self._cond:
+            clip.expected = n
+            if n > self.max_bytes:
+                raise ValueError(f"{n} bytes is larger than the whole budget {self.max_bytes}")
+
+            if self.used + n > self.max_bytes:
+                raise NoRoom
+
+            self.used += n
+            clip.size = n
@@ -0,0 +1,207 @@
+"""
+live encoder statistics from the running FFmpeg process
+
+FFmpeg writes blocks of key=value lines with -progress, each block ending with
+"progress=continue" (or "progress=end" when done). We send them to stderr alongside
+any error messages, so stdout stays free for piped output.
+
+https://ffmpeg.org/ffmpeg.html#Advanced-options
+"""
+
+from __future__ import annotations
+import typing as T
+import sys
+import threading
+import time
+
+PROGRESS = ["-progress", "pipe:2", "-nostats"]
+
+KEYS = {
+    "frame",
+    "fps",
+    "bitrate",
+    "total_size",
+    "out_time_us",
+    "out_time_ms",
+    "out_time",
+    "dup_frames",
+    "drop_frames",
+    "speed",
+    "progress",
+}
+# stream quality and similar vary by encoder e.g. "stream_0_0_q"
+KEYS_PREFIX = "stream_"
+
+
+class EncoderStats:
+    """
+    latest statistics reported by the encoder, updated from a background thread
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # these persist across encoder restarts
+        self.starts = 0
+        self.running = False
+        self.returncode: int | None = None
+        self.stalls = 0
+        self.downtime = 0.0  # seconds between encoder exit and restart
+        self.ended: float | None = None
+
+        self.reset()
+
+    def begin(self) -> None:
+        """
+        encoder process (re)started
+        """
+
+        self.reset()
+        with self._lock:
+            self.starts += 1
+            self.running = True
+            self.returncode = None
+            if self.ended is not None:
+                self.downtime += self.started - self.ended
+
+    def end(self, returncode: int | None) -> None:
+        with self._lock:
+            self.running = False
+            self.returncode = returncode
+            self.ended = time.monotonic()
+
+    def stalled(self) -> None:
+        with self._lock:
+            self.stalls += 1
+
+    def idle(self) -> float:
+        """
+        seconds since the encoder output last advanced
+        """
+
+        with self._lock:
+            return time.monotonic() - self.advanced
+
+    def reset(self) -> None:
+        with self._lock:
+            self.frame: int = 0
+            self.fps: float = 0.0
+            self.bitrate_kbps: float | None = None
+            self.total_size: int = 0
+            self.out_time: float = 0.0
+            self.speed: float | None = None
+            self.drop_frames: int = 0
+            self.dup_frames: int = 0
+            self.progress: str = ""
+            self.started: float = time.monotonic()
+            self.updated: float | None = None
+            self.advanced: float = self.started
+
+    def update(self, block: dict[str, str]) -> None:
+        """
+        apply one -progress block
+        """
+
+        with self._lock:
+            prev = (self.frame, self.total_size)
+            self.frame = _int(block.get("frame"), self.frame)
+            self.fps = _float(block.get("fps"), self.fps)
+            self.total_size = _int(block.get("total_size"), self.total_size)
+            self.drop_frames = _int(block.get("drop_frames"), self.drop_frames)
+            self.dup_frames = _int(block.get("dup_frames"), self.dup_frames)
+
+            if (us := block.get("out_time_us", block.get("out_time_ms"))) is not None:
+                # out_time_ms is actually microseconds, a long-standing FFmpeg quirk
+                self.out_time = _int(us, 0) / 1e6
+
+            # "2500.1kbits/s", or "N/A" at start
+            br = block.get("bitrate", "").removesuffix("kbits/s")
+            self.bitrate_kbps = _float(br, self.bitrate_kbps)
+            # "0.93x"
+            self.speed = _float(block.get("speed", "").removesuffix("x"), self.speed)
+
+            self.progress = block.get("progress", self.progress)
+            self.updated = time.monotonic()
+            # reports may continue with no new output, e.g. waiting on a dead input
+            if (self.frame, self.total_size) != prev:
+                self.advanced = self.updated
+
+    def snapshot(self) -> dict[str, T.Any]:
+        with self._lock:
+            return {
+                "frame": self.frame,
+                "fps": self.fps,
+                "bitrate_kbps": self.bitrate_kbps,
+                "total_size": self.total_size,
+                "out_time": self.out_time,
+                "speed": self.speed,
+                "drop_frames": self.drop_frames,
+                "dup_frames": self.dup_frames,
+                "progress": self.progress,
+                "uptime": time.monotonic() - self.started if self.running else 0.0,
+                "running": self.running,
+                "restarts": max(self.starts - 1, 0),
+                "returncode": self.returncode,
+                "stalls": self.stalls,
+                "downtime": self.downtime,
+            }
+
+    def __repr__(self) -> str:
+        s = self.snapshot()
+        return (
+            f"frame={s['frame']} fps={s['fps']} bitrate={s['bitrate_kbps']}kbits/s "
+            f"speed={s['speed']}x drop={s['drop_frames']} dup={s['dup_frames']}"
+        )
+
+
+class ProgressParser:
+    """
+    parse -progress output lines into EncoderStats,
+    passing through any other lines (errors, warnings) to our stderr.
+    """
+
+    def __init__(self, stats: EncoderStats, echo: T.TextIO | None = None):
+        self.stats = stats
+        self.echo = sys.stderr if echo is None else echo
+        self.block: dict[str, str] = {}
+
+    def line(self, raw: bytes) -> None:
+        line = raw.decode("utf-8", errors="replace").rstrip()
+
+        key, sep, value = line.partition("=")
+        if sep and (key in KEYS or key.startswith(KEYS_PREFIX)):
+            self.block[key] = value.strip()
+            if key == "progress":
+                self.stats.update(self.block)
+                self.block = {}
+        elif line:
+            print(line, file=self.echo)
+
+
+class ProgressReader(threading.Thread):
+    """
+    parse -progress output from an FFmpeg pipe in a background thread
+    """
+
+    def __init__(self, stream: T.IO[bytes], stats: EncoderStats, echo: T.TextIO | None = None):
+        super().__init__(daemon=True)
+
+        self.stream = stream
+        self.parser = ProgressParser(stats, echo)
+
+    def run(self) -> None:
+        for raw in iter(self.stream.readline, b""):
+            self.parser.line(raw)
+
+
+def _int(v: str | None, default: T.Any) -> T.Any:
+    try:
+        return int(v)  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        return default
+
+
+def _float(v: str | None, default: T.Any) -> T.Any:
+    try:
+        return float(v)  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        return default
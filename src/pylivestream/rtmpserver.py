@@ -0,0 +1,615 @@
+"""
+minimal RTMP ingest server, in pure Python asyncio
+
+Accepts publishes (e.g. from FFmpeg, OBS), parses the FLV tags,
+and records per-connection throughput, keyframe interval (GOP) and timestamp statistics.
+Streams are written to FLV files, or discarded.
+Use as a headless local sink for tests and load tests, with no display and no nginx:
+
+python -m pylivestream.rtmpserver -record ~/recordings
+
+then stream to rtmp://localhost/live/<key>
+
+Streams being published can be played from the same URL, e.g. by ffplay.
+Players get the metadata and sequence headers first, then video from the next keyframe.
+A player that falls behind by more than MAX_BACKLOG bytes skips to a later keyframe.
+
+https://rtmp.veriskope.com/docs/spec/
+"""
+
+from __future__ import annotations
+import typing as T
+from pathlib import Path
+import argparse
+import asyncio
+import logging
+import os
+import re
+import struct
+import threading
+import time
+
+from . import flv
+
+PORT = 1935
+HANDSHAKE_SIZE = 1536
+CHUNK_SIZE = 4096  # our outgoing chunk size
+WINDOW = 2500000  # acknowledgement window, bytes
+
+# message types
+SET_CHUNK_SIZE = 1
+ABORT = 2
+ACK = 3
+USER_CONTROL = 4
+WINDOW_ACK_SIZE = 5
+SET_PEER_BANDWIDTH = 6
+AUDIO = flv.AUDIO
+VIDEO = flv.VIDEO
+DATA_AMF3 = 15
+COMMAND_AMF3 = 17
+DATA_AMF0 = flv.SCRIPT
+COMMAND_AMF0 = 20
+
+STREAM_ID = 1  # the single message stream ID we hand out
+MAX_BACKLOG = 4 << 20  # bytes unsent to a player before it skips ahead
+
+# chunk stream IDs of messages to players
+CHUNK_STREAMS = {DATA_AMF0: 4, AUDIO: 5, VIDEO: 6}
+
+
+class PublishStats:
+    """
+    statistics of one publishing connection
+    """
+
+    def __init__(self, peer: str):
+        self.peer = peer
+        self.app = ""
+        self.name = ""
+        self.started = time.monotonic()
+        self.ended: float | None = None
+
+        self.bytes = 0
+        self.meta: dict[str, T.Any] = {}
+        self.tags = {AUDIO: 0, VIDEO: 0}
+        self.media_bytes = {AUDIO: 0, VIDEO: 0}
+        self.keyframes = 0
+        self.gops: list[int] = []  # milliseconds between keyframes
+        self.first_ts: int | None = None
+        self.last_ts: dict[int, int] = {}
+        self.backwards = 0  # timestamps going back in time, per track
+        self.max_gap = 0  # largest forward timestamp jump, milliseconds
+
+        self._last_key: int | None = None
+
+    def tag(self, tag_type: int, timestamp: int, data: bytes) -> None:
+        self.tags[tag_type] += 1
+        self.media_bytes[tag_type] += len(data)
+
+        if self.first_ts is None:
+            self.first_ts = timestamp
+
+        if (prev := self.last_ts.get(tag_type)) is not None:
+            if timestamp < prev:
+                self.backwards += 1
+            else:
+                self.max_gap = max(self.max_gap, timestamp - prev)
+        self.last_ts[tag_type] = timestamp
+
+        if flv.is_keyframe(tag_type, data) and not flv.is_sequence_header(tag_type, data):
+            self.keyframes += 1
+            if self._last_key is not None:
+                self.gops.append(timestamp - self._last_key)
+            self._last_key = timestamp
+
+    def snapshot(self) -> dict[str, T.Any]:
+        wall = (self.ended or time.monotonic()) - self.started
+        media = 0.0
+        if self.first_ts is not None and self.last_ts:
+            media = (max(self.last_ts.values()) - self.first_ts) / 1000
+
+        return {
+            "peer": self.peer,
+            "app": self.app,
+            "name": self.name,
+            "duration": wall,
+            "bytes": self.bytes,
+            "kbps": self.bytes * 8 / wall / 1000 if wall > 0 else 0.0,
+            "media_duration": media,
+            "video_tags": self.tags[VIDEO],
+            "audio_tags": self.tags[AUDIO],
+            "video_kbps": self.media_bytes[VIDEO] * 8 / media / 1000 if media > 0 else 0.0,
+            "audio_kbps": self.media_bytes[AUDIO] * 8 / media / 1000 if media > 0 else 0.0,
+            "fps": self.tags[VIDEO] / media if media > 0 else 0.0,
+            "keyframes": self.keyframes,
+            "gop_min": min(self.gops) / 1000 if self.gops else None,
+            "gop_max": max(self.gops) / 1000 if self.gops else None,
+            "gop_mean": sum(self.gops) / len(self.gops) / 1000 if self.gops else None,
+            "timestamps_backwards": self.backwards,
+            "max_timestamp_gap": self.max_gap / 1000,
+            "width": self.meta.get("width"),
+            "height": self.meta.get("height"),
+        }
+
+    def __repr__(self) -> str:
+        s = self.snapshot()
+        gop = f"{s['gop_mean']:.2f}" if s["gop_mean"] is not None else "?"
+        return (
+            f"{s['app']}/{s['name']} from {s['peer']}: {s['duration']:.1f} sec "
+            f"{s['kbps']:.0f} kbps, {s['fps']:.1f} fps, GOP {gop} sec, "
+            f"{s['timestamps_backwards']} timestamps backwards"
+        )
+
+
+class _ChunkStream:
+    def __init__(self) -> None:
+        self.timestamp = 0
+        self.ts_field = 0
+        self.extended = False
+        self.length = 0
+        self.type = 0
+        self.stream_id = 0
+        self.buf = bytearray()
+        self.remaining = 0
+
+
+class Connection:
+    """
+    one client connection: handshake, chunk stream, commands and media
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        record_dir: Path | None,
+        server: RTMPServer | None = None,
+    ):
+        self.reader = reader
+        self.writer = writer
+        self.record_dir = record_dir
+        self.server = server
+
+        peer = writer.get_extra_info("peername")
+        self.stats = PublishStats(f"{peer[0]}:{peer[1]}" if peer else "?")
+
+        self.in_chunk_size = 128
+        self.out_chunk_size = 128
+        self.window = WINDOW
+        self.acked = 0
+        self.chunks: dict[int, _ChunkStream] = {}
+        self.record: T.BinaryIO | None = None
+        self.closed = False
+
+        self.key = ""  # app/name published or played
+        # publishing: latest metadata and sequence headers, for players joining later
+        self.headers: dict[int, bytes] = {}
+        # playing: video waits for a keyframe
+        self.need_keyframe = True
+
+    async def read(self, n: int) -> bytes:
+        b = await self.reader.readexactly(n)
+        self.stats.bytes += n
+        return b
+
+    async def handshake(self) -> None:
+        c01 = await self.read(1 + HANDSHAKE_SIZE)
+        if c01[0] != 3:
+            raise ConnectionError(f"unsupported RTMP version {c01[0]}")
+
+        # zero version bytes in S1 means no digest is expected by the client
+        s1 = struct.pack(">I", int(time.monotonic() * 1000) & 0xFFFFFFFF) + bytes(4)
+        s1 += os.urandom(HANDSHAKE_SIZE - 8)
+        self.writer.write(b"\x03" + s1 + c01[1:])
+        await self.writer.drain()
+
+        await self.read(HANDSHAKE_SIZE)  # C2
+
+    async def read_message(self) -> tuple[int, int, int, bytes]:
+        """
+        reassemble chunks into the next complete message
+
+        Returns
+        -------
+        type, message stream ID, timestamp (milliseconds), body
+        """
+
+        while True:
+            b = (await self.read(1))[0]
+            fmt = b >> 6
+            csid = b & 0x3F
+            if csid == 0:
+                csid = 64 + (await self.read(1))[0]
+            elif csid == 1:
+                x = await self.read(2)
+                csid = 64 + x[0] + x[1] * 256
+
+            cs = self.chunks.setdefault(csid, _ChunkStream())
+            new = cs.remaining == 0
+
+            if fmt < 3:
+                h = await self.read((11, 7, 3)[fmt])
+                cs.ts_field = int.from_bytes(h[:3], "big")
+                if fmt < 2:
+                    cs.length = int.from_bytes(h[3:6], "big")
+                    cs.type = h[6]
+                if fmt == 0:
+                    cs.stream_id = int.from_bytes(h[7:11], "little")
+                cs.extended = cs.ts_field == 0xFFFFFF
+
+            if cs.extended:
+                ext = int.from_bytes(await self.read(4), "big")
+                if fmt < 3:
+                    cs.ts_field = ext
+
+            if new:
+                if fmt == 0:
+                    cs.timestamp = cs.ts_field
+                else:
+                    cs.timestamp += cs.ts_field
+                cs.timestamp &= 0xFFFFFFFF
+                cs.buf = bytearray()
+                cs.remaining = cs.length
+
+            n = min(self.in_chunk_size, cs.remaining)
+            cs.buf += await self.read(n)
+            cs.remaining -= n
+
+            if self.stats.bytes - self.acked >= self.window:
+                self.acked = self.stats.bytes
+                self.send(2, ACK, 0, struct.pack(">I", self.acked & 0xFFFFFFFF))
+
+            if cs.remaining == 0:
+                return cs.type, cs.stream_id, cs.timestamp, bytes(cs.buf)
+
+    def send(self, csid: int, msg_type: int, stream_id: int, body: bytes, timestamp: int = 0):
+        """
+        write one message as chunks: full header for the first, one byte for the rest
+        """
+
+        ts = min(timestamp, 0xFFFFFF)
+        header = (
+            bytes([csid])
+            + ts.to_bytes(3, "big")
+            + len(body).to_bytes(3, "big")
+            + bytes([msg_type])
+            + stream_id.to_bytes(4, "little")
+        )
+        ext = timestamp.to_bytes(4, "big") if ts == 0xFFFFFF else b""
+
+        out = bytearray(header + ext)
+        for i in range(0, len(body), self.out_chunk_size):
+            if i:
+                out += bytes([0xC0 | csid]) + ext
+            end = i + self.out_chunk_size
+            out += body[i:end]
+
+        self.writer.write(out)
+
+    def command(self, stream_id: int, *values: T.Any) -> None:
+        self.send(3, COMMAND_AMF0, stream_id, b"".join(flv.amf0_encode(v) for v in values))
+
+    async def serve(self) -> None:
+        await self.handshake()
+
+        while not self.closed:
+            msg_type, stream_id, timestamp, body = await self.read_message()
+
+            if msg_type == SET_CHUNK_SIZE:
+                self.in_chunk_size = struct.unpack(">I", body[:4])[0] & 0x7FFFFFFF
+            elif msg_type == WINDOW_ACK_SIZE:
+                self.window = struct.unpack(">I", body[:4])[0]
+            elif msg_type == ABORT:
+                self.chunks.pop(struct.unpack(">I", body[:4])[0], None)
+            elif msg_type in (COMMAND_AMF0, COMMAND_AMF3):
+                if msg_type == COMMAND_AMF3:
+                    body = body[1:]
+                self.on_command(flv.amf0_decode_all(body))
+            elif msg_type in (DATA_AMF0, DATA_AMF3):
+                if msg_type == DATA_AMF3:
+                    body = body[1:]
+                self.on_data(timestamp, body)
+            elif msg_type in (AUDIO, VIDEO):
+                self.stats.tag(msg_type, timestamp, body)
+                if flv.is_sequence_header(msg_type, body):
+                    self.headers[msg_type] = body
+                if self.record:
+                    self.record.write(flv.tag_bytes(msg_type, timestamp, body))
+                self.forward(msg_type, timestamp, body)
+
+            await self.writer.drain()
+
+    def on_command(self, cmd: list[T.Any]) -> None:
+        name = cmd[0]
+        txid = cmd[1] if len(cmd) > 1 else 0
+
+        if name == "connect":
+            props = cmd[2] if len(cmd) > 2 and isinstance(cmd[2], dict) else {}
+            self.stats.app = str(props.get("app", ""))
+
+            self.send(2, WINDOW_ACK_SIZE, 0, struct.pack(">I", WINDOW))
+            self.send(2, SET_PEER_BANDWIDTH, 0, struct.pack(">IB", WINDOW, 2))
+            self.send(2, SET_CHUNK_SIZE, 0, struct.pack(">I", CHUNK_SIZE))
+            self.out_chunk_size = CHUNK_SIZE
+            self.command(
+                0,
+                "_result",
+                txid,
+                {"fmsVer": "FMS/3,0,1,123", "capabilities": 31.0},
+                {
+                    "level": "status",
+                    "code": "NetConnection.Connect.Success",
+                    "description": "Connection succeeded.",
+                    "objectEncoding": 0.0,
+                },
+            )
+        elif name == "createStream":
+            self.command(0, "_result", txid, None, float(STREAM_ID))
+        elif name == "publish":
+            self.stats.name = str(cmd[3]) if len(cmd) > 3 else ""
+            self.key = f"{self.stats.app}/{self.stats.name}"
+            if self.server is not None:
+                self.server.publishers[self.key] = self
+            self.open_record()
+            logging.info(f"publish {self.stats.app}/{self.stats.name} from {self.stats.peer}")
+            self.command(
+                STREAM_ID,
+                "onStatus",
+                0,
+                None,
+                {
+                    "level": "status",
+                    "code": "NetStream.Publish.Start",
+                    "description": f"{self.stats.name} is now published.",
+                },
+            )
+        elif name == "play":
+            self.key = f"{self.stats.app}/{cmd[3] if len(cmd) > 3 else ''}"
+            logging.info(f"play {self.key} to {self.stats.peer}")
+            # StreamBegin
+            self.send(2, USER_CONTROL, 0, struct.pack(">HI", 0, STREAM_ID))
+            self.command(
+                STREAM_ID,
+                "onStatus",
+                0,
+                None,
+                {
+                    "level": "status",
+                    "code": "NetStream.Play.Start",
+                    "description": f"playing {self.key}",
+                },
+            )
+            if self.server is not None:
+                self.server.subscribe(self)
+        elif name in ("FCUnpublish", "deleteStream", "closeStream"):
+            # the client disconnects after these
+            self.close_record()
+        elif txid:
+            # releaseStream, FCPublish, ...
+            self.command(0, "_result", txid, None, None)
+
+    def on_data(self, timestamp: int, body: bytes) -> None:
+        """
+        "@setDataFrame" "onMetaData" {...}: stream metadata, stored as "onMetaData" {...}
+        """
+
+        values = flv.amf0_decode_all(body)
+        if values and values[0] == "@setDataFrame":
+            values = values[1:]
+        if len(values) >= 2 and values[0] == "onMetaData" and isinstance(values[1], dict):
+            self.stats.meta = values[1]
+
+        data = b"".join(flv.amf0_encode(v) for v in values)
+        self.headers[DATA_AMF0] = data
+        if self.record:
+            self.record.write(flv.tag_bytes(flv.SCRIPT, timestamp, data))
+        self.forward(DATA_AMF0, timestamp, data)
+
+    def forward(self, msg_type: int, timestamp: int, body: bytes) -> None:
+        """
+        publishing: pass a message on to the players of this stream
+        """
+
+        if self.server is None:
+            return
+
+        for p in list(self.server.players.get(self.key, ())):
+            p.play(msg_type, timestamp, body)
+
+    def play(self, msg_type: int, timestamp: int, body: bytes) -> None:
+        """
+        playing: send a message of the published stream, without waiting for this client
+        """
+
+        if self.writer.is_closing():
+            return
+
+        if msg_type != DATA_AMF0 and not flv.is_sequence_header(msg_type, body):
+            if self.writer.transport.get_write_buffer_size() > MAX_BACKLOG:
+                if not self.need_keyframe:
+                    logging.warning(f"{self.stats.peer} fell behind, skipping to next keyframe")
+                self.need_keyframe = True
+                return
+            if msg_type == VIDEO and self.need_keyframe:
+                if not flv.is_keyframe(msg_type, body):
+                    return
+                self.need_keyframe = False
+
+        self.send(CHUNK_STREAMS[msg_type], msg_type, STREAM_ID, body, timestamp)
+
+    def open_record(self) -> None:
+        if not self.record_dir:
+            return
+
+        safe = re.sub(r"[^\w.-]", "_", f"{self.stats.app}_{self.stats.name}") or "stream"
+        fn = Path(self.record_dir).expanduser() / f"{safe}_{time.strftime('%Y%m%d-%H%M%S')}.flv"
+        fn.parent.mkdir(parents=True, exist_ok=True)
+
+        self.record = fn.open("wb")
+        self.record.write(flv.file_header())
+        logging.info(f"recording to {fn}")
+
+    def close_record(self) -> None:
+        if self.record:
+            self.record.close()
+            self.record = None
+
+    def close(self) -> None:
+        self.stats.ended = time.monotonic()
+        self.close_record()
+
+
+class RTMPServer:
+    """
+    asyncio RTMP server accepting publishes. Statistics of each connection are kept
+    in .connections
+    """
+
+    def __init__(self, host: str = "localhost", port: int = PORT, record_dir: Path | None = None):
+        self.host = host
+        self.port = port
+        self.record_dir = record_dir
+
+        self.connections: list[PublishStats] = []
+        self.server: asyncio.AbstractServer | None = None
+        # app/name: connection publishing it, and those playing it
+        self.publishers: dict[str, Connection] = {}
+        self.players: dict[str, set[Connection]] = {}
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        if self.port == 0:
+            self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        if self.server is None:
+            await self.start()
+        assert self.server is not None
+        async with self.server:
+            await self.server.serve_forever()
+
+    def subscribe(self, conn: Connection) -> None:
+        """
+        add a player, which starts with the headers of the stream if already published
+        """
+
+        self.players.setdefault(conn.key, set()).add(conn)
+
+        if (pub := self.publishers.get(conn.key)) is not None:
+            for msg_type in (DATA_AMF0, VIDEO, AUDIO):
+                if (body := pub.headers.get(msg_type)) is not None:
+                    conn.play(msg_type, 0, body)
+
+    def unsubscribe(self, conn: Connection) -> None:
+        if self.publishers.get(conn.key) is conn:
+            del self.publishers[conn.key]
+        self.players.get(conn.key, set()).discard(conn)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        conn = Connection(reader, writer, self.record_dir, self)
+        self.connections.append(conn.stats)
+        try:
+            await conn.serve()
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            logging.debug(f"{conn.stats.peer}: {e}")
+        except asyncio.CancelledError:
+            pass  # server stopping
+        except Exception as e:
+            logging.error(f"{conn.stats.peer}: {e}")
+        finally:
+            self.unsubscribe(conn)
+            conn.close()
+            writer.close()
+            if conn.stats.name:
+                print(conn.stats)
+
+    def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+
+
+class ServerThread(threading.Thread):
+    """
+    run RTMPServer in a background thread.
+    Like subprocess.Popen, has poll() and terminate(), to stand in for an external listener.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = PORT, record_dir: Path | None = None):
+        super().__init__(daemon=True, name="rtmpserver")
+
+        self.server = RTMPServer(host, port, record_dir)
+        self.ready = threading.Event()
+        self.error: BaseException | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self.server.start())
+        except OSError as e:
+            self.error = e
+            self.ready.set()
+            return
+
+        self.ready.set()
+        try:
+            self._loop.run_until_complete(self.server.serve_forever())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def start_ready(self, timeout: float = 5.0) -> ServerThread:
+        """
+        start, returning once the server is accepting connections
+        """
+
+        self.start()
+        if not self.ready.wait(timeout):
+            raise TimeoutError("RTMP server did not start")
+        if self.error:
+            raise self.error
+
+        return self
+
+    def poll(self) -> int | None:
+        return None if self.is_alive() else 0
+
+    def terminate(self) -> None:
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._shutdown)
+
+    def _shutdown(self) -> None:
+        self.server.close()
+        for task in asyncio.all_tasks():
+            task.cancel()
+
+    def wait(self, timeout: float | None = None) -> int:
+        self.join(timeout)
+        return 0
+
+
+def cli():
+    p = argparse.ArgumentParser(
+        description="RTMP server, recording or discarding streams, and playing them to clients"
+    )
+    p.add_argument("-host", help="address to listen on", default="localhost")
+    p.add_argument("-port", help="port to listen on", type=int, default=PORT)
+    p.add_argument("-record", help="directory to write FLV recordings to, else discard")
+    p.add_argument("-v", "--verbose", action="store_true")
+    P = p.parse_args()
+
+    if P.verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    server = RTMPServer(P.host, P.port, Path(P.record) if P.record else None)
+    print(f"RTMP server on rtmp://{P.host}:{P.port}/live/<key>  Ctrl+C to stop")
+
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,22 +1,19 @@
 import subprocess
 import sys
 import time
-import os
-import signal
+
+from pylivestream.rtmpserver import ServerThread
 
 # Paths to your files/executables
-NGINX_EXE = r"C:/nginx/nginx.exe"  # or just 'nginx' if on Linux and in $PATH
-NGINX_CONF = "C:/nginx/conf/nginx.conf"
 PLACEHOLDER_MP4 = r"C:/git/PyLivestream/videos/whitenoise.mp4"
 
-def start_nginx(conf_path):
+def start_server(record_dir=None):
     """
-    Start Nginx with the given config file.
-    Returns the subprocess.Popen handle.
+    Start the builtin RTMP server (no nginx needed), returning once it accepts connections.
+    Returns the ServerThread handle.
     """
-    cmd = [NGINX_EXE, "-c", conf_path]
-    print(f"Starting Nginx with command: {' '.join(cmd)}")
-    return subprocess.Popen(cmd)
+    print("Starting builtin RTMP server")
+    return ServerThread(record_dir=record_dir).start_ready()
 
 def start_placeholder_stream(mp4_file, rtmp_url):
     """
@@ -42,10 +39,8 @@ def start_placeholder_stream(mp4_file, rtmp_url):
     return subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
 
 def main():
-    # 1. Launch Nginx-RTMP
-    nginx_proc = start_nginx(NGINX_CONF)
-    # Give Nginx a moment to start
-    time.sleep(2)
+    # 1. Launch RTMP server
+    server = start_server(sys.argv[1] if len(sys.argv) > 1 else None)
     
     # 2. Launch placeholder
     placeholder_url = "rtmp://localhost/live/placeholder"
@@ -53,6 +48,7 @@ def main():
     
     print("Local RTMP server is running on rtmp://localhost/live/<yourkey>")
     print("Placeholder is streaming on rtmp://localhost/live/placeholder.")
+    print("Watch it with: ffplay rtmp://localhost/live/placeholder")
     print("Press Ctrl+C to stop everything.")
     
     try:
@@ -66,15 +62,8 @@ def main():
     placeholder_proc.terminate()
     placeholder_proc.wait()
     
-    # Gracefully stop Nginx
-    if os.name == 'nt':
-        # On Windows, we might need to kill the process or use taskkill
-        nginx_proc.terminate()
-    else:
-        # On Linux/Mac, we can send TERM signal
-        os.kill(nginx_proc.pid, signal.SIGTERM)
-    
-    nginx_proc.wait()
+    server.terminate()
+    server.wait()
     print("All processes stopped.")
 
 if __name__ == "__main__":
@@ -1,13 +1,16 @@
 from __future__ import annotations
+import typing as T
 import bisect
 from pathlib import Path
 import logging
 import os
 import sys
 import json
+import subprocess
 
 from . import utils
-from .ffmpeg import Ffmpeg, get_exe
+from .cpu import CpuPolicy
+from .ffmpeg import Ffmpeg, get_exe, get_meta
 
 # %%  Col0: vertical pixels (height). Col1: video kbps. Interpolates.
 # NOTE: Python >= 3.6 has guaranteed dict() order.
@@ -34,6 +37,8 @@ class Stream:
         self.inifn: Path = Path(inifn).expanduser().resolve(strict=True)
 
         self.site: str = site
+        # name of this stream in metrics, if several stream to the same site
+        self.channel: str = kwargs.get("channel") or ""
         self.vidsource = kwargs.get("vidsource")
 
         self.image = Path(kwargs["image"]).expanduser() if kwargs.get("image") else None
@@ -41,6 +46,12 @@ class Stream:
         self.loop: bool = kwargs.get("loop", False)
 
         self.infn = Path(kwargs["infn"]).expanduser() if kwargs.get("infn") else None
+        # FFmpeg concat list played gaplessly by one encoder, see fglob.write_concat()
+        self.playlist = Path(kwargs["playlist"]).expanduser() if kwargs.get("playlist") else None
+        # FFprobe JSON of infn, if already probed e.g. by fglob.probe_files()
+        self.meta: dict[str, T.Any] | None = kwargs.get("meta")
+        # likewise for image
+        self.image_meta: dict[str, T.Any] | None = kwargs.get("image_meta")
         self.yes: list[str] = self.F.YES if kwargs.get("yes") else []
 
         self.queue: list[str] = []  # self.F.QUEUE
@@ -85,11 +96,11 @@ class Stream:
             self.origin: list[str] = C.get("screencap_origin", [1, 1])
             self.movingimage = self.staticimage = False
         elif self.image:  # audio-only stream + background image
-            self.res = utils.get_resolution(self.image, self.probeexe)
-            self.fps = utils.get_framerate(self.infn, self.probeexe)
+            self.res = utils.get_resolution(self.image, self.probeexe, self.image_meta)
+            self.fps = utils.get_framerate(self.infn, self.probeexe, self.meta)
         elif self.vidsource == "file":  # streaming video from a file
-            self.res = utils.get_resolution(self.infn, self.probeexe)
-            self.fps = utils.get_framerate(self.infn, self.probeexe)
+            self.res = utils.get_resolution(self.infn, self.probeexe, self.meta)
+            self.fps = utils.get_framerate(self.infn, self.probeexe, self.meta)
         else:  # audio-only
             self.res = []
             self.fps = None
@@ -100,6 +111,36 @@ class Stream:
         self.audio_rate: str = C.get("audio_rate")
         self.preset: str = C.get("preset")
 
+        # multiple sites: one encoder per distinct site profile, instead of one shared encode
+        self.encode_ladder: bool = C.get("encode_ladder", False)
+        # multiple sites: fan out from one encoder through a queue per site
+        self.isolated_sinks: bool = C.get("isolated_sinks", False)
+        self.sink_max_lag: float = C.get("sink_max_lag", 10.0)
+        # send files already suitable for the site without re-encoding
+        self.stream_copy: bool = C.get("stream_copy", False)
+        self.copy_video = self.copy_audio = False
+
+        # "localhost" site: "ffplay" to watch, "builtin" for the headless RTMP server
+        self.listener: str = C.get("listener", "ffplay")
+        self.listener_record: str | None = C.get("listener_record")
+
+        # encoder and filter threads, default FFmpeg automatic
+        self.threads: int | None = C.get("threads")
+        self.filter_threads: int | None = C.get("filter_threads")
+        # cores and priority of the encoder process, see cpu.py
+        self.cpu = CpuPolicy(C.get("cpu_affinity"), C.get("nice"), C.get("ionice"))
+
+        # restart the encoder on failure or stalled output, see supervise.py
+        self.supervise: bool = C.get("supervise", False)
+        self.stall_timeout: float = C.get("stall_timeout", 30.0)
+        self.restart_max_delay: float = C.get("restart_max_delay", 60.0)
+        self.max_restarts: int | None = C.get("max_restarts")
+
+        self.channel = self.channel or C.get("channel") or self.site
+        self.metrics_port: int | None = C.get("metrics_port")
+        self.metrics_file: str | None = C.get("metrics_file")
+        self.metrics_interval: float | None = C.get("metrics_interval")
+
         if not self.timelimit:
             self.timelimit = self.F.timelimit(sitecfg.get("timelimit"))
 
@@ -125,6 +166,39 @@ class Stream:
         self.url: str = sitecfg.get("url")
         self.streamid: str = sitecfg.get("streamid", "")
 
+    def plan_copy(self) -> None:
+        """
+        decide if input file is copied rather than re-encoded, after video_bitrate()
+        """
+
+        self.copy_video = self.copy_audio = False
+
+        if not self.stream_copy or self.vidsource != "file" or not self.infn:
+            return
+        # these need FFmpeg filters
+        if self.image or self.caption or self.playlist:
+            return
+
+        from . import streamcopy
+
+        meta = self.meta
+        if meta is None:
+            try:
+                meta = get_meta(self.infn, self.probeexe)
+            except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                logging.warning(f"re-encoding {self.infn}, could not probe: {e}")
+                return
+
+        self.copy_video, self.copy_audio = streamcopy.plan(
+            self.infn,
+            meta,
+            kbps=self.video_kbps,
+            gop_sec=self.keyframe_sec,
+            audio_rate=int(self.audio_rate) if self.audio_rate else None,
+            audio_bps=int(self.audio_bps) if self.audio_bps else None,
+            exe=self.probeexe,
+        )
+
     def videoIn(self, quick: bool = False) -> list[str]:
         """
         config video input
@@ -165,8 +239,17 @@ class Stream:
         if self.res is None:  # audio-only, no image or video
             return []
 
+        if self.copy_video:
+            return ["-codec:v", "copy"]
+
         fps = self.fps if self.fps is not None else FPS
 
+        if self.preset == "auto":
+            from .calibrate import choose_preset
+
+            height = int(self.res[1]) if self.res else None
+            self.preset = choose_preset(self.video_codec, height, fps, self.exe)
+
         v += ["-preset", self.preset, "-b:v", str(self.video_kbps) + "k"]
 
         if self.image:
@@ -212,6 +295,9 @@ class Stream:
         https://www.facebook.com/facebookmedia/get-started/live
         """
 
+        if self.copy_audio:
+            return ["-codec:a", "copy"]
+
         o = []
 
         if self.audio_codec:
@@ -337,21 +423,58 @@ Try setting video_kpbs in pylivestream.json file (see README.md)
             v.extend(["-f", "image2", "-i", str(self.image)])
         elif self.movingimage:
             v.extend(self.F.movingBG(self.image))
-        elif self.loop and not self.image:  # loop for traditional video
+        elif self.loop and not self.image and not self.playlist:  # loop for traditional video
             if not quick:
                 v.extend(["-stream_loop", "-1"])  # FFmpeg >= 3
         # %% audio (for image+audio) or video
-        if self.infn:
+        if self.playlist:
+            if self.loop and not quick:
+                v.extend(["-stream_loop", "-1"])
+            # -safe 0 allows absolute paths
+            v.extend(["-f", "concat", "-safe", "0", "-i", str(self.playlist)])
+        elif self.infn:
             v.extend(["-i", str(self.infn)])
 
         return v
 
+    def conform(self) -> list[str]:
+        """
+        scale, pad and retime each playlist item to the stream resolution and frame rate
+        (those of the first item), so the encoder output doesn't change between items.
+        """
+
+        if not self.playlist or self.image or not self.res:
+            return []
+
+        w, h = self.res
+        fps = self.fps if self.fps is not None else FPS
+
+        return [
+            "-vf",
+            f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+            f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps}",
+        ]
+
+    def filter_threading(self) -> list[str]:
+        """
+        global options limiting threads of the filter graph
+        """
+
+        if not self.filter_threads:
+            return []
+
+        n = str(self.filter_threads)
+
+        return ["-filter_threads", n, "-filter_complex_threads", n]
+
     def buffer(self) -> list[str]:
         """configure network buffer. Tradeoff: latency vs. robustness"""
-        # constrain to single thread, default is multi-thread
-        # buf = ['-threads', '1']
-
-        buf = ["-maxrate", f"{self.video_kbps}k", "-bufsize", f"{self.video_kbps//2}k"]
+        buf = []
+        if self.threads and not self.copy_video:
+            # default is one thread per core or more, too many with several encoders per host
+            buf += ["-threads", str(self.threads)]
+        if not self.copy_video:
+            buf += ["-maxrate", f"{self.video_kbps}k", "-bufsize", f"{self.video_kbps//2}k"]
 
         if self.staticimage:  # static image + audio
             buf += ["-shortest"]
@@ -360,7 +483,4 @@ Try setting video_kpbs in pylivestream.json file (see README.md)
         # still OK for current FFmpeg versions too
         buf += ["-strict", "experimental"]
 
-        # must manually specify container format when streaming to web.
-        buf += ["-f", "flv"]
-
         return buf
@@ -6,8 +6,12 @@ from dotenv import load_dotenv
 from flask import Flask, request, jsonify
 import threading
 import time
-import requests
-from vidgen.VidgenUtils import VideoGeneration, submit_video_idea, get_placeholder_bytes, get_ready_videos
+from vidgen.VidgenUtils import VideoGeneration, submit_video_idea, get_ready_videos
+from pylivestream.ingest import Ingest
+from pylivestream.placeholder import Placeholder
+from pylivestream.cache import clip_key
+from pylivestream.prefetch import Prefetcher, get_clip_cache
+from pylivestream.switcher import Switcher
 from typing import List, Optional
 
 load_dotenv('../../.env')
@@ -35,22 +39,49 @@ def get_next_generated_file(ready_queue: List[VideoGeneration]) -> str | None:
         top_vid = idea_queue.pop()
         return top_vid.url
 
-def stream_from_url(url, ffmpeg_process):
+def stream_from_url(url, ingest: Ingest):
     """
-    Stream bytes from a URL to the ffmpeg process.
+    Stream a video from a URL to the ffmpeg process, remuxed to MPEG-TS.
     :param url: The URL of the video to stream.
-    :param ffmpeg_process: The ffmpeg process to write bytes to.
+    :param ingest: Ingest writing to the ffmpeg process stdin.
     """
     print("stream from url")
     try:
-        with requests.get(url, stream=True) as response:
-            response.raise_for_status()
-            for chunk in response.iter_content(chunk_size=4096):
-                if chunk:  # Only write non-empty chunks
-                    ffmpeg_process.stdin.write(chunk)
+        ingest.clip(url)
+        print(ingest)
     except Exception as e:
         print(f"Error streaming from URL: {e}")
 
+def prefetch_ready_videos(ready_queue: List[VideoGeneration], prefetcher: Prefetcher):
+    """
+    Start downloading ready videos to local disk ahead of air time,
+    so a slow CDN never stalls the encoder. Clips already in the cache are ready at once.
+    :param ready_queue: Videos with a URL, removed from the queue once added.
+    :param prefetcher: Prefetcher downloading in the background within its byte budget.
+    """
+    while ready_queue:
+        vid = ready_queue.pop(0)
+        if vid.url is None:
+            print(f"No URL for {vid}, skipping")
+            continue
+        prefetcher.add(vid.url, key=clip_key(vid.url, vid.task_id))
+
+def air_next_prefetched(prefetcher: Prefetcher, switcher: Switcher, timeout: float = 0.0) -> bool:
+    """
+    Air the next completely downloaded clip, if any, then delete it.
+    :return: True if a clip aired.
+    """
+    clip = prefetcher.next_ready(timeout)
+    if clip is None:
+        return False
+    assert clip.path is not None  # set once ready
+    try:
+        switcher.play(clip.path)
+        switcher.wait_queued()
+    finally:
+        prefetcher.release(clip)
+    return True
+
 def stream_placeholder2(placeholder_bytes, ffmpeg_process):
     """
     Stream placeholder bytes to the ffmpeg process in a loop.
@@ -64,18 +95,16 @@ def stream_placeholder2(placeholder_bytes, ffmpeg_process):
         placeholder_bytes.seek(0)
     ffmpeg_process.stdin.write(data)
 
-def stream_placeholder(placeholder_bytes, ffmpeg_process):
-    placeholder_bytes.seek(0)  # Start at the beginning
-    while True:
-        data = placeholder_bytes.read(4096)
-        if not data:  # If EOF, loop back
-            placeholder_bytes.seek(0)
-            break
-        try:
-            ffmpeg_process.stdin.write(data)
-        except BrokenPipeError:
-            print("FFmpeg process terminated.")
-            break
+def stream_placeholder(placeholder: Placeholder, ingest: Ingest):
+    """
+    Stream one loop of the placeholder segment to the ffmpeg process.
+    :param placeholder: Memory mapped placeholder, encoded once to MPEG-TS.
+    :param ingest: Ingest writing to the ffmpeg process stdin.
+    """
+    try:
+        ingest.placeholder(placeholder)
+    except BrokenPipeError:
+        print("FFmpeg process terminated.")
 
 import json
 def check_video_format(file_path):
@@ -115,7 +144,7 @@ def verify_placeholder_bytes(placeholder_path):
 def start_ffmpeg_process(twitch_url: str):
     """
     Start the ffmpeg process for streaming to Twitch,
-    taking MP4 data from stdin (pipe:0).
+    taking MPEG-TS data from stdin (pipe:0), as written by Ingest.
     """
     return subprocess.Popen(
         [
@@ -124,7 +153,8 @@ def start_ffmpeg_process(twitch_url: str):
             # -re (read input in real-time) if you want to simulate live playback speed
             "-re",
             # Read from stdin (pipe)
-            "-i", "pipe:0",  # The input is MP4 data coming from stdin
+            "-f", "mpegts",
+            "-i", "pipe:0",  # The input is MPEG-TS data coming from stdin
             # Output settings
             "-c:v", "libx264", 
             "-preset", "veryfast",
@@ -166,10 +196,11 @@ def read_ffmpeg_stderr(ffmpeg_process):
     for line in iter(ffmpeg_process.stderr.readline, b""):
         print(line.decode("utf-8"), end="")
 
-def stream_local_mp4_files(directory: str, ffmpeg_process: subprocess.Popen):
+def stream_local_mp4_files(directory: str, ingest: Ingest):
     """
     Reads each .mp4 file in the directory (in alphabetical order)
-    and writes its bytes into ffmpeg_process.stdin.
+    and writes it into the ffmpeg process stdin as MPEG-TS,
+    with timestamps continuing from file to file.
     """
     mp4_files = sorted(
         f for f in os.listdir(directory) if f.lower().endswith('.mp4')
@@ -177,54 +208,64 @@ def stream_local_mp4_files(directory: str, ffmpeg_process: subprocess.Popen):
     for mp4_file in mp4_files:
         file_path = os.path.join(directory, mp4_file)
         print(f"Streaming file: {file_path}")
-        with open(file_path, 'rb') as f:
-            while True:
-                chunk = f.read(4096)
-                if not chunk:
-                    break
-                ffmpeg_process.stdin.write(chunk)
-                # Optionally flush to avoid buffering
-                # ffmpeg_process.stdin.flush()
+        ingest.clip(file_path)
+        print(ingest)
+
+def queue_local_mp4_files(directory: str, switcher: Switcher):
+    """
+    Queues each .mp4 file in the directory (in alphabetical order) to air
+    after the placeholder, switching at the next GOP boundary.
+    """
+    mp4_files = sorted(
+        f for f in os.listdir(directory) if f.lower().endswith('.mp4')
+    )
+    for mp4_file in mp4_files:
+        switcher.play(os.path.join(directory, mp4_file))
 
 if __name__ == "__main__":
     # idea_queue.append(VideoGeneration("", task_id="CmJxEWeIgnwAAAAAAEuqyA"))
     # task_id = invoke_video_generation()
     verify_placeholder_bytes(placeholder_path3)
-    placeholder_bytes = get_placeholder_bytes(placeholder_path3)
-    data = placeholder_bytes.read(4096)
-
-    print("Placeholder bytes:")
-    # print(data[:20])  # Inspect the beginning of the raw video data
-    length = len(placeholder_bytes.getbuffer())
-    print(length)  # Inspect the beginning of the raw video data
+    # encoded once to MPEG-TS and cached, then memory mapped
+    placeholder = Placeholder(placeholder_path3)
+    print(placeholder)
 
     # Start ffmpeg process
     ffmpeg_process = start_ffmpeg_process(twitch_url)
+    # placeholder airs until a clip is queued, on the same encoder and RTMP session
+    switcher = Switcher(ffmpeg_process.stdin, placeholder)
+    switcher.start()
+    # ready clips download ahead of air time, only complete files are played
+    # kept in the clip cache after airing, so replays cost no download
+    prefetcher = Prefetcher(cache=get_clip_cache())
 
     # Start Flask server in a separate thread
     flask_thread = threading.Thread(target=run_flask_app, daemon=True)
     flask_thread.start()
     
+    # drain the encoder log, else FFmpeg blocks once the stderr pipe fills
     stderr_thread = threading.Thread(target=read_ffmpeg_stderr, args=(ffmpeg_process,), daemon=True)
-    # stderr_thread.start()
+    stderr_thread.start()
 
     local_directory = "C:/git/PyLivestream/videos"
     local_directory = "C:/Users/cjdia/Downloads/kling"
     try:
-        stream_local_mp4_files(local_directory, ffmpeg_process)
+        queue_local_mp4_files(local_directory, switcher)
+        switcher.wait_queued()
     except Exception as e:
         print(f"Error streaming local MP4 files: {e}")
 
     # while True:
     #     get_ready_videos(idea_queue, ready_queue)
-    #     vid_url = get_next_generated_file(ready_queue)
-        
-    #     if vid_url:
-    #         print(vid_url)
-    #         stream_from_url(vid_url, ffmpeg_process)
-    #     else:
-    #         stream_placeholder(placeholder_bytes, ffmpeg_process)
+    #     prefetch_ready_videos(ready_queue, prefetcher)
+    #     air_next_prefetched(prefetcher, switcher, timeout=1)
         
     # Cleanup
+    switcher.stop()
+    switcher.join()
+    print(switcher.stats())
+    print(prefetcher.stats())
+    prefetcher.close()
+    placeholder.close()
     ffmpeg_process.stdin.close()
     ffmpeg_process.wait()
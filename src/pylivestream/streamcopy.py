@@ -0,0 +1,181 @@
+"""
+decide if a file can be streamed without re-encoding
+
+Files already H.264 yuv420p (+ AAC) at an acceptable bitrate and keyframe interval for the
+site are sent with "-codec copy", which takes a small fraction of the CPU of encoding.
+If only the audio is unsuitable, video is copied and audio alone is re-encoded.
+Everything else is re-encoded as usual.
+
+Decisions use the cached FFprobe metadata, and a keyframe interval probe that is cached too.
+"""
+
+from __future__ import annotations
+import typing as T
+from pathlib import Path
+import logging
+import subprocess
+
+from .cache import get_probe_cache
+from .ffmpeg import get_exe
+
+# allowed ratio of input bitrate to the site's target bitrate
+BITRATE_TOLERANCE = 1.5
+# allowed keyframe interval beyond the site's, in seconds
+GOP_TOLERANCE = 0.1
+VIDEO_CODECS = {"h264"}
+PIX_FMTS = {"yuv420p", "yuvj420p"}
+AUDIO_CODECS = {"aac"}
+
+
+def keyframe_interval(fn: Path, exe: str | None = None) -> float | None:
+    """
+    longest interval in seconds between video keyframes of a file.
+    Reads packet flags only (no decoding), and is cached per file.
+    """
+
+    cache = get_probe_cache()
+    if (c := cache.get(fn, kind="gop")) is not None:
+        return c["max_keyframe_interval"]
+
+    cmd = [
+        exe or get_exe("ffprobe"),
+        "-loglevel",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-of",
+        "csv=p=0",
+        str(fn),
+    ]
+
+    ret = subprocess.check_output(cmd, text=True)
+
+    keys = []
+    for line in ret.splitlines():
+        t, _, flags = line.partition(",")
+        if "K" in flags:
+            try:
+                keys.append(float(t))
+            except ValueError:
+                pass
+
+    keys.sort()
+    gop = max((b - a for a, b in zip(keys, keys[1:])), default=None)
+    if keys and gop is None:
+        gop = 0.0  # single keyframe e.g. very short file
+
+    cache.put(fn, {"max_keyframe_interval": gop}, kind="gop")
+
+    return gop
+
+
+def video_bitrate(meta: dict[str, T.Any]) -> float | None:
+    """
+    video bitrate in kbps, from the stream if stated (not for e.g. Matroska),
+    else the overall bitrate minus the audio bitrate
+    """
+
+    streams = meta.get("streams", [])
+    v: dict[str, T.Any] = next((s for s in streams if s.get("codec_type") == "video"), {})
+    try:
+        return int(v["bit_rate"]) / 1000
+    except (KeyError, ValueError):
+        pass
+
+    try:
+        total = int(meta["format"]["bit_rate"])
+    except (KeyError, ValueError):
+        return None
+
+    audio = sum(int(s.get("bit_rate", 0)) for s in streams if s.get("codec_type") == "audio")
+
+    return (total - audio) / 1000
+
+
+def check_video(
+    meta: dict[str, T.Any], kbps: float, gop_sec: float, gop: float | None
+) -> str | None:
+    """
+    reason video can't be copied for the site, or None if it can
+    """
+
+    v = [s for s in meta.get("streams", []) if s.get("codec_type") == "video"]
+    if len(v) != 1:
+        return f"{len(v)} video streams"
+
+    if (codec := v[0].get("codec_name")) not in VIDEO_CODECS:
+        return f"video codec {codec}"
+
+    if (pix_fmt := v[0].get("pix_fmt")) not in PIX_FMTS:
+        return f"pixel format {pix_fmt}"
+
+    if (br := video_bitrate(meta)) is None or br > kbps * BITRATE_TOLERANCE:
+        return f"video bitrate {br} kbps, site wants {kbps} kbps"
+
+    if gop is None or gop > gop_sec + GOP_TOLERANCE:
+        return f"keyframe interval {gop} sec, site wants {gop_sec} sec"
+
+    return None
+
+
+def check_audio(meta: dict[str, T.Any], rate: int | None, bps: int | None) -> str | None:
+    """
+    reason audio can't be copied for the site, or None if it can
+    """
+
+    a = [s for s in meta.get("streams", []) if s.get("codec_type") == "audio"]
+    if not a:
+        return None
+    # streams are mapped to the first audio stream
+    a0 = a[0]
+
+    if (codec := a0.get("codec_name")) not in AUDIO_CODECS:
+        return f"audio codec {codec}"
+
+    if rate and int(a0.get("sample_rate", 0)) != int(rate):
+        return f"audio sample rate {a0.get('sample_rate')}, site wants {rate}"
+
+    if int(a0.get("channels", 0)) > 2:
+        return f"{a0.get('channels')} audio channels"
+
+    if bps and int(a0.get("bit_rate", 0)) > int(bps) * BITRATE_TOLERANCE:
+        return f"audio bitrate {a0.get('bit_rate')}, site wants {bps}"
+
+    return None
+
+
+def plan(
+    fn: Path,
+    meta: dict[str, T.Any],
+    *,
+    kbps: float,
+    gop_sec: float,
+    audio_rate: int | None = None,
+    audio_bps: int | None = None,
+    exe: str | None = None,
+) -> tuple[bool, bool]:
+    """
+    (copy video, copy audio) for streaming file to a site.
+    Audio is only copied along with video, the fast path is for files that need no encoder.
+    """
+
+    gop = None
+    if check_video(meta, kbps, gop_sec, 0.0) is None:
+        try:
+            gop = keyframe_interval(fn, exe)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logging.warning(f"could not find keyframe interval of {fn}: {e}")
+
+    if reason := check_video(meta, kbps, gop_sec, gop):
+        logging.info(f"re-encoding {fn}: {reason}")
+        return False, False
+
+    if reason := check_audio(meta, audio_rate, audio_bps):
+        logging.info(f"copying video, re-encoding audio of {fn}: {reason}")
+        return True, False
+
+    logging.info(f"copying {fn} without re-encoding")
+
+    return True, True
@@ -0,0 +1,176 @@
+"""
+keep a stream on air unattended
+
+The encoder is restarted when it exits with an error (e.g. the site connection dropped),
+or when its output stops advancing for stall_timeout seconds (e.g. a hung network write).
+Restarts wait a jittered, exponentially increasing delay, so many channels dropped
+at once by a site outage don't all reconnect at the same moment.
+Restarts, stalls and downtime are counted in the stream's EncoderStats, and so in the metrics.
+
+The decisions (Restarts, stalled) are shared by the blocking Supervisor and Watchdog here,
+and the asyncio StreamHandle of pylivestream.aio.
+
+Configure in pylivestream.json:
+
+  "supervise": true
+  "stall_timeout": 30        seconds without output before restarting
+  "restart_max_delay": 60    longest wait between restarts, seconds
+  "max_restarts": null       give up after this many restarts in a row, null: never
+"""
+
+from __future__ import annotations
+import typing as T
+import logging
+import random
+import subprocess
+import threading
+import time
+
+from .progress import EncoderStats
+
+STALL = 30.0  # seconds
+RETRY_MIN = 1.0  # seconds
+RETRY_MAX = 60.0
+# encoder running this long resets the backoff
+STABLE = 60.0
+
+
+def backoff(attempt: int, lo: float = RETRY_MIN, hi: float = RETRY_MAX) -> float:
+    """
+    delay before restart number attempt (from 0): exponential up to hi,
+    randomized over the upper half so simultaneous failures spread out.
+    """
+
+    d = min(lo * 2**attempt, hi)
+
+    return random.uniform(d / 2, d)
+
+
+def stalled(stats: EncoderStats, timeout: float, name: str = "encoder") -> bool:
+    """
+    True, counting a stall, if the encoder output didn't advance for timeout seconds
+    """
+
+    if (idle := stats.idle()) <= timeout:
+        return False
+
+    logging.error(f"{name} output stalled for {idle:.0f} sec, restarting")
+    stats.stalled()
+
+    return True
+
+
+class Restarts:
+    """
+    whether and when to restart the encoder after it exits
+    """
+
+    def __init__(
+        self,
+        stats: EncoderStats,
+        retry_max: float = RETRY_MAX,
+        max_restarts: int | None = None,
+        stable: float = STABLE,
+        name: str = "encoder",
+    ):
+        self.stats = stats
+        self.retry_max = retry_max
+        self.max_restarts = max_restarts
+        self.stable = stable
+        self.name = name
+
+        self.attempt = 0
+        self._tic = time.monotonic()
+        self._stalls = stats.stalls
+
+    def started(self) -> None:
+        self._tic = time.monotonic()
+        self._stalls = self.stats.stalls
+
+    def delay(self, ret: int) -> float | None:
+        """
+        seconds to wait before restarting the encoder that exited with code ret,
+        None if it ended cleanly or has failed too often
+        """
+
+        if ret == 0 and self.stats.stalls == self._stalls:
+            return None
+
+        if time.monotonic() - self._tic > self.stable:
+            self.attempt = 0
+        if self.max_restarts is not None and self.attempt >= self.max_restarts:
+            logging.error(f"{self.name} failed {self.attempt + 1} times in a row, giving up")
+            return None
+
+        d = backoff(self.attempt, hi=self.retry_max)
+        self.attempt += 1
+        logging.warning(f"{self.name} exited with code {ret}, restarting in {d:.1f} sec")
+
+        return d
+
+
+class Watchdog(threading.Thread):
+    """
+    terminate an encoder whose output doesn't advance for timeout seconds
+    """
+
+    def __init__(self, proc: subprocess.Popen, stats: EncoderStats, timeout: float = STALL):
+        super().__init__(daemon=True, name="watchdog")
+
+        self.proc = proc
+        self.stats = stats
+        self.timeout = timeout
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(min(1.0, self.timeout / 4)):
+            if self.proc.poll() is not None:
+                return
+
+            if stalled(self.stats, self.timeout):
+                self.proc.terminate()
+                try:
+                    self.proc.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self.proc.kill()
+                return
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+class Supervisor:
+    """
+    run the encoder until it ends cleanly, restarting it on failure
+    """
+
+    def __init__(
+        self,
+        stats: EncoderStats,
+        *,
+        retry_max: float = RETRY_MAX,
+        max_restarts: int | None = None,
+        stable: float = STABLE,
+    ):
+        self.stats = stats
+        self.retry_max = retry_max
+        self.max_restarts = max_restarts
+        self.stable = stable
+
+        self.stop = threading.Event()
+
+    def run(self, encode: T.Callable[[], int]) -> int:
+        """
+        encode: runs the encoder to completion, returning its exit code
+        """
+
+        restarts = Restarts(self.stats, self.retry_max, self.max_restarts, self.stable)
+
+        while True:
+            restarts.started()
+            ret = encode()
+
+            if self.stop.is_set() or (delay := restarts.delay(ret)) is None:
+                return ret
+            if self.stop.wait(delay):
+                return ret
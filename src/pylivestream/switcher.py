@@ -0,0 +1,162 @@
+"""
+switch the live encoder input between filler and clips without restarting it
+
+One FFmpeg encoder, and so one RTMP session, stays up for the whole broadcast.
+Its stdin gets a single MPEG-TS stream (pylivestream.ingest): the placeholder loops,
+written a GOP at a time, until a clip is queued with play(). The switch then happens
+at the next GOP boundary of the filler, and the clip's timestamps are shifted to
+continue the stream, so the encoder sees neither a broken frame nor a jump in time.
+After the clip (and any other queued clips) the filler resumes at a GOP boundary.
+
+Each switch is timed from play() to the first clip data entering the encoder pipe,
+with the pipe fill at that moment: data already in the pipe still airs before the clip.
+A smaller pipe_size makes switches reach the air sooner, at the cost of less slack.
+
+  with Placeholder("~/filler.mp4") as P, Switcher(proc.stdin, P) as S:
+      S.play("https://example.invalid/clip.mp4")
+      S.wait_queued()
+      print(S.stats())
+"""
+
+from __future__ import annotations
+import typing as T
+from pathlib import Path
+import logging
+import queue
+import subprocess
+import threading
+import time
+
+from .ingest import Ingest
+from .mpegts import CLOCK
+from .pipefeed import PIPE_SIZE
+
+if T.TYPE_CHECKING:
+    from .placeholder import Placeholder
+
+__all__ = ["Switcher"]
+
+
+class Switcher(threading.Thread):
+    def __init__(
+        self,
+        pipe: T.IO[bytes] | int,
+        filler: Placeholder,
+        exe: str | None = None,
+        pipe_size: int = PIPE_SIZE,
+    ):
+        super().__init__(daemon=True, name="switcher")
+
+        self.ingest = Ingest(pipe, exe, pipe_size=pipe_size, prof=filler.prof)
+        self.filler = filler
+        self.queue: queue.Queue[tuple[Path | str, float]] = queue.Queue()
+        self.switches: list[dict[str, T.Any]] = []
+        self.failed = 0
+
+        self._stopping = threading.Event()
+        # filler timestamps restart from the next GOP written
+        self._rejoin = True
+
+    def __enter__(self) -> Switcher:
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+        self.join()
+
+    def play(self, src: Path | str) -> None:
+        """
+        queue a clip, file or URL, to air at the next GOP boundary
+        """
+
+        self.queue.put((src, time.monotonic()))
+
+    def wait_queued(self) -> None:
+        """
+        wait until all queued clips have aired
+        """
+
+        self.queue.join()
+
+    def stop(self) -> None:
+        """
+        stop at the next GOP boundary, or the end of the current clip
+        """
+
+        self._stopping.set()
+
+    def run(self) -> None:
+        try:
+            while not self._stopping.is_set():
+                try:
+                    src, asked = self.queue.get_nowait()
+                except queue.Empty:
+                    self._filler()
+                    continue
+
+                try:
+                    self._clip(src, asked)
+                finally:
+                    self.queue.task_done()
+        except BrokenPipeError:
+            logging.error("encoder input closed")
+        finally:
+            self.ingest.close()
+            # nothing more will air, release wait_queued()
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                self.queue.task_done()
+
+    def _filler(self) -> None:
+        if self._rejoin:
+            self.ingest.retimer.next_clip()
+            self._rejoin = False
+
+        loops = self.filler.loops
+        self.ingest.write(self.filler.read_gop())
+        if self.filler.loops != loops:
+            # the next loop starts again from its first timestamp
+            self._rejoin = True
+
+    def _clip(self, src: Path | str, asked: float) -> None:
+        logging.info(f"switching to {src}")
+        fill = self.ingest.feed.fill()
+        self._rejoin = True
+
+        try:
+            seconds = self.ingest.clip(src)
+        except BrokenPipeError:
+            raise
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            # filler carries on
+            logging.error(f"could not air {src}: {e}")
+            self.failed += 1
+            return
+
+        written = self.ingest.clip_written
+        self.switches.append(
+            {
+                "src": str(src),
+                "latency": written - asked if written is not None else None,
+                "pipe_bytes": fill,
+                "stream_time": self.ingest.retimer.start / CLOCK,
+                "seconds": seconds,
+            }
+        )
+
+    def stats(self) -> dict[str, T.Any]:
+        latency = [s["latency"] for s in self.switches if s["latency"] is not None]
+
+        return {
+            "switches": len(self.switches),
+            "failed": self.failed,
+            "queued": self.queue.qsize(),
+            "latency_last": latency[-1] if latency else None,
+            "latency_max": max(latency, default=None),
+            "stream_time": self.ingest.seconds,
+            "filler_loops": self.filler.loops,
+        } | self.ingest.feed.stats()
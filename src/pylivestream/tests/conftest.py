@@ -0,0 +1,24 @@
+import sys
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def user_cache(tmp_path_factory, monkeypatch):
+    """
+    each test gets an empty cache directory, instead of the user's real one
+    """
+
+    monkeypatch.setenv("PYLIVESTREAM_CACHE", str(tmp_path_factory.mktemp("cache")))
+
+    def clear():
+        # per-process caches and discovery that would point into another cache directory
+        for name, mod in list(sys.modules.items()):
+            if name.startswith("pylivestream."):
+                for k, v in vars(mod).items():
+                    if k.startswith("get_") and hasattr(v, "cache_clear"):
+                        v.cache_clear()
+
+    clear()
+    yield
+    clear()
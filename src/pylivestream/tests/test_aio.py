@@ -0,0 +1,110 @@
+import asyncio
+import json
+import shutil
+from pathlib import Path
+import importlib.resources
+
+import pytest
+
+import pylivestream as pls
+
+ini = Path(__file__).parents[1] / "data/pylivestream.json"
+
+
+@pytest.mark.skipif(not shutil.which("ffmpeg"), reason="FFmpeg not found")
+def test_many_streams(tmp_path):
+    """
+    several streams from one event loop, each to a file standing in for a site
+    """
+
+    C = json.loads(ini.read_text())
+    C["sites"]["file"]["url"] = str(tmp_path)
+    for i in range(3):
+        C["sites"]["file"]["streamid"] = f"{i}.flv"
+        C["channel"] = f"ch{i}"
+        (tmp_path / f"{i}.json").write_text(json.dumps(C))
+
+    async def main():
+        with importlib.resources.as_file(
+            importlib.resources.files("pylivestream.data").joinpath("bunny.avi")
+        ) as vid:
+            handles = []
+            for i in range(3):
+                S = pls.FileIn(tmp_path / f"{i}.json", "file", infn=vid, timeout=3, yes=True)
+                handles.append(await S.agolive())
+
+            await asyncio.sleep(1.5)
+            assert all(h.running for h in handles)
+            assert handles[0].snapshot()["frame"] > 0
+
+            handles[0].stop()
+            await asyncio.wait_for(handles[0].wait(), 10)
+            assert not handles[0].running
+            assert handles[1].running
+
+            return await asyncio.wait_for(asyncio.gather(*(h.wait() for h in handles[1:])), 20)
+
+    assert asyncio.run(main()) == [0, 0]
+
+    for i in range(3):
+        assert (tmp_path / f"{i}.flv").stat().st_size > 0
+
+
+def test_listener_record(tmp_path, monkeypatch):
+    """
+    localhost stream started from asyncio records like the blocking one
+    """
+
+    C = json.loads(ini.read_text())
+    C["listener_record"] = str(tmp_path / "rec")
+    (tmp_path / "local.json").write_text(json.dumps(C))
+
+    started = []
+    monkeypatch.setattr(pls.ffmpeg.Ffmpeg, "listener", lambda self, *args: started.append(args))
+
+    async def encode(self):
+        return 0
+
+    monkeypatch.setattr(pls.aio.StreamHandle, "_encode", encode)
+
+    async def main():
+        with importlib.resources.as_file(
+            importlib.resources.files("pylivestream.data").joinpath("bunny.avi")
+        ) as vid:
+            S = pls.FileIn(tmp_path / "local.json", "localhost", infn=vid, yes=True)
+            h = await S.agolive()
+            assert await h.wait() == 0
+
+    asyncio.run(main())
+
+    assert started == [("ffplay", tmp_path / "rec")]
+
+
+def test_supervise(tmp_path, monkeypatch):
+    """
+    restarts as the blocking Supervisor, giving up after max_restarts
+    """
+
+    C = json.loads(ini.read_text())
+    C |= {"supervise": True, "max_restarts": 2}
+    C["sites"]["file"]["url"] = str(tmp_path)
+    (tmp_path / "s.json").write_text(json.dumps(C))
+
+    calls = []
+
+    async def encode(self):
+        calls.append(1)
+        return 1
+
+    monkeypatch.setattr(pls.aio.StreamHandle, "_encode", encode)
+    monkeypatch.setattr(pls.supervise, "backoff", lambda attempt, lo=0, hi=0: 0.0)
+
+    async def main():
+        with importlib.resources.as_file(
+            importlib.resources.files("pylivestream.data").joinpath("bunny.avi")
+        ) as vid:
+            S = pls.FileIn(tmp_path / "s.json", "file", infn=vid, yes=True)
+            return await (await S.agolive()).wait()
+
+    assert asyncio.run(main()) == 1
+    assert len(calls) == 3
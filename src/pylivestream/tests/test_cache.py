@@ -0,0 +1,130 @@
+import os
+
+import pylivestream as pls
+from pylivestream.cache import ProbeCache
+
+META = {"streams": [{"codec_type": "video", "width": 640, "height": 360, "avg_frame_rate": "30/1"}]}
+
+
+def test_roundtrip(tmp_path):
+    fn = tmp_path / "a.mp4"
+    fn.write_bytes(b"x")
+
+    C = ProbeCache(tmp_path / "cache")
+    assert C.get(fn) is None
+
+    C.put(fn, META)
+    assert C.get(fn) == META
+    # new instance reads from disk
+    assert ProbeCache(tmp_path / "cache").get(fn) == META
+
+
+def test_modified(tmp_path):
+    fn = tmp_path / "a.mp4"
+    fn.write_bytes(b"x")
+
+    C = ProbeCache(tmp_path / "cache")
+    C.put(fn, META)
+
+    fn.write_bytes(b"xy")
+    assert C.get(fn) is None
+
+
+def test_invalidate(tmp_path):
+    fns = [tmp_path / f"{i}.mp4" for i in range(3)]
+    C = ProbeCache(tmp_path / "cache")
+    for fn in fns:
+        fn.write_bytes(b"x")
+        C.put(fn, META)
+
+    C.invalidate(fns[0])
+    assert C.get(fns[0]) is None
+    assert C.get(fns[1]) == META
+
+    C.invalidate()
+    assert C.get(fns[1]) is None
+    assert ProbeCache(tmp_path / "cache").get(fns[2]) is None
+
+
+def test_evict(tmp_path):
+    C = ProbeCache(tmp_path / "cache", max_entries=4)
+    fns = []
+    for i in range(6):
+        fn = tmp_path / f"{i}.mp4"
+        fn.write_bytes(b"x")
+        C.put(fn, META)
+        # make LRU order deterministic
+        p = C._path(pls.cache.file_key(fn))
+        os.utime(p, ns=(i * 10**9, i * 10**9))
+        fns.append(fn)
+
+    C.evict()
+
+    D = ProbeCache(tmp_path / "cache")
+    assert D.get(fns[0]) is None
+    assert D.get(fns[5]) == META
+    assert len(D._entries()) == 4
+
+
+def test_get_meta_cached(tmp_path, monkeypatch):
+    """cached metadata is used without running FFprobe"""
+    fn = tmp_path / "a.mp4"
+    fn.write_bytes(b"x")
+
+    C = ProbeCache(tmp_path / "cache")
+    C.put(fn, META)
+    monkeypatch.setattr(pls.ffmpeg, "get_probe_cache", lambda: C)
+
+    assert pls.utils.get_resolution(fn, "nonexistent-ffprobe") == [640, 360]
+    assert pls.utils.get_framerate(fn, "nonexistent-ffprobe") == 30.0
+
+
+def test_blob_cache(tmp_path):
+    C = pls.cache.BlobCache(tmp_path / "blobs", max_bytes=250)
+    assert C.get("aa11") is None
+
+    paths = []
+    for i, key in enumerate(("aa11", "bb22", "cc33")):
+        tmp = C.new_file(".mp4")
+        tmp.write_bytes(bytes(100))
+        p = C.put(key, tmp, ".mp4")
+        assert p == C.path(key, ".mp4")
+        assert not tmp.exists()
+        os.utime(p, ns=(i * 10**9, i * 10**9))
+        paths.append(p)
+
+    # third put exceeded limit and evicted the least recently used
+    assert C.get("aa11", ".mp4") is None
+    assert C.get("bb22", ".mp4") == paths[1]
+    assert C.size() == 200
+
+    assert C.evict(max_bytes=100, keep={paths[1]}) == 100
+    assert C.get("bb22", ".mp4") == paths[1]
+    assert C.get("cc33", ".mp4") is None
+
+
+def test_clip_cache(tmp_path):
+    C = pls.cache.BlobCache(tmp_path / "blobs", max_bytes=25)
+    key = [pls.cache.clip_key(f"https://example.invalid/{i}.mp4") for i in range(3)]
+    # same task, new signed URL
+    a = pls.cache.clip_key("https://a.invalid/x.mp4?sig=1", "t1")
+    assert a == pls.cache.clip_key("https://a.invalid/x.mp4?sig=2", "t1")
+
+    assert C.get(key[0], ".mp4") is None
+
+    for i, k in enumerate(key):
+        src = C.new_file(".mp4")
+        src.write_bytes(b"x" * 10)
+        C.put(k, src, ".mp4", keep={C.path(key[0], ".mp4")})
+        os.utime(C.path(k, ".mp4"), ns=(i * 10**9, i * 10**9))
+
+    # over budget: least recently used goes, unless kept
+    assert C.get(key[0], ".mp4") is not None
+    assert C.get(key[1], ".mp4") is None
+    assert C.get(key[2], ".mp4") is not None
+    assert not list((tmp_path / "blobs").glob(".*.part"))
+
+    s = C.stats()
+    assert s["hits"] == 2
+    assert s["misses"] == 2
+    assert s["bytes"] == 20
@@ -0,0 +1,57 @@
+import json
+
+from pytest import approx
+
+from pylivestream import calibrate
+
+MODEL = {
+    "fps": {
+        "ultrafast": {"480": 400.0, "720": 180.0, "1080": 80.0},
+        "veryfast": {"480": 200.0, "720": 90.0, "1080": 40.0},
+        "medium": {"480": 60.0, "720": 27.0, "1080": 12.0},
+    }
+}
+
+
+def test_capacity():
+    assert calibrate.capacity(MODEL, "veryfast", 720) == approx(90.0)
+    # scaled by pixel count from nearest measured height
+    assert calibrate.capacity(MODEL, "veryfast", 1440) == approx(40.0 * (1080 / 1440) ** 2)
+    assert calibrate.capacity(MODEL, "slow", 720) is None
+
+
+def test_pick():
+    assert calibrate.pick_preset(MODEL, 480, 30) == "medium"
+    assert calibrate.pick_preset(MODEL, 720, 30) == "veryfast"
+    assert calibrate.pick_preset(MODEL, 1080, 60) == "ultrafast"
+    assert calibrate.pick_preset(MODEL, 2160, 60) is None
+
+
+def test_uncalibrated(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYLIVESTREAM_CACHE", str(tmp_path))
+    assert calibrate.choose_preset("libx264", 720, 30) == calibrate.DEFAULT_PRESET
+
+
+def test_lavfi_source():
+    for height in calibrate.HEIGHTS:
+        size = calibrate.lavfi_source(height).split("size=")[1].split(":")[0]
+        width, h = map(int, size.split("x"))
+        assert width % 2 == 0
+        assert h == height
+        assert width / h == approx(16 / 9, rel=0.01)
+
+
+def test_other_ffmpeg(tmp_path, monkeypatch, caplog):
+    monkeypatch.setenv("PYLIVESTREAM_CACHE", str(tmp_path))
+    monkeypatch.setattr(calibrate, "get_version", lambda exe: "ffmpeg version 7.1")
+
+    fn = calibrate.model_file("libx264")
+    fn.parent.mkdir(parents=True)
+    fn.write_text(json.dumps(MODEL | {"ffmpeg": "ffmpeg version 7.1"}))
+    assert calibrate.choose_preset("libx264", 720, 30, "ffmpeg") == "veryfast"
+    assert "calibration" not in caplog.text
+
+    # measured with another FFmpeg: still used, with a warning
+    fn.write_text(json.dumps(MODEL | {"ffmpeg": "ffmpeg version 6.0"}))
+    assert calibrate.choose_preset("libx264", 720, 30, "ffmpeg") == "veryfast"
+    assert "ffmpeg version 6.0" in caplog.text
@@ -0,0 +1,89 @@
+import json
+import subprocess
+import time
+
+import pytest
+
+from pylivestream import check_video_formats as cvf
+
+STREAMS = {
+    "a.mp4": [
+        {
+            "codec_type": "video",
+            "codec_name": "h264",
+            "width": 1920,
+            "height": 1080,
+            "avg_frame_rate": "30/1",
+        },
+        {"codec_type": "audio", "codec_name": "aac", "sample_rate": "48000", "channels": 2},
+    ],
+    # audio first, and a second video stream
+    "b.mp4": [
+        {"codec_type": "audio", "codec_name": "mp3", "sample_rate": "44100", "channels": 1},
+        {"codec_type": "video", "codec_name": "hevc", "width": 1280, "height": 720},
+        {"codec_type": "video", "codec_name": "mjpeg", "width": 64, "height": 64},
+    ],
+    "silent.mp4": [{"codec_type": "video", "codec_name": "h264", "width": 640, "height": 480}],
+}
+
+
+def fake_ffprobe(cmd, stderr=None):
+    fn = cmd[-1]
+    # slowest first, so results finish out of order
+    time.sleep({"a.mp4": 0.2, "b.mp4": 0.1}.get(fn, 0))
+    if fn == "garbage.mp4":
+        return b"not json"
+    if fn not in STREAMS:
+        raise subprocess.CalledProcessError(1, cmd)
+    return json.dumps({"streams": STREAMS[fn]}).encode()
+
+
+@pytest.fixture(autouse=True)
+def ffprobe(monkeypatch):
+    monkeypatch.setattr(cvf.subprocess, "check_output", fake_ffprobe)
+
+
+def test_media_info():
+    assert cvf.get_media_info("a.mp4") == {
+        "video_codec": "h264",
+        "width": 1920,
+        "height": 1080,
+        "fps": "30/1",
+        "audio_codec": "aac",
+        "sample_rate": 48000,
+        "channels": 2,
+    }
+
+    # first stream of each type, in any order
+    b = cvf.get_media_info("b.mp4")
+    assert b["video_codec"] == "hevc" and b["width"] == 1280
+    assert b["audio_codec"] == "mp3" and b["channels"] == 1
+
+    silent = cvf.get_media_info("silent.mp4")
+    assert silent["audio_codec"] is None and silent["sample_rate"] is None
+    assert silent["fps"] is None
+
+
+@pytest.mark.parametrize("fn", ["missing.mp4", "garbage.mp4"])
+def test_media_info_error(fn):
+    assert set(cvf.get_media_info(fn).values()) == {None}
+
+
+def test_iter_media_info():
+    files = ["a.mp4", "b.mp4", "missing.mp4", "silent.mp4"]
+
+    infos = list(cvf.iter_media_info(files, workers=4))
+
+    assert [i["video_codec"] for i in infos] == ["h264", "hevc", None, "h264"]
+    assert infos == [cvf.get_media_info(f) for f in files]
+
+
+def test_compatibility():
+    cvf.check_compatibility(cvf.iter_media_info(["a.mp4", "a.mp4"], workers=2))
+
+    with pytest.raises(ValueError, match="File #2") as e:
+        cvf.check_compatibility(cvf.iter_media_info(["a.mp4", "b.mp4", "a.mp4"], workers=2))
+    assert "video_codec: hevc != h264" in str(e.value)
+
+    with pytest.raises(ValueError):
+        cvf.check_compatibility([])
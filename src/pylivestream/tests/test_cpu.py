@@ -0,0 +1,62 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+import importlib.resources
+
+import pytest
+
+import pylivestream as pls
+from pylivestream.cpu import CpuPolicy
+
+ini = Path(__file__).parents[1] / "data/pylivestream.json"
+
+
+def test_threads(tmp_path):
+    C = json.loads(ini.read_text())
+    C |= {"threads": 2, "filter_threads": 1, "cpu_affinity": [0], "nice": 5}
+    fn = tmp_path / "pylivestream.json"
+    fn.write_text(json.dumps(C))
+
+    with importlib.resources.as_file(
+        importlib.resources.files("pylivestream.data").joinpath("bunny.avi")
+    ) as vid:
+        s = pls.FileIn(fn, "youtube", infn=vid).streams["youtube"]
+
+    assert s.cmd[s.cmd.index("-threads") + 1] == "2"
+    assert s.cmd.index("-threads") > s.cmd.index("-i")
+    assert s.cmd[s.cmd.index("-filter_threads") + 1] == "1"
+    assert s.cmd.index("-filter_threads") < s.cmd.index("-i")
+    assert s.cpu.cores == [0] and s.cpu.nice == 5
+
+
+CODE = "import os, sys; sys.stdin.read(); print(sorted(os.sched_getaffinity(0)), os.nice(0))"
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="no CPU affinity")
+@pytest.mark.parametrize("tools", [True, False])
+def test_policy(tools, monkeypatch):
+    if not tools:
+        monkeypatch.setattr(shutil, "which", lambda name: None)
+    elif not shutil.which("taskset"):
+        pytest.skip("taskset not installed")
+
+    nice = os.nice(0)
+    cpu = CpuPolicy([0], nice=3)
+
+    cmd = cpu.wrap([sys.executable, "-c", CODE])
+    assert (cmd[0] != sys.executable) == tools
+
+    # the child waits for stdin, so the policy is applied to it after spawn
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    cpu.apply(proc.pid)
+    ret, _ = proc.communicate("")
+
+    assert ret.split() == ["[0]", str(nice + 3)]
+    assert not CpuPolicy()
+    assert CpuPolicy().wrap(["ffmpeg"]) == ["ffmpeg"]
+
+    with pytest.raises(ValueError):
+        CpuPolicy(ionice="low")
@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+from pytest import approx
+
+from pylivestream import daemon
+
+
+def stream(height=720, fps=30.0, preset="veryfast", copy=False):
+    return SimpleNamespace(
+        res=[height * 16 // 9, height],
+        fps=fps,
+        preset=preset,
+        video_codec="libx264",
+        copy_video=copy,
+    )
+
+
+def test_pack():
+    costs = {"a": 0.5, "b": 0.3, "c": 2.0, "d": 0.7, "e": 3.0, "f": 0.1}
+    cores, refused = daemon.pack(costs, ncpu=4, budget=0.8)
+
+    # a and b share a core, c spreads over 3 cores
+    assert cores["a"] == cores["b"]
+    assert len(cores["c"]) == 3 and cores["a"][0] not in cores["c"]
+    # d doesn't fit any core left
+    assert "d" in refused
+    assert "e" in refused
+    # small channel still fits after refusals
+    assert "f" in cores
+
+
+def test_cost(monkeypatch):
+    monkeypatch.setattr(daemon, "load_model", lambda codec: None)
+
+    assert daemon.encoder_cost(stream(copy=True)) == daemon.COPY_COST
+    c720 = daemon.encoder_cost(stream())
+    assert daemon.encoder_cost(stream(1080)) == approx(c720 * 2.25, rel=0.01)
+    assert daemon.encoder_cost(stream(preset="medium")) == approx(c720 * 2.5)
+
+    # calibrated: this 8 core host encodes 720p veryfast at 240 frames/sec
+    model = {"cpu_count": 8, "fps": {"veryfast": {"720": 240.0}}}
+    monkeypatch.setattr(daemon, "load_model", lambda codec: model)
+    assert daemon.encoder_cost(stream()) == approx(1.0)
+    assert daemon.encoder_cost(stream(fps=60)) == approx(2.0)
@@ -0,0 +1,133 @@
+import io
+import sys
+import time
+
+from pylivestream import flv
+from pylivestream.fanout import FanOut, Sink
+
+# copy stdin to the file named by the "URL", or fail at once for URL "FAIL"
+COPY = """
+import sys, shutil
+if sys.argv[1] == "FAIL":
+    sys.exit(1)
+with open(sys.argv[1], "wb") as f:
+    shutil.copyfileobj(sys.stdin.buffer, f)
+"""
+
+
+def command(self):
+    return [sys.executable, "-c", COPY, self.url]
+
+
+def video(key: bool, seq: bool = False) -> bytes:
+    return bytes([0x17 if key else 0x27, 0 if seq else 1]) + b"frame"
+
+
+def audio(seq: bool = False) -> bytes:
+    return bytes([0xAF, 0 if seq else 1]) + b"sound"
+
+
+def stream():
+    headers = [
+        (flv.SCRIPT, 0, b"\x02\x00\x0aonMetaData"),
+        (flv.VIDEO, 0, video(True, seq=True)),
+        (flv.AUDIO, 0, audio(seq=True)),
+    ]
+    media = []
+    for i in range(50):
+        media.append((flv.VIDEO, i * 40, video(i % 25 == 0)))
+        media.append((flv.AUDIO, i * 40, audio()))
+
+    buf = flv.file_header() + b"".join(flv.tag_bytes(*t) for t in headers + media)
+
+    return buf, headers, media
+
+
+def test_tags():
+    buf, headers, media = stream()
+
+    f = io.BytesIO(buf)
+    assert flv.read_header(f) == flv.HAS_AUDIO | flv.HAS_VIDEO
+    tags = list(flv.iter_tags(f))
+    assert tags == headers + media
+
+    assert flv.is_sequence_header(flv.VIDEO, headers[1][2])
+    assert flv.is_sequence_header(flv.AUDIO, headers[2][2])
+    assert flv.is_keyframe(*media[0][::2])
+    assert not flv.is_keyframe(*media[2][::2])
+
+
+def test_isolation(tmp_path, monkeypatch):
+    """a failing site doesn't stop the others"""
+    monkeypatch.setattr(Sink, "command", command)
+
+    buf, headers, media = stream()
+    good = tmp_path / "good.flv"
+
+    F = FanOut({"good": str(good), "bad": "FAIL"}, "ffmpeg")
+    F.feed(io.BytesIO(buf))
+
+    assert good.read_bytes() == buf
+
+    s = F.stats()
+    assert s["good"]["sent_bytes"] == len(buf) - len(flv.file_header()) - len(F.preamble())
+    assert not s["bad"]["connected"]
+
+
+def test_audio_only(tmp_path, monkeypatch):
+    """no video track: nothing waits for a keyframe"""
+    monkeypatch.setattr(Sink, "command", command)
+
+    tags = [(flv.SCRIPT, 0, b"\x02\x00\x0aonMetaData"), (flv.AUDIO, 0, audio(seq=True))]
+    tags += [(flv.AUDIO, i * 23, audio()) for i in range(50)]
+    buf = flv.file_header(flv.HAS_AUDIO) + b"".join(flv.tag_bytes(*t) for t in tags)
+    out = tmp_path / "audio.flv"
+
+    F = FanOut({"radio": str(out)}, "ffmpeg")
+    F.feed(io.BytesIO(buf))
+
+    assert not F.has_video
+    assert F.stats()["radio"]["dropped_tags"] == 0
+    assert out.read_bytes() == buf
+
+
+def test_headers_pass():
+    s = Sink("site", "x", "ffmpeg", lambda: b"")
+
+    s.put(0, b"m", keyframe=False, header=True)
+    s.put(0, b"a", keyframe=False)
+    assert s.dropped == 1 and s.queued_bytes == 1
+
+
+def test_skip_to_keyframe():
+    s = Sink("slow", "x", "ffmpeg", lambda: b"", max_lag=1.0)
+
+    s.put(0, b"a", keyframe=False)
+    assert s.dropped == 1 and s.queued_bytes == 0
+
+    for ts in range(0, 1001, 100):
+        s.put(ts, b"v", keyframe=ts == 0)
+    assert s.queued_bytes == 11
+
+    # over a second behind: queue dropped, non-keyframes skipped until next keyframe
+    s.put(1100, b"v", keyframe=False)
+    assert s.queued_bytes == 0
+    s.put(1200, b"k", keyframe=True)
+    assert s.queued_bytes == 1
+
+
+def test_reconnect(monkeypatch):
+    monkeypatch.setattr(Sink, "command", command)
+    monkeypatch.setattr(Sink, "RETRY_MIN", 0.01)
+
+    s = Sink("bad", "FAIL", "ffmpeg", lambda: b"")
+    s.start()
+    for ts in range(0, 2000, 20):
+        s.put(ts, flv.tag_bytes(flv.VIDEO, ts, video(True)), keyframe=True)
+        time.sleep(0.01)
+        if s.reconnects:
+            break
+    s.close()
+    s.join(timeout=10)
+
+    assert s.reconnects >= 1
@@ -84,3 +84,82 @@ def test_script():
             ],
             timeout=TIMEOUT,
         )
+
+
+def test_probe_files(tmp_path, monkeypatch):
+    import pylivestream.fglob
+
+    def fake_meta(fn, exe=None):
+        if fn.stem == "bad":
+            raise subprocess.CalledProcessError(1, ["ffprobe", str(fn)])
+        if fn.stem == "empty":
+            return {"streams": []}
+        return {"streams": [{"codec_type": "video", "width": 426, "height": 240}]}
+
+    monkeypatch.setattr(pylivestream.fglob, "get_meta", fake_meta)
+
+    flist = [tmp_path / f"{n}.avi" for n in ("a", "bad", "b", "empty", "c")]
+    metas, bad = pylivestream.fglob.probe_files(flist, jobs=2)
+
+    assert list(metas) == [flist[0], flist[2], flist[4]]
+    assert set(bad) == {flist[1], flist[3]}
+
+
+def test_still_image(tmp_path, monkeypatch):
+    import pylivestream.fglob
+
+    def fake_meta(fn, exe=None):
+        if fn.suffix == ".png":
+            raise subprocess.CalledProcessError(1, ["ffprobe", str(fn)])
+        return {"streams": [{"codec_type": "audio"}]}
+
+    monkeypatch.setattr(pylivestream.fglob, "get_meta", fake_meta)
+    monkeypatch.setattr(pylivestream.fglob, "get_exe", lambda name: name)
+
+    song = tmp_path / "a.ogg"
+    song.touch()
+    # stops before going live
+    with pytest.raises(ValueError, match="still image"):
+        pylivestream.fglob.stream_files(
+            ini, ["localhost"], video_path=song, still_image=tmp_path / "bad.png"
+        )
+
+    # an image already probed isn't probed again
+    image_meta = {"streams": [{"codec_type": "video", "width": 1280, "height": 720}]}
+    with importlib.resources.as_file(
+        importlib.resources.files("pylivestream.data").joinpath("orch_short.ogg")
+    ) as fn:
+        S = pls.FileIn(ini, "localhost", infn=fn, image=tmp_path / "x.png", image_meta=image_meta)
+    assert S.streams["localhost"].res == [1280, 720]
+
+
+def test_write_concat(tmp_path):
+    from pylivestream.fglob import write_concat
+
+    flist = [tmp_path / "a.mp4", tmp_path / "it's.mp4"]
+    metas = {flist[0]: {"format": {"duration": "12.5"}}, flist[1]: {"format": {}}}
+
+    fn = write_concat(flist, tmp_path / "list.ffconcat", metas)
+
+    assert fn.read_text().splitlines() == [
+        "ffconcat version 1.0",
+        f"file '{flist[0].resolve()}'",
+        "duration 12.5",
+        f"file '{tmp_path.resolve()}/it'\\''s.mp4'",
+    ]
+
+
+def test_playlist_props(tmp_path):
+    with importlib.resources.as_file(
+        importlib.resources.files("pylivestream.data").joinpath("bunny.avi")
+    ) as fn:
+        playlist = pls.fglob.write_concat([fn, fn], tmp_path / "list.ffconcat")
+
+        S = pls.FileIn(ini, websites=sites, infn=fn, playlist=playlist, loop=True)
+        for s in S.streams:
+            cmd = S.streams[s].cmd
+            i = cmd.index("-f")
+            assert cmd[:i][-2:] == ["-stream_loop", "-1"]
+            assert cmd[i:][:5] == ["-f", "concat", "-safe", "0", "-i"]
+            assert str(fn) not in cmd
+            assert cmd[cmd.index("-vf") + 1].startswith("scale=426:240:")
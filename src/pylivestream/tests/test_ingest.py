@@ -0,0 +1,107 @@
+import os
+import shutil
+import subprocess
+import threading
+
+import pytest
+
+from pylivestream import mpegts, placeholder
+from pylivestream.ingest import Ingest, remux_cmd
+
+
+def meta(vcodec="h264", size=(160, 120), fps="10/1", acodec: str | None = "aac") -> dict:
+    streams = [
+        {
+            "codec_type": "video",
+            "codec_name": vcodec,
+            "pix_fmt": "yuv420p",
+            "width": size[0],
+            "height": size[1],
+            "avg_frame_rate": fps,
+        }
+    ]
+    if acodec:
+        streams.append(
+            {"codec_type": "audio", "codec_name": acodec, "sample_rate": "44100", "channels": 2}
+        )
+    return {"streams": streams}
+
+
+@pytest.mark.parametrize(
+    "clip,copy,silence",
+    [
+        (meta(), (True, True), False),
+        (meta(acodec=None), (True, False), True),
+        (meta(acodec="mp3"), (True, False), False),
+        (meta(vcodec="hevc"), (False, True), False),
+        (meta(size=(320, 240)), (False, True), False),
+        (meta(fps="30000/1001"), (False, True), False),
+    ],
+)
+def test_remux_cmd(clip, copy, silence):
+    prof = placeholder.profile(160, 120, 10.0, 0.5)
+    cmd = remux_cmd("ffmpeg", "clip.mp4", clip, prof)
+
+    assert tuple(cmd[cmd.index(k) + 1] == "copy" for k in ("-codec:v", "-codec:a")) == copy
+    assert any(c.startswith("anullsrc") for c in cmd) == silence
+    assert cmd.count("-map") == 2
+
+    # unchecked: copied as is
+    assert "0:a:0?" in remux_cmd("ffmpeg", "clip.mp4")
+    # no profile: only codecs must match
+    assert "libx264" not in remux_cmd("ffmpeg", "clip.mp4", meta(size=(320, 240)))
+
+    with pytest.raises(ValueError):
+        remux_cmd("ffmpeg", "clip.mp4", {"streams": clip["streams"][1:]}, prof)
+
+
+def test_ingest(tmp_path):
+    if not (exe := shutil.which("ffmpeg")) or not shutil.which("ffprobe"):
+        pytest.skip("FFmpeg not found")
+
+    clip = tmp_path / "clip.mp4"
+    subprocess.check_call(
+        [exe, "-loglevel", "error", "-f", "lavfi", "-i", "testsrc=size=160x120:rate=10"]
+        + ["-f", "lavfi", "-i", "sine", "-t", "2", str(clip)]
+    )
+
+    r, w = os.pipe()
+    out: list[bytes] = []
+    reader = threading.Thread(target=lambda: out.append(os.fdopen(r, "rb").read()), daemon=True)
+    reader.start()
+
+    try:
+        with Ingest(w, exe) as ingest:
+            for _ in range(3):
+                assert ingest.clip(clip) == pytest.approx(2.0, abs=0.1)
+    finally:
+        os.close(w)
+    reader.join()
+
+    data = out[0]
+    assert len(data) % mpegts.PACKET == 0
+
+    last: dict[int, int] = {}
+    cc: dict[int, int] = {}
+    for t in mpegts.iter_timestamps(data):
+        if (ts := t.dts if t.dts is not None else t.pts) is not None:
+            # no jump back at clip joins
+            assert ts > last.get(t.pid, -1)
+            last[t.pid] = ts
+    for i in range(0, len(data), mpegts.PACKET):
+        pid = ((data[i + 1] & 0x1F) << 8) | data[i + 2]
+        if data[i + 3] & 0x10:
+            c = data[i + 3] & 0xF
+            assert pid not in cc or c == (cc[pid] + 1) & 0xF
+            cc[pid] = c
+
+    # first clip starts after the TS mux delay
+    assert 6.0 < ingest.seconds < 6.0 + 2.0
+
+    r, w = os.pipe()
+    try:
+        with pytest.raises(FileNotFoundError):
+            Ingest(w, exe).clip(tmp_path / "missing.mp4")
+    finally:
+        os.close(r)
+        os.close(w)
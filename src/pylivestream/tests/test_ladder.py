@@ -0,0 +1,42 @@
+import json
+from pathlib import Path
+import importlib.resources
+
+import pylivestream as pls
+from pylivestream.base import ladder_cmd
+
+ini = Path(__file__).parents[1] / "data/pylivestream.json"
+
+
+def test_ladder(tmp_path):
+    C = json.loads(ini.read_text())
+    C["encode_ladder"] = True
+    C["sites"]["youtube"]["video_kbps"] = 3000
+    fn = tmp_path / "pylivestream.json"
+    fn.write_text(json.dumps(C))
+
+    with importlib.resources.as_file(
+        importlib.resources.files("pylivestream.data").joinpath("bunny.avi")
+    ) as vid:
+        S = pls.FileIn(fn, websites=["youtube", "facebook", "twitch"], infn=vid)
+        cmd = ladder_cmd(S.streams)
+
+    assert cmd is not None
+    assert cmd.count("-i") == 1
+    assert cmd[cmd.index("-filter_complex") + 1] == "[0:v]split=2[v0][v1]"
+    # youtube has its own encoder, facebook and twitch share one
+    assert cmd.count("-codec:v") == 2
+    assert cmd.count("-f") == 2
+    assert cmd[cmd.index("-b:v") + 1] == "3000k"
+    assert cmd[-1] == "|".join(
+        f"[f=flv:onfail=ignore]{S.streams[s].sink}" for s in ("facebook", "twitch")
+    )
+
+
+def test_one_profile():
+    with importlib.resources.as_file(
+        importlib.resources.files("pylivestream.data").joinpath("bunny.avi")
+    ) as vid:
+        S = pls.FileIn(ini, websites=["facebook", "twitch"], infn=vid)
+
+    assert ladder_cmd(S.streams) is None
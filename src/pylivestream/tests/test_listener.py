@@ -0,0 +1,96 @@
+"""
+readiness of the local RTMP listener
+"""
+
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import pylivestream as pls
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_port_listening():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+        # bound but not listening
+        assert not pls.ffmpeg.port_listening("127.0.0.1", port)
+        s.listen()
+        assert pls.ffmpeg.port_listening("127.0.0.1", port)
+
+    assert not pls.ffmpeg.port_listening("127.0.0.1", port)
+
+
+def test_listening_ports():
+    if (ports := pls.ffmpeg.listening_ports()) is None:
+        pytest.skip("listening ports not readable on this system")
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+        assert port not in pls.ffmpeg.listening_ports()
+        s.listen()
+        assert port in pls.ffmpeg.listening_ports()
+
+    assert isinstance(ports, set)
+
+
+@pytest.mark.parametrize("connect", (True, False))
+def test_wait_listening(connect):
+    if not connect and pls.ffmpeg.listening_ports() is None:
+        pytest.skip("listening ports not readable on this system")
+
+    port = free_port()
+    assert not pls.ffmpeg.wait_listening("127.0.0.1", port, 0.05, connect=connect)
+
+    # listener that takes a while to start
+    with socket.socket() as s:
+        threading.Timer(0.1, lambda: (s.bind(("127.0.0.1", port)), s.listen())).start()
+        tic = time.monotonic()
+        assert pls.ffmpeg.wait_listening("127.0.0.1", port, 5, connect=connect)
+        assert time.monotonic() - tic < 1
+
+    # listener process that exits stops the wait
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    assert not pls.ffmpeg.wait_listening("127.0.0.1", port, 5, proc, connect=connect)
+
+
+def test_single_connection_listener():
+    """
+    a listener taking only one connection, like FFplay, isn't used up by the wait
+    """
+
+    if pls.ffmpeg.listening_ports() is None:
+        pytest.skip("listening ports not readable on this system")
+
+    port = free_port()
+    accepted = []
+
+    def serve():
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", port))
+            s.listen()
+            conn, _ = s.accept()
+            with conn:
+                accepted.append(conn.recv(5))
+
+    t = threading.Thread(target=serve, daemon=True)
+    t.start()
+
+    assert pls.ffmpeg.wait_listening("127.0.0.1", port, 5, connect=False)
+    with socket.create_connection(("127.0.0.1", port)) as c:
+        c.sendall(b"hello")
+    t.join(5)
+
+    assert accepted == [b"hello"]
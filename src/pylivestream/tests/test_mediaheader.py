@@ -0,0 +1,52 @@
+import pytest
+from pytest import approx
+import struct
+import importlib.resources
+
+from pylivestream.mediaheader import read_header
+
+
+@pytest.mark.parametrize(
+    "name,hdr",
+    [
+        ("bunny.avi", {"width": 426, "height": 240, "fps": 24.0}),
+        ("logo.png", {"width": 720, "height": 540, "fps": None}),
+        ("check4k.png", {"width": 3840, "height": 2160, "fps": None}),
+        ("orch_short.ogg", {}),
+        ("pylivestream.json", None),
+    ],
+)
+def test_data(name, hdr):
+    with importlib.resources.as_file(
+        importlib.resources.files("pylivestream.data").joinpath(name)
+    ) as fn:
+        assert read_header(fn) == hdr
+
+
+def amf0_str(s: str) -> bytes:
+    return struct.pack(">H", len(s)) + s.encode()
+
+
+def test_flv(tmp_path):
+    meta = b"\x02" + amf0_str("onMetaData") + b"\x08" + struct.pack(">I", 3)
+    for k, v in (("width", 1280.0), ("height", 720.0), ("framerate", 29.97)):
+        meta += amf0_str(k) + b"\x00" + struct.pack(">d", v)
+    meta += b"\x00\x00\x09"
+
+    tag = b"\x12" + len(meta).to_bytes(3, "big") + bytes(7) + meta
+    tag += struct.pack(">I", len(meta) + 11)
+
+    fn = tmp_path / "a.flv"
+    fn.write_bytes(b"FLV\x01\x05" + struct.pack(">I", 9) + bytes(4) + tag)
+
+    hdr = read_header(fn)
+    assert hdr["width"] == 1280 and hdr["height"] == 720
+    assert hdr["fps"] == approx(29.97)
+
+
+def test_unknown(tmp_path):
+    fn = tmp_path / "a.mp4"
+    fn.write_bytes(b"x")
+    assert read_header(fn) is None
+
+    assert read_header(tmp_path / "nothere.mp4") is None
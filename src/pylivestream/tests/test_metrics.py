@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+import urllib.request
+import json
+import socket
+
+import pytest
+
+from pylivestream import metrics
+from pylivestream.progress import EncoderStats
+
+
+def fake_stream(channel: str):
+    stats = EncoderStats()
+    stats.begin()
+    stats.update(
+        {
+            "frame": "300",
+            "fps": "30.0",
+            "bitrate": "2500.0kbits/s",
+            "drop_frames": "4",
+            "speed": "1.01x",
+            "progress": "continue",
+        }
+    )
+    return SimpleNamespace(stats=stats, channel=channel, site="youtube", vidsource="file")
+
+
+def test_prometheus():
+    s = fake_stream('a"b')
+    metrics.register(s)
+    try:
+        text = metrics.render_prometheus(metrics.collect())
+    finally:
+        metrics.unregister(s)
+
+    lab = 'channel="a\\"b",site="youtube",source="file"'
+    assert "# TYPE pylivestream_frames_dropped_total counter" in text
+    assert f"pylivestream_frames_dropped_total{{{lab}}} 4\n" in text
+    assert f"pylivestream_output_bitrate_bits_per_second{{{lab}}} 2.5e+06\n" in text
+    assert f"pylivestream_encoder_speed{{{lab}}} 1.01\n" in text
+    assert f"pylivestream_up{{{lab}}} 1\n" in text
+    assert f"pylivestream_restarts_total{{{lab}}} 0\n" in text
+
+    assert metrics.collect() == []
+
+
+def test_http():
+    s = fake_stream("chan1")
+    metrics.register(s)
+    try:
+        server = metrics.serve(0)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=10) as r:
+            assert 'pylivestream_frames_total{channel="chan1"' in r.read().decode()
+        with urllib.request.urlopen(f"{url}/metrics.json", timeout=10) as r:
+            j = json.load(r)
+    finally:
+        metrics.unregister(s)
+
+    assert j["streams"][0]["labels"]["channel"] == "chan1"
+    assert j["streams"][0]["stats"]["frame"] == 300
+
+
+def test_json_file(tmp_path):
+    s = fake_stream("chan2")
+    fn = tmp_path / "metrics.json"
+
+    metrics.register(s)
+    try:
+        metrics.JsonWriter(fn).write()
+    finally:
+        metrics.unregister(s)
+
+    j = json.loads(fn.read_text())
+    assert j["streams"][0]["stats"]["drop_frames"] == 4
+
+
+def test_unique_labels():
+    a = fake_stream("same")
+    b = fake_stream("same")
+    metrics.register(a)
+    try:
+        with pytest.raises(ValueError, match="unique channel"):
+            metrics.register(b)
+        # registering the same stream again is fine
+        metrics.register(a)
+        c = fake_stream("other")
+        metrics.register(c)
+        assert [m["labels"]["channel"] for m in metrics.collect()] == ["same", "other"]
+        metrics.unregister(c)
+    finally:
+        metrics.unregister(a)
+
+
+def test_port_in_use():
+    with socket.socket() as busy:
+        busy.bind(("127.0.0.1", 0))
+        busy.listen()
+        port = busy.getsockname()[1]
+
+        # as if another channel's process had the port
+        server = metrics.serve(port)
+        assert server.server_address[1] != port
+        assert port < server.server_address[1] < port + metrics.PORT_TRIES
+        assert metrics.serve(port) is server
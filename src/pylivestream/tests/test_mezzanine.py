@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+from pylivestream import mezzanine
+from pylivestream.cache import ProbeCache
+
+
+def test_key(tmp_path, monkeypatch):
+    C = ProbeCache(tmp_path / "cache")
+    monkeypatch.setattr(mezzanine, "get_probe_cache", lambda: C)
+
+    a = tmp_path / "a.mp4"
+    b = tmp_path / "b.mp4"
+    a.write_bytes(b"same")
+    b.write_bytes(b"same")
+
+    s = SimpleNamespace(
+        fps=30.0,
+        video_codec="libx264",
+        video_kbps=2500,
+        keyframe_sec=2,
+        audio_rate=44100,
+        audio_bps=128000,
+    )
+    prof = mezzanine.profile(s)  # type: ignore
+    assert prof["gop"] == 60
+
+    # content addressed: same contents, same mezzanine
+    assert mezzanine.mezzanine_key(a, prof) == mezzanine.mezzanine_key(b, prof)
+    assert mezzanine.mezzanine_key(a, prof) != mezzanine.mezzanine_key(a, prof | {"kbps": 3000})
+
+    cmd = mezzanine.transcode_cmd("ffmpeg", a, prof, tmp_path / "out.mp4")
+    assert cmd[cmd.index("-g") + 1] == cmd[cmd.index("-keyint_min") + 1] == "60"
+    assert cmd[cmd.index("-ar") + 1] == "44100"
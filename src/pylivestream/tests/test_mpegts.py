@@ -0,0 +1,125 @@
+import pytest
+
+from pylivestream import mpegts
+
+VIDEO = 256
+AUDIO = 257
+FRAME = 3600  # 25 fps, 90 kHz
+
+
+def pes_packet(
+    pid: int, cc: int, pts: int, dts: int | None = None, key: bool = False, stream_id: int = 0xE0
+) -> bytearray:
+    """
+    TS packet starting a PES, with the random access indicator set if key
+    """
+
+    header = bytes([mpegts.SYNC, 0x40 | pid >> 8, pid & 0xFF, (0x30 if key else 0x10) | cc])
+    # adaptation field of one byte: random access
+    af = b"\x01\x40" if key else b""
+    flags = 0xC0 if dts is not None else 0x80
+    pes = b"\0\0\1" + bytes([stream_id, 0, 0, 0x80, flags, 10 if dts is not None else 5])
+    pes += b"\x31\0\1\0\1\x11\0\1\0\1" if dts is not None else b"\x21\0\1\0\1"
+
+    p = bytearray(header + af + pes).ljust(mpegts.PACKET, b"\xff")
+    o = len(header + af) + 9
+    mpegts.write_ts(p, o, pts)
+    if dts is not None:
+        mpegts.write_ts(p, o + 5, dts)
+    return p
+
+
+def test_retimer():
+    assert mpegts.read_ts(pes_packet(256, 0, mpegts.WRAP - 1), 13) == mpegts.WRAP - 1
+
+    R = mpegts.Retimer()
+    out = bytearray()
+    for _ in range(2):
+        # each clip starts from the same timestamps and continuity counter
+        R.next_clip()
+        clip = pes_packet(256, 0, 3003, 0) + pes_packet(256, 1, 6006, 3003)
+        R.retime(clip)
+        out += clip
+
+    t = list(mpegts.iter_timestamps(out))
+    assert [x.dts for x in t] == [0, 3003, 6006, 9009]
+    assert [x.pts for x in t] == [3003, 6006, 9009, 12012]
+    assert [out[i + 3] & 0xF for i in range(0, len(out), mpegts.PACKET)] == [0, 1, 2, 3]
+    assert R.seconds == pytest.approx(15015 / mpegts.CLOCK)
+
+    with pytest.raises(ValueError):
+        R.retime(bytearray(100))
+
+
+def clip(video: list[tuple[int, int]], audio: list[int]) -> bytearray:
+    """
+    video (PTS, DTS) in decoding order, then audio PTS, each packet numbered from 0
+    """
+
+    buf = bytearray()
+    for i, (pts, dts) in enumerate(video):
+        buf += pes_packet(VIDEO, i & 0xF, pts, dts)
+    for i, pts in enumerate(audio):
+        buf += pes_packet(AUDIO, i & 0xF, pts)
+    return buf
+
+
+def test_keyframes():
+    F = FRAME
+    buf = pes_packet(VIDEO, 0, 0, key=True)
+    buf += pes_packet(VIDEO, 1, F)
+    # random access on audio is not a cut
+    buf += pes_packet(AUDIO, 0, 0, key=True, stream_id=0xC0)
+    # PSI table, not a PES
+    buf += bytes([mpegts.SYNC, 0x40, 0, 0x10]).ljust(mpegts.PACKET, b"\xff")
+    buf += pes_packet(VIDEO, 2, 2 * F, key=True)
+
+    assert mpegts.keyframes(buf) == [0, 4 * mpegts.PACKET]
+    assert [t.pts for t in mpegts.iter_timestamps(buf)] == [0, F, 0, 2 * F]
+    assert [t.random_access for t in mpegts.iter_timestamps(buf)] == [True, False, True, True]
+
+
+def test_reorder():
+    """
+    B-frames, a clip reordering more than the one before, and a clip without audio
+    """
+
+    F = FRAME
+    # I P B B
+    gop = [(F, 0), (4 * F, F), (2 * F, 2 * F), (3 * F, 3 * F)]
+    deep = [(3 * F, 0), (6 * F, F), (4 * F, 2 * F), (5 * F, 3 * F)]
+    sound = [0, F, 2 * F, 3 * F]
+
+    R = mpegts.Retimer()
+    out = bytearray()
+    ends = []
+    for c in (clip(gop, sound), clip(deep, []), clip(gop, sound)):
+        R.next_clip()
+        R.retime(c)
+        out += c
+        ends.append(R.clip_end())
+
+    t = list(mpegts.iter_timestamps(out))
+    video = [x for x in t if x.pid == VIDEO]
+    audio = [x.pts for x in t if x.pid == AUDIO]
+
+    # decoding order never goes back, nor stalls
+    dts = [x.dts for x in video]
+    assert all(b > a for a, b in zip(dts, dts[1:]))
+
+    # first clip as is, ending after its last frame on any stream
+    assert ends[0] == 5 * F
+    # deeper reordering: shifted so decoding continues, a frame after the last DTS
+    assert dts[4] == dts[3] + F
+    assert video[4].pts == 7 * F
+    assert ends[1] == 11 * F
+    # audio resumes after the clip without it, not after its own last frame
+    assert audio == [0, F, 2 * F, 3 * F, 11 * F, 12 * F, 13 * F, 14 * F]
+    assert video[8].pts == 12 * F
+    assert R.seconds == ends[2] / mpegts.CLOCK == 16 * F / mpegts.CLOCK
+
+    # continuity counters run on per PID, across the clip missing a PID
+    cc = {VIDEO: [], AUDIO: []}
+    for i in range(0, len(out), mpegts.PACKET):
+        cc[((out[i + 1] & 0x1F) << 8) | out[i + 2]].append(out[i + 3] & 0xF)
+    assert cc == {VIDEO: list(range(12)), AUDIO: list(range(8))}
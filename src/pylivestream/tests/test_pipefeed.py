@@ -0,0 +1,47 @@
+import hashlib
+import os
+import subprocess
+import sys
+
+from pylivestream.pipefeed import PipeFeeder
+
+# hash stdin, reading slowly at first like FFmpeg with -re
+READER = """
+import hashlib, sys, time
+h = hashlib.sha256()
+time.sleep(0.3)
+while b := sys.stdin.buffer.read(1 << 16):
+    h.update(b)
+print(h.hexdigest())
+"""
+
+
+def test_feed(tmp_path):
+    data = os.urandom(3 << 20)
+    fn = tmp_path / "clip.ts"
+    fn.write_bytes(data[: 2 << 20])
+
+    proc = subprocess.Popen(
+        [sys.executable, "-c", READER], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    assert proc.stdin is not None
+
+    with PipeFeeder(proc.stdin) as feed:
+        with fn.open("rb") as f:
+            f.seek(100)
+            assert feed.send_file(f) == (2 << 20) - 100
+        half = 1 << 20
+        feed.write(data[:half])
+        feed.write_iter([b"", data[half:]])
+
+    out, _ = proc.communicate()
+
+    size = 2 << 20
+    assert out.strip() == hashlib.sha256(data[100:size] + data).hexdigest()
+
+    s = feed.stats()
+    assert s["bytes"] == (2 << 20) - 100 + len(data)
+    if sys.platform != "win32":
+        # reader started late, so the pipe filled
+        assert s["stalls"] > 0
+        assert s["stall_seconds"] > 0.1
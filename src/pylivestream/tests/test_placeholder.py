@@ -0,0 +1,124 @@
+import hashlib
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from pylivestream import placeholder
+from pylivestream.cache import BlobCache, ProbeCache
+from pylivestream.pipefeed import PipeFeeder
+
+from test_mpegts import pes_packet
+
+READER = """
+import hashlib, sys
+h = hashlib.sha256()
+while b := sys.stdin.buffer.read(1 << 16):
+    h.update(b)
+print(h.hexdigest())
+"""
+
+
+def test_loop(tmp_path, monkeypatch):
+    """
+    reading and feeding loop over the segment, without FFmpeg
+    """
+
+    seg = tmp_path / "filler.ts"
+    data = b"".join(bytes([0x47, 0, i]).ljust(placeholder.TS_PACKET, b"\xff") for i in range(10))
+    seg.write_bytes(data)
+    monkeypatch.setattr(placeholder, "segment", lambda fn, prof, cache: seg)
+
+    with placeholder.Placeholder("filler.mp4", chunk=3 * placeholder.TS_PACKET + 1) as P:
+        assert P.chunk == 3 * placeholder.TS_PACKET
+
+        # the last read stops at the end of the segment
+        assert b"".join(P.read() for _ in range(4)) == data
+        assert P.loops == 1 and P.pos == 0
+
+        P.read(5)
+        proc = subprocess.Popen(
+            [sys.executable, "-c", READER], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        with PipeFeeder(proc.stdin) as feed:  # type: ignore
+            # finishes the current pass, then one more
+            assert P.feed(feed, loops=2) == 2 * len(data) - 5
+        out, _ = proc.communicate()
+
+        assert out.strip() == hashlib.sha256(data[5:] + data).hexdigest()
+        assert P.loops == 3
+
+
+def test_read_gop(tmp_path, monkeypatch):
+    """
+    whole GOPs, the last one ending at the end of the segment
+    """
+
+    seg = tmp_path / "filler.ts"
+    data = b"".join(pes_packet(256, i, i * 3600, key=i % 3 == 0) for i in range(5))
+    seg.write_bytes(data)
+    monkeypatch.setattr(placeholder, "segment", lambda fn, prof, cache: seg)
+
+    n = placeholder.TS_PACKET
+    with placeholder.Placeholder("filler.mp4") as P:
+        cut = 3 * n
+        assert P.cuts == [0, cut, 5 * n]
+
+        assert P.read_gop() == data[:cut]
+        assert P.read_gop() == data[cut:]
+        assert P.loops == 1 and P.pos == 0
+        assert P.read_gop() == data[:cut]
+
+        # from within a GOP, to the next cut
+        P.read(n)
+        assert len(P.read_gop()) == n
+        assert P.loops == 2
+
+
+def test_placeholder(tmp_path, monkeypatch):
+    if not (exe := shutil.which("ffmpeg")):
+        pytest.skip("FFmpeg not found")
+
+    C = ProbeCache(tmp_path / "probe")
+    monkeypatch.setattr("pylivestream.mezzanine.get_probe_cache", lambda: C)
+    monkeypatch.setattr("pylivestream.ffmpeg.get_probe_cache", lambda: C)
+
+    clip = tmp_path / "filler.mp4"
+    subprocess.check_call(
+        [exe, "-loglevel", "error", "-f", "lavfi", "-i", "testsrc=size=160x120:rate=10"]
+        + ["-f", "lavfi", "-i", "sine", "-t", "2", str(clip)]
+    )
+
+    cache = BlobCache(tmp_path / "cache", 10**9)
+    prof = placeholder.profile(320, 240, 10.0, 1.0)
+
+    with placeholder.Placeholder(clip, prof, cache, chunk=10000) as P:
+        data = P.path.read_bytes()
+        assert len(P) == len(data) > 0
+        # whole MPEG-TS packets
+        assert len(data) % placeholder.TS_PACKET == 0
+        assert data[:: placeholder.TS_PACKET] == b"\x47" * (len(data) // placeholder.TS_PACKET)
+        assert P.chunk % placeholder.TS_PACKET == 0
+
+        # encoded once
+        inode = P.path.stat().st_ino
+        assert placeholder.segment(clip, prof, cache) == P.path
+        assert P.path.stat().st_ino == inode
+
+        # loops at the end
+        assert P.read(len(P) - 10) == data[:-10]
+        assert P.read() == data[-10:]
+        assert P.loops == 1 and P.pos == 0
+
+        proc = subprocess.Popen(
+            [sys.executable, "-c", READER], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        with PipeFeeder(proc.stdin) as feed:  # type: ignore
+            assert P.feed(feed, loops=2) == 2 * len(data)
+        out, _ = proc.communicate()
+
+        assert out.strip() == hashlib.sha256(data + data).hexdigest()
+        assert P.loops == 3
+
+    assert not list(cache.root.glob(".*.part"))
@@ -0,0 +1,135 @@
+import http.server
+import threading
+import time
+
+import pytest
+
+from pylivestream.cache import BlobCache, clip_key
+from pylivestream.prefetch import Prefetcher
+
+SIZE = 100_000
+DELAY = 0.2  # seconds before the server answers
+
+
+class SlowHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(DELAY)
+        if self.path.startswith("/missing"):
+            self.send_error(404)
+            return
+        if self.path.startswith("/busy"):
+            self.send_error(503)
+            return
+
+        body = self.path.encode().ljust(SIZE, b".")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        # body trickles in
+        step = SIZE // 4
+        for i in range(0, len(body), step):
+            end = i + step
+            self.wfile.write(body[i:end])
+            self.wfile.flush()
+            time.sleep(DELAY / 4)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    S = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    threading.Thread(target=S.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{S.server_address[1]}"
+    S.shutdown()
+    S.server_close()
+
+
+def test_prefetch(server, tmp_path):
+    with Prefetcher(tmp_path, ahead=3, max_bytes=int(2.5 * SIZE), workers=1, retries=0) as P:
+        a = P.add(f"{server}/a.mp4", priority=5)
+        time.sleep(DELAY / 2)
+        # added while a downloads: lower priority value goes first
+        b = P.add(f"{server}/b.mp4", priority=2)
+        c = P.add(f"{server}/c.mp4", priority=1)
+        assert P.add(f"{server}/c.mp4") is c
+
+        # nothing partial is handed out
+        assert P.next_ready() is None
+        assert not list(tmp_path.glob("*.mp4"))
+
+        first = P.next_ready(timeout=10)
+        assert first is a
+        assert first.path is not None
+        assert first.path.read_bytes().startswith(b"/a.mp4")
+        assert first.path.stat().st_size == SIZE
+
+        second = P.next_ready(timeout=10)
+        assert second is c
+
+        # budget holds two clips: b waits until one is released
+        time.sleep(3 * DELAY)
+        assert b.state == "queued"
+        assert P.stats()["used_bytes"] == 2 * SIZE
+
+        P.release(first)
+        assert not first.path.exists()
+        assert P.next_ready(timeout=10) is b
+
+        bad = P.add(f"{server}/missing.mp4")
+        while bad.state != "failed":
+            time.sleep(0.05)
+        assert "404" in str(bad.error)
+
+        s = P.stats()
+        assert s["downloaded"] == 3
+        assert s["failed"] == 1
+        assert s["used_bytes"] == 2 * SIZE
+
+    assert not list(tmp_path.glob(".*.part"))
+
+
+def test_prefetch_cache(server, tmp_path):
+    C = BlobCache(tmp_path / "clips", 10 * SIZE)
+    url = f"{server}/a.mp4"
+
+    with Prefetcher(cache=C) as P:
+        clip = P.add(url, key=clip_key(url, "task-a"))
+        assert P.next_ready(timeout=10) is clip
+        assert not clip.cached
+        P.release(clip)
+        # kept for replay
+        assert clip.path is not None and clip.path.is_file()
+
+    # replay, even from a new signed URL: no download, ready at once
+    with Prefetcher(cache=C) as P:
+        again = P.add(f"{url}?sig=2", key=clip_key(f"{url}?sig=2", "task-a"))
+        assert P.next_ready() is again
+        assert again.cached
+        assert again.path == clip.path
+
+        s = P.stats()
+        assert s["downloaded"] == 0
+        assert s["cache_hits"] == 1
+        assert s["cache_misses"] == 1
+
+
+def test_prefetch_give_up(server, tmp_path):
+    with Prefetcher(tmp_path, max_bytes=SIZE // 2, retries=3) as P:
+        # larger than the whole budget: fails at once, no retries
+        tic = time.monotonic()
+        big = P.add(f"{server}/big.mp4")
+        while big.state != "failed":
+            time.sleep(0.05)
+        assert time.monotonic() - tic < DELAY + 0.4
+        assert "budget" in str(big.error)
+
+        # server error is retried after a backoff, which close() doesn't wait out
+        busy = P.add(f"{server}/busy.mp4")
+        time.sleep(2 * DELAY)
+        assert busy.state == "downloading"
+
+        tic = time.monotonic()
+        P.close()
+        assert time.monotonic() - tic < 0.3
@@ -0,0 +1,58 @@
+import io
+from pytest import approx
+
+from pylivestream.progress import EncoderStats, ProgressReader
+
+PROGRESS = b"""frame=60
+fps=29.97
+stream_0_0_q=23.0
+bitrate=N/A
+total_size=48
+out_time_us=2000000
+out_time=00:00:02.000000
+dup_frames=0
+drop_frames=0
+speed=N/A
+progress=continue
+[flv @ 0x55d] Failed to update header with correct duration.
+frame=150
+fps=30.01
+stream_0_0_q=25.0
+bitrate=2500.1kbits/s
+total_size=1562500
+out_time_us=5000000
+out_time=00:00:05.000000
+dup_frames=2
+drop_frames=1
+speed=0.93x
+progress=end
+"""
+
+
+def test_reader():
+    stats = EncoderStats()
+    echo = io.StringIO()
+
+    ProgressReader(io.BytesIO(PROGRESS), stats, echo).run()
+
+    s = stats.snapshot()
+    assert s["frame"] == 150
+    assert s["fps"] == approx(30.01)
+    assert s["bitrate_kbps"] == approx(2500.1)
+    assert s["total_size"] == 1562500
+    assert s["out_time"] == approx(5.0)
+    assert s["speed"] == approx(0.93)
+    assert s["drop_frames"] == 1
+    assert s["dup_frames"] == 2
+    assert s["progress"] == "end"
+
+    assert echo.getvalue() == "[flv @ 0x55d] Failed to update header with correct duration.\n"
+
+
+def test_not_available():
+    stats = EncoderStats()
+    stats.update({"frame": "1", "bitrate": "N/A", "speed": "N/A", "progress": "continue"})
+
+    assert stats.frame == 1
+    assert stats.bitrate_kbps is None
+    assert stats.speed is None
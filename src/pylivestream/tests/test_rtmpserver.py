@@ -0,0 +1,190 @@
+import shutil
+import socket
+import subprocess
+import time
+
+import pytest
+
+from pylivestream import flv
+from pylivestream.rtmpserver import COMMAND_AMF0, HANDSHAKE_SIZE, ServerThread
+
+
+class Publisher:
+    """
+    minimal RTMP client: 128 byte chunks, type 0 header on the first message of a chunk stream,
+    type 1 (timestamp delta) after
+    """
+
+    def __init__(self, port: int):
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+        self.last: dict[int, int] = {}
+
+        self.sock.sendall(b"\x03" + bytes(HANDSHAKE_SIZE))
+        s = self.recv(1 + 2 * HANDSHAKE_SIZE)
+        assert s[0] == 3
+        end = 1 + HANDSHAKE_SIZE
+        self.sock.sendall(s[1:end])
+
+    def recv(self, n: int) -> bytes:
+        b = b""
+        while len(b) < n:
+            b += self.sock.recv(n - len(b))
+        return b
+
+    def send(self, csid: int, msg_type: int, ts: int, body: bytes, stream_id: int = 0):
+        if csid in self.last:
+            header = bytes([0x40 | csid]) + (ts - self.last[csid]).to_bytes(3, "big")
+            header += len(body).to_bytes(3, "big") + bytes([msg_type])
+        else:
+            header = bytes([csid]) + ts.to_bytes(3, "big") + len(body).to_bytes(3, "big")
+            header += bytes([msg_type]) + stream_id.to_bytes(4, "little")
+        self.last[csid] = ts
+
+        out = header
+        for i in range(0, len(body), 128):
+            if i:
+                out += bytes([0xC0 | csid])
+            end = i + 128
+            out += body[i:end]
+        self.sock.sendall(out)
+
+    def command(self, *values, stream_id: int = 0):
+        self.send(3, COMMAND_AMF0, 0, b"".join(flv.amf0_encode(v) for v in values), stream_id)
+
+    def wait_for(self, text: bytes) -> None:
+        b = b""
+        while text not in b:
+            b += self.sock.recv(4096)
+
+
+def wait_ended(server: ServerThread) -> None:
+    tic = time.monotonic()
+    while not server.server.connections or server.server.connections[0].ended is None:
+        assert time.monotonic() - tic < 5
+        time.sleep(0.01)
+
+
+def test_publish(tmp_path):
+    server = ServerThread("127.0.0.1", 0, tmp_path).start_ready()
+    port = server.server.port
+
+    c = Publisher(port)
+    c.command("connect", 1.0, {"app": "live", "tcUrl": f"rtmp://127.0.0.1:{port}/live"})
+    c.wait_for(b"NetConnection.Connect.Success")
+    c.command("createStream", 2.0, None)
+    c.command("publish", 3.0, None, "key", "live", stream_id=1)
+    c.wait_for(b"NetStream.Publish.Start")
+
+    meta = ["@setDataFrame", "onMetaData", {"width": 320.0, "height": 240.0}]
+    c.send(4, flv.SCRIPT, 0, b"".join(flv.amf0_encode(v) for v in meta), 1)
+    c.send(6, flv.VIDEO, 0, b"\x17\x00" + bytes(40), 1)
+    for i in range(60):
+        # keyframe every 20 frames of 50 ms = 1 second GOP, frames larger than one chunk
+        c.send(6, flv.VIDEO, i * 50, bytes([0x17 if i % 20 == 0 else 0x27, 1]) + bytes(300), 1)
+        c.send(7, flv.AUDIO, i * 50, b"\xaf\x01" + bytes(10), 1)
+    c.command("deleteStream", 4.0, 1.0)
+    c.sock.close()
+
+    wait_ended(server)
+    server.terminate()
+    server.wait(5)
+
+    s = server.server.connections[0].snapshot()
+    assert s["app"] == "live" and s["name"] == "key"
+    assert s["video_tags"] == 61 and s["audio_tags"] == 60
+    assert s["keyframes"] == 3
+    assert s["gop_min"] == s["gop_max"] == 1.0
+    assert s["timestamps_backwards"] == 0
+    assert s["max_timestamp_gap"] == 0.05
+    assert s["width"] == 320
+
+    fn = next(tmp_path.glob("live_key_*.flv"))
+    with fn.open("rb") as f:
+        flv.read_header(f)
+        tags = list(flv.iter_tags(f))
+    assert len(tags) == 1 + 61 + 60
+    assert flv.amf0_decode_all(tags[0][2])[0] == "onMetaData"
+    assert tags[-2][:2] == (flv.VIDEO, 59 * 50)
+
+
+def read_messages(c: Publisher, until: bytes | None = None, n: int = 0) -> list[tuple]:
+    """
+    messages from the server, each in one chunk with a type 0 header
+    """
+
+    out: list[tuple] = []
+    while len(out) < n or (until and not any(until in m[2] for m in out)):
+        h = c.recv(12)
+        out.append((h[7], int.from_bytes(h[1:4], "big"), c.recv(int.from_bytes(h[4:7], "big"))))
+    return out
+
+
+def test_play():
+    server = ServerThread("127.0.0.1", 0).start_ready()
+    port = server.server.port
+
+    pub = Publisher(port)
+    pub.command("connect", 1.0, {"app": "live"})
+    pub.command("createStream", 2.0, None)
+    pub.command("publish", 3.0, None, "key", "live", stream_id=1)
+    pub.wait_for(b"NetStream.Publish.Start")
+
+    meta = ["@setDataFrame", "onMetaData", {"width": 320.0}]
+    pub.send(4, flv.SCRIPT, 0, b"".join(flv.amf0_encode(v) for v in meta), 1)
+    pub.send(6, flv.VIDEO, 0, b"\x17\x00seq", 1)
+    pub.send(7, flv.AUDIO, 0, b"\xaf\x00seq", 1)
+    for i in range(3):
+        pub.send(6, flv.VIDEO, i * 50, bytes([0x17 if i == 0 else 0x27, 1]) + b"before", 1)
+    while server.server.connections[0].tags[flv.VIDEO] < 4:
+        time.sleep(0.01)
+
+    player = Publisher(port)
+    player.command("connect", 1.0, {"app": "live"})
+    read_messages(player, b"NetConnection.Connect.Success")
+    player.command("createStream", 2.0, None)
+    player.command("play", 3.0, None, "key", stream_id=1)
+    read_messages(player, b"NetStream.Play.Start")
+
+    # joined mid-GOP: headers, then audio at once, video from the next keyframe
+    pub.send(6, flv.VIDEO, 150, b"\x27\x01inter", 1)
+    pub.send(7, flv.AUDIO, 150, b"\xaf\x01sound", 1)
+    pub.send(6, flv.VIDEO, 200, b"\x17\x01key", 1)
+    pub.send(6, flv.VIDEO, 250, b"\x27\x01after", 1)
+
+    got = read_messages(player, n=6)
+    assert flv.amf0_decode_all(got[0][2]) == meta[1:]
+    assert got[1:] == [
+        (flv.VIDEO, 0, b"\x17\x00seq"),
+        (flv.AUDIO, 0, b"\xaf\x00seq"),
+        (flv.AUDIO, 150, b"\xaf\x01sound"),
+        (flv.VIDEO, 200, b"\x17\x01key"),
+        (flv.VIDEO, 250, b"\x27\x01after"),
+    ]
+
+    pub.sock.close()
+    player.sock.close()
+    server.terminate()
+    server.wait(5)
+
+    assert not server.server.publishers
+
+
+def test_ffmpeg():
+    if not (exe := shutil.which("ffmpeg")):
+        pytest.skip("FFmpeg not found")
+
+    server = ServerThread("127.0.0.1", 0).start_ready()
+
+    cmd = [exe, "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=160x120:rate=10"]
+    cmd += ["-t", "3", "-c:v", "libx264", "-g", "10", "-f", "flv"]
+    cmd += [f"rtmp://127.0.0.1:{server.server.port}/live/test"]
+    subprocess.run(cmd, check=True, timeout=60)
+
+    wait_ended(server)
+    server.terminate()
+    server.wait(5)
+
+    s = server.server.connections[0].snapshot()
+    assert s["video_tags"] >= 30
+    assert s["keyframes"] >= 3
+    assert s["gop_max"] == pytest.approx(1.0)
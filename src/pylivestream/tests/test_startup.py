@@ -0,0 +1,81 @@
+"""
+cold start of command line entry points, as run by a supervisor restarting channels
+"""
+
+import pytest
+from pathlib import Path
+import subprocess
+import json
+import os
+import sys
+
+import pylivestream as pls
+
+BUDGET = 1.0  # seconds, generous for slow CI runners
+
+CODE = """
+import json, sys, time
+before = set(sys.modules)
+t0 = time.perf_counter()
+import {mod}
+print(json.dumps({{"t": time.perf_counter() - t0, "modules": list(set(sys.modules) - before)}}))
+"""
+
+
+@pytest.mark.parametrize("mod", ("pylivestream.fglob", "pylivestream.screen", "pylivestream.api"))
+def test_import_budget(mod):
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(Path(pls.__file__).parents[1]), env.get("PYTHONPATH", "")]
+    )
+
+    ret = subprocess.check_output([sys.executable, "-c", CODE.format(mod=mod)], env=env, text=True)
+    r = json.loads(ret)
+
+    assert r["t"] < BUDGET
+    # optional and rarely needed pieces are not imported until used
+    for m in ("tinytag", "concurrent.futures", "importlib.resources"):
+        assert m not in r["modules"]
+
+
+def test_discovery_cache(tmp_path, monkeypatch):
+    exe = tmp_path / "bin" / "ffmock"
+    exe.parent.mkdir()
+    exe.write_text("#!/bin/sh\n")
+    exe.chmod(0o755)
+
+    monkeypatch.setenv("FFMPEG_ROOT", str(exe.parent))
+    env = pls.ffmpeg._discovery_env()
+    pls.ffmpeg._save_discovery(env, "ffmock", pls.ffmpeg._exe_record(str(exe)))
+
+    assert pls.ffmpeg._load_discovery(env)["ffmock"]["path"] == str(exe)
+    assert pls.ffmpeg._unchanged(pls.ffmpeg._load_discovery(env)["ffmock"])
+    # PATH or FFMPEG_ROOT change invalidates
+    monkeypatch.setenv("FFMPEG_ROOT", str(tmp_path))
+    assert not pls.ffmpeg._load_discovery(pls.ffmpeg._discovery_env())
+    # replaced executable invalidates
+    exe.write_text("#!/bin/sh\nexit 0\n")
+    assert not pls.ffmpeg._unchanged(pls.ffmpeg._load_discovery(env)["ffmock"])
+
+
+def test_version_cache(tmp_path, monkeypatch):
+    exe = tmp_path / "bin" / "ffmock"
+    exe.parent.mkdir()
+    exe.write_text("#!/bin/sh\necho ffmock version 1.0\n")
+    exe.chmod(0o755)
+    monkeypatch.setenv("FFMPEG_ROOT", str(exe.parent))
+
+    runs = []
+    check_output = subprocess.check_output
+    monkeypatch.setattr(
+        subprocess, "check_output", lambda *a, **k: runs.append(a) or check_output(*a, **k)
+    )
+
+    for _ in range(2):
+        # as a new process would
+        pls.ffmpeg.get_exe.cache_clear()
+        pls.ffmpeg.get_version.cache_clear()
+        assert pls.ffmpeg.get_version("ffmock") == "ffmock version 1.0"
+
+    # persisted: -version only run once
+    assert len(runs) == 1
@@ -0,0 +1,45 @@
+import pytest
+
+from pylivestream import streamcopy
+
+
+def make_meta(vcodec="h264", pix_fmt="yuv420p", vbr="2000000", acodec="aac", rate="44100"):
+    return {
+        "streams": [
+            {"codec_type": "video", "codec_name": vcodec, "pix_fmt": pix_fmt, "bit_rate": vbr},
+            {
+                "codec_type": "audio",
+                "codec_name": acodec,
+                "sample_rate": rate,
+                "channels": 2,
+                "bit_rate": "128000",
+            },
+        ],
+        "format": {"bit_rate": "2200000"},
+    }
+
+
+@pytest.mark.parametrize(
+    "meta,gop,copy",
+    [
+        (make_meta(), 2.0, (True, True)),
+        (make_meta(acodec="mp3"), 2.0, (True, False)),
+        (make_meta(rate="48000"), 2.0, (True, False)),
+        (make_meta(vcodec="hevc"), 2.0, (False, False)),
+        (make_meta(pix_fmt="yuv444p"), 2.0, (False, False)),
+        (make_meta(vbr="9000000"), 2.0, (False, False)),
+        (make_meta(), 10.0, (False, False)),
+        (make_meta(), None, (False, False)),
+    ],
+)
+def test_plan(meta, gop, copy, monkeypatch, tmp_path):
+    monkeypatch.setattr(streamcopy, "keyframe_interval", lambda fn, exe: gop)
+
+    assert streamcopy.plan(tmp_path / "a.mp4", meta, kbps=2500, gop_sec=2, audio_rate=44100) == copy
+
+
+def test_bitrate_from_format():
+    meta = make_meta()
+    del meta["streams"][0]["bit_rate"]
+
+    assert streamcopy.video_bitrate(meta) == 2072
@@ -0,0 +1,57 @@
+import subprocess
+import sys
+import time
+
+from pylivestream import supervise
+from pylivestream.progress import EncoderStats
+from pylivestream.supervise import Supervisor, Watchdog
+
+
+def test_backoff():
+    for attempt, d in enumerate([1, 2, 4, 8, 16, 32, 60, 60]):
+        for _ in range(20):
+            assert d / 2 <= supervise.backoff(attempt) <= d
+
+
+def test_restart(monkeypatch):
+    monkeypatch.setattr(supervise, "backoff", lambda attempt, lo=0, hi=0: 0.05)
+
+    stats = EncoderStats()
+    codes = iter([1, 255, 0])
+
+    def encode():
+        stats.begin()
+        stats.end(next(codes))
+        return stats.returncode
+
+    assert Supervisor(stats).run(encode) == 0
+
+    s = stats.snapshot()
+    assert s["restarts"] == 2
+    assert s["downtime"] >= 0.1
+    assert s["returncode"] == 0
+
+
+def test_give_up(monkeypatch):
+    monkeypatch.setattr(supervise, "backoff", lambda attempt, lo=0, hi=0: 0.0)
+
+    calls = []
+    assert Supervisor(EncoderStats(), max_restarts=2).run(lambda: calls.append(1) or 1) == 1
+    assert len(calls) == 3
+
+
+def test_stall():
+    stats = EncoderStats()
+    stats.begin()
+    proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+
+    tic = time.monotonic()
+    w = Watchdog(proc, stats, timeout=0.2)
+    w.start()
+    # progress reports that don't advance are a stall too
+    stats.update({"frame": "0", "progress": "continue"})
+
+    proc.wait(timeout=10)
+    w.join(timeout=10)
+    assert time.monotonic() - tic < 5
+    assert stats.snapshot()["stalls"] == 1
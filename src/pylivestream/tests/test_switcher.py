@@ -0,0 +1,151 @@
+import os
+import shutil
+import subprocess
+import threading
+import time
+import types
+
+import pytest
+
+from pylivestream import mpegts, placeholder
+from pylivestream.cache import BlobCache, ProbeCache
+from pylivestream.switcher import Switcher
+
+
+class FakeIngest:
+    """
+    records what airs, in order: clips by name, filler GOPs, and timestamp rejoins
+    """
+
+    def __init__(self):
+        self.log: list[str] = []
+        self.clip_written = None
+        self.seconds = 0.0
+        self.retimer = types.SimpleNamespace(next_clip=lambda: self.log.append("|"), start=0)
+        self.feed = types.SimpleNamespace(fill=lambda: 0, stats=dict)
+
+    def write(self, data):
+        self.log.append(data.decode())
+        time.sleep(0.002)
+
+    def clip(self, src):
+        if src == "missing":
+            raise FileNotFoundError(src)
+        self.clip_written = time.monotonic()
+        self.log.append(src)
+        return 1.0
+
+    def close(self):
+        pass
+
+
+class FakeFiller:
+    """
+    three GOPs per loop
+    """
+
+    prof = None
+
+    def __init__(self):
+        self.loops = 0
+        self.gop = 0
+
+    def read_gop(self):
+        g = f"g{self.gop}"
+        self.gop = (self.gop + 1) % 3
+        if self.gop == 0:
+            self.loops += 1
+        return g.encode()
+
+
+def test_order():
+    r, w = os.pipe()
+    try:
+        S = Switcher(w, FakeFiller())
+        S.ingest = fake = FakeIngest()
+        for src in ("a", "missing", "b"):
+            S.play(src)
+
+        with S:
+            S.wait_queued()
+            while fake.log.count("g0") < 2:
+                time.sleep(0.01)
+            S.play("c")
+            S.wait_queued()
+    finally:
+        os.close(r)
+        os.close(w)
+
+    log = "".join(fake.log)
+    # queued clips in order, then the filler from its start, rejoining at each loop
+    assert log.startswith("ab|g0g1g2|g0")
+    assert S.failed == 1
+    assert [x["src"] for x in S.switches] == ["a", "b", "c"]
+
+    # a clip played mid-filler airs between whole GOPs, and the filler resumes where it was
+    before, after = log.split("c")
+    assert before.endswith(("g0", "g1", "g2"))
+    nxt = (int(before[-1]) + 1) % 3
+    assert after.startswith(f"|g{nxt}")
+
+
+def test_switcher(tmp_path, monkeypatch):
+    if not (exe := shutil.which("ffmpeg")) or not shutil.which("ffprobe"):
+        pytest.skip("FFmpeg not found")
+
+    C = ProbeCache(tmp_path / "probe")
+    monkeypatch.setattr("pylivestream.mezzanine.get_probe_cache", lambda: C)
+    monkeypatch.setattr("pylivestream.ffmpeg.get_probe_cache", lambda: C)
+
+    lavfi = [exe, "-loglevel", "error", "-f", "lavfi", "-i", "testsrc=size=160x120:rate=10"]
+    lavfi += ["-f", "lavfi", "-i", "sine", "-t", "2"]
+    filler = tmp_path / "filler.mp4"
+    clip = tmp_path / "clip.mp4"
+    subprocess.check_call(lavfi + [str(filler)])
+    subprocess.check_call(lavfi + ["-g", "5", str(clip)])
+
+    # encoder reading at about real time
+    r, w = os.pipe()
+    out = bytearray()
+
+    def encoder():
+        with os.fdopen(r, "rb") as f:
+            while b := f.read(1 << 14):
+                out.extend(b)
+                time.sleep(0.01)
+
+    reader = threading.Thread(target=encoder, daemon=True)
+    reader.start()
+
+    prof = placeholder.profile(160, 120, 10.0, 0.5)
+    with placeholder.Placeholder(filler, prof, BlobCache(tmp_path / "cache", 10**9)) as P:
+        # GOP every 0.5 sec
+        assert len(P.cuts) == 2 + 3
+        assert P.cuts[0] == 0 and P.cuts[-1] == len(P)
+
+        try:
+            with Switcher(w, P, exe, pipe_size=1 << 16) as S:
+                time.sleep(0.5)
+                S.play(clip)
+                S.play(tmp_path / "missing.mp4")
+                S.wait_queued()
+                time.sleep(0.2)
+        finally:
+            os.close(w)
+        reader.join()
+
+        s = S.stats()
+        assert s["switches"] == 1
+        assert s["failed"] == 1
+        assert 0 <= s["latency_last"] < 5
+        assert S.switches[0]["seconds"] == pytest.approx(2.0, abs=0.2)
+        assert P.loops >= 1
+
+    # one stream, no jumps back in time across the switches
+    last: dict[int, int] = {}
+    for t in mpegts.iter_timestamps(out):
+        if (ts := t.dts if t.dts is not None else t.pts) is not None:
+            assert ts > last.get(t.pid, -1)
+            last[t.pid] = ts
+
+    assert max(last.values()) / mpegts.CLOCK == pytest.approx(s["stream_time"], abs=0.5)
@@ -1,25 +1,92 @@
 from __future__ import annotations
+import typing as T
 import logging
 import contextlib
 import subprocess
 from pathlib import Path
 import sys
-import importlib.resources
 
+from .cpu import CpuPolicy
 from .ffmpeg import get_meta, get_ffplay
-
-
-def run(cmd: list[str]):
+from .mediaheader import read_header
+from .progress import PROGRESS, EncoderStats, ProgressReader
+from .supervise import Watchdog
+
+
+def run(
+    cmd: list[str],
+    stats: EncoderStats | None = None,
+    feed: T.Callable[[T.BinaryIO], None] | None = None,
+    stall: float | None = None,
+    cpu: CpuPolicy | None = None,
+) -> int:
     """
     shell=True for Windows seems necessary to specify devices enclosed by "" quotes
+
+    if stats is given, FFmpeg reports its progress to stderr,
+    which is parsed into stats while the stream runs.
+
+    if feed is given, it's called with FFmpeg's stdout pipe, and should read until the end.
+
+    if stall is given (with stats), FFmpeg is terminated if its output doesn't advance
+    for stall seconds.
+
+    cpu: cores and priority to run FFmpeg with
     """
 
+    if stats is not None:
+        cmd = [cmd[0]] + PROGRESS + cmd[1:]
+
+    if cpu:
+        cmd = cpu.wrap(cmd)
+
     print("\n", " ".join(cmd), "\n")
 
-    if sys.platform == "win32":
-        subprocess.run(" ".join(cmd), shell=True)
-    else:
-        subprocess.run(cmd)
+    args: str | list[str] = " ".join(cmd) if sys.platform == "win32" else cmd
+    shell = sys.platform == "win32"
+
+    if stats is None and feed is None and not cpu:
+        return subprocess.run(args, shell=shell).returncode
+
+    if stats is not None:
+        stats.begin()
+    ret = None
+    try:
+        proc = subprocess.Popen(
+            args,
+            shell=shell,
+            stdout=subprocess.PIPE if feed else None,
+            stderr=subprocess.PIPE if stats else None,
+        )
+        if cpu:
+            cpu.apply(proc.pid)
+        reader = watchdog = None
+        if stats is not None:
+            assert proc.stderr is not None
+            reader = ProgressReader(proc.stderr, stats)
+            reader.start()
+            if stall:
+                watchdog = Watchdog(proc, stats, stall)
+                watchdog.start()
+        try:
+            if feed is not None:
+                assert proc.stdout is not None
+                feed(proc.stdout)  # type: ignore[arg-type]
+            ret = proc.wait()
+        except KeyboardInterrupt:
+            proc.terminate()
+            ret = proc.wait()
+            raise
+        finally:
+            if watchdog is not None:
+                watchdog.stop()
+            if reader is not None:
+                reader.join(timeout=5)
+    finally:
+        if stats is not None:
+            stats.end(ret)
+
+    return ret
 
 
 """
@@ -58,6 +125,8 @@ def check_display(fn: Path | None = None) -> bool:
     if fn:
         ret = _check_disp(fn)
     else:
+        import importlib.resources
+
         with importlib.resources.as_file(
             importlib.resources.files(f"{__package__}.data").joinpath("logo.png")
         ) as f:
@@ -83,16 +152,22 @@ def meta_caption(meta) -> str:
     return caption
 
 
-def get_resolution(fn: Path | None, exe: str | None = None) -> list[str]:
+def get_resolution(
+    fn: Path | None, exe: str | None = None, meta: dict[str, T.Any] | None = None
+) -> list[str]:
     """
     get resolution (widthxheight) of video file
     http://trac.ffmpeg.org/wiki/FFprobeTips#WidthxHeight
 
     FFprobe gets resolution from the first video stream in the file it finds.
+    Common containers and images are read directly from the file header,
+    only running FFprobe for other formats.
 
     inputs:
     ------
     fn: Path to the video filename
+    exe: path to ffprobe
+    meta: FFprobe JSON from an earlier probe, to avoid probing again
 
     outputs:
     -------
@@ -104,7 +179,11 @@ def get_resolution(fn: Path | None, exe: str | None = None) -> list[str]:
     if fn is None:
         return []
 
-    meta = get_meta(fn, exe)
+    if meta is None:
+        if fn and (hdr := read_header(fn)) is not None:
+            return [hdr["width"], hdr["height"]] if hdr else []
+
+        meta = get_meta(fn, exe)
     if not meta:
         return []
 
@@ -119,12 +198,16 @@ def get_resolution(fn: Path | None, exe: str | None = None) -> list[str]:
     return res
 
 
-def get_framerate(fn: Path | None, exe: str | None = None) -> float | None:
+def get_framerate(
+    fn: Path | None, exe: str | None = None, meta: dict[str, T.Any] | None = None
+) -> float | None:
     """
     get framerate of video file
     http://trac.ffmpeg.org/wiki/FFprobeTips#FrameRate
 
     FFprobe gets framerate from the first video stream in the file it finds.
+    Common containers are read directly from the file header,
+    only running FFprobe for other formats or if the header has no frame rate.
 
     Parameters
     ----------
@@ -132,6 +215,8 @@ def get_framerate(fn: Path | None, exe: str | None = None) -> float | None:
         video filename
     exe: str, optional
         path to ffprobe
+    meta: dict, optional
+        FFprobe JSON from an earlier probe, to avoid probing again
 
     Returns
     -------
@@ -142,7 +227,11 @@ def get_framerate(fn: Path | None, exe: str | None = None) -> float | None:
     if fn is None:
         return None
 
-    meta = get_meta(fn, exe)
+    if meta is None:
+        if fn and (hdr := read_header(fn)) is not None and (not hdr or "fps" in hdr):
+            return hdr.get("fps")
+
+        meta = get_meta(fn, exe)
     if not meta:
         return None
 
@@ -3,6 +3,10 @@ import time
 import requests
 import json
 from io import BytesIO
+from pathlib import Path
+
+from pylivestream.cache import BlobCache, clip_key
+from pylivestream.prefetch import get_clip_cache
 
 from dotenv import load_dotenv
 
@@ -105,6 +109,48 @@ def fetch_video_result(file_id: str) -> BytesIO:
     # Step 3: Return video as a BytesIO object
     return video_in_memory
 
+def fetch_video_to_cache(file_id: str, cache: BlobCache | None = None) -> Path:
+    """
+    Fetches a video from the API into the on-disk clip cache, streaming it to disk
+    rather than holding it in memory. A video already in the cache is not fetched again.
+
+    :param file_id: The file ID of the video to fetch.
+    :param cache: Clip cache, by default the per-user one.
+    :return: Path of the cached video file.
+    """
+    if cache is None:
+        cache = get_clip_cache()
+
+    key = clip_key("", task_id=f"hailuo/{file_id}")
+    if (path := cache.get(key, ".mp4")) is not None:
+        print("The video was already downloaded: " + str(path))
+        return path
+
+    url = f"https://api.minimaxi.chat/v1/files/retrieve?file_id={file_id}"
+    headers = {
+        'authorization': f'Bearer {api_key}',
+    }
+
+    response = requests.get(url, headers=headers)
+    response.raise_for_status()
+    download_url = response.json()['file']['download_url']
+    print("Video download link：" + download_url)
+
+    part = cache.new_file(".mp4")
+    try:
+        with requests.get(download_url, stream=True) as r:
+            r.raise_for_status()
+            with part.open("wb") as f:
+                for chunk in r.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
+        path = cache.put(key, part, ".mp4")
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+
+    print("The video has been downloaded to: " + str(path))
+    return path
+
 # to do: create a data structure that'll hold the bytes for each video. 
 # We flush this every once and awhile and will check for each video on that list whether it received enough upvotes to save (to tell us whether it was garbo or not)
 # we can have chatbot keep track of votes. We can save the file as well as metadata about its reception.
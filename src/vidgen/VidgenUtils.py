@@ -18,7 +18,7 @@ class VideoGeneration:
         self.video_description = video_description
         self.task_id = task_id
         self.submitting_user = submitting_user
-        self.url = None
+        self.url: Optional[str] = None
 
     def __repr__(self):
         """